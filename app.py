@@ -1,10 +1,24 @@
-from flask import Flask, request, jsonify
-from functools import wraps
+from flask import Flask, Response, request, jsonify, send_file
 from handlers.main_menu import handle_main_menu
-from sessions import get_user_session, update_user_session, cleanup_old_sessions, _sessions
-import logging
+from handlers.approval_handler import bulk_decisions
+from handlers.document_handler import document_store, verify_document_link
+from handlers.payroll_handler import payroll
+from handlers.leave_handler import leave_calendar
+from handlers.performance_handler import render_cache
+from handlers.report_handler import report_db, summary_engine
+from sessions import get_user_session, update_user_session, cleanup_old_sessions, session_stats
+import time
 from datetime import datetime
+from typing import Dict, Optional, Tuple
 from utils.rate_limiter import RateLimiter
+from utils.ussd_input import InputOutOfSequence, consume_input
+from utils.logging_setup import capture_logger, get_logger, should_sample
+from utils.metrics import (RATE_LIMITER_SECONDS, SESSION_STORE_SECONDS, USSD_REQUEST_SECONDS,
+                           latency_summary, render_metrics)
+from utils.sms_queue import sms_queue
+from utils.hr_data import compact_clock_records
+from utils.document_tokens import document_tokens
+from utils.employee_directory import directory
 from apscheduler.schedulers.background import BackgroundScheduler
 import pytz
 
@@ -18,113 +32,202 @@ class Config:
 # Initialize Flask app
 app = Flask(__name__)
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s [%(levelname)s] %(message)s',
-    handlers=[
-        logging.FileHandler('ussd_gateway.log'),
-        logging.StreamHandler()
-    ]
-)
+# Configure logging (queued, written by a background listener)
+logger = get_logger('ussd_gateway')
+capture = capture_logger()
 
 # Initialize rate limiter
 limiter = RateLimiter(max_requests=10, period_seconds=60)
 
-def log_ussd_interaction(f):
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
-        start_time = datetime.now()
-        try:
-            response = f(*args, **kwargs)
-            duration = (datetime.now() - start_time).total_seconds()
-            
-            logging.info(
-                f"USSD Request - Session: {request.form.get('sessionId')} | "
-                f"Phone: {request.form.get('phoneNumber')} | "
-                f"Input: '{request.form.get('text', '')}' | "
-                f"Response: '{response}' | "
-                f"Processed in {duration:.2f}s"
-            )
-            return response
-        except Exception as e:
-            logging.error(f"USSD Error: {str(e)}")
-            return "END System error. Please try again."
-    return decorated_function
-
-@app.route('/ussd', methods=['POST'])
-@log_ussd_interaction
-def ussd():
+# --- USSD hop pipeline (shared by the Flask view and asgi.py) ---
+def reject_invalid(form) -> Optional[str]:
+    """Response for hops refused before touching a session, else None"""
     # Validate required parameters
     required_fields = ['sessionId', 'phoneNumber', 'serviceCode']
-    if not all(field in request.form for field in required_fields):
-        logging.warning("Missing required USSD parameters")
+    if not all(field in form for field in required_fields):
+        logger.warning("Missing required USSD parameters")
         return "END Invalid request parameters"
 
-    session_id = request.form['sessionId']
-    phone_number = request.form['phoneNumber']
-    text_input = request.form.get('text', '').strip()
-    service_code = request.form['serviceCode']
-
     # Rate limiting check
-    if not limiter.is_allowed(phone_number):
-        logging.warning(f"Rate limit exceeded for {phone_number}")
+    with RATE_LIMITER_SECONDS.time():
+        allowed = limiter.is_allowed(form['phoneNumber'])
+    if not allowed:
+        logger.warning("Rate limit exceeded for %s", form['phoneNumber'])
         return "END Too many requests. Please try again later."
+    return None
+
+def route_hop(session: Dict, phone_number: str, text_input: str) -> str:
+    """Run one hop through the menus and remember the answer on the session"""
+    # Sandbox handling
+    if Config.AT_SANDBOX and phone_number != Config.AT_SANDBOX_NUMBER:
+        session['real_phone'] = phone_number  # Store actual number
+        phone_number = Config.AT_SANDBOX_NUMBER  # Process as sandbox number
+
+    # Only the segments added since the last hop are parsed
+    try:
+        new_inputs = consume_input(session, text_input)
+    except InputOutOfSequence as e:
+        # An earlier hop arriving late: its answer is gone, so end cleanly
+        logger.warning("USSD hop out of sequence: %s", e)
+        return "END Request out of sequence. Please dial again."
+    if new_inputs is None:
+        # Resent hop: repeat the previous answer instead of re-running it
+        return session.get('last_response', "END System error. Please try again.")
+
+    # Process USSD input
+    response = handle_main_menu(
+        inputs=new_inputs,
+        phone=phone_number,
+        session=session
+    )
+    session['last_response'] = response
+    return response
 
+def process_ussd(form) -> Tuple[str, str]:
+    """Answer one hop; returns (response, stage the hop arrived on)"""
+    rejected = reject_invalid(form)
+    if rejected:
+        return rejected, 'rejected'
+
+    session_id = form['sessionId']
+    phone_number = form['phoneNumber']
+    stage = 'auth'
     try:
         # Session management
-        session = get_user_session(session_id)
-        
-        # Sandbox handling
-        if Config.AT_SANDBOX and phone_number != Config.AT_SANDBOX_NUMBER:
-            session['real_phone'] = phone_number  # Store actual number
-            phone_number = Config.AT_SANDBOX_NUMBER  # Process as sandbox number
-        
-        # Process USSD input
-        response = handle_main_menu(
-            inputs=text_input.split('*') if text_input else [],
-            phone=phone_number,
-            session=session
-        )
-        
+        with SESSION_STORE_SECONDS.time('get'):
+            session = get_user_session(session_id)
+        stage = session.get('stage', 'auth')
+
+        response = route_hop(session, phone_number, form.get('text', '').strip())
+
         # Update session
-        update_user_session(session_id, session)
+        with SESSION_STORE_SECONDS.time('update'):
+            update_user_session(session_id, session)
         
-        return response
+        return response, stage
 
     except Exception as e:
-        logging.critical(
-            f"USSD Processing Failed - "
-            f"Session: {session_id} | "
-            f"Phone: {phone_number} | "
-            f"Error: {str(e)}"
+        logger.critical(
+            "USSD Processing Failed - Session: %s | Phone: %s | Error: %s",
+            session_id, phone_number, e
         )
-        return "END System error. Please try again."
+        return "END System error. Please try again.", stage
 
-@app.route('/health', methods=['GET'])
-def health_check():
-    """Health check endpoint"""
-    return jsonify({
+def record_hop(form, stage: str, response: str, received_at: float, start_time: float) -> float:
+    """Metrics, the sampled interaction log and capture for one hop; returns its duration in ms"""
+    duration = time.perf_counter() - start_time
+    USSD_REQUEST_SECONDS.observe(duration, stage)
+    
+    if should_sample():
+        logger.info(
+            "USSD Request - Session: %s | Phone: %s | Input: '%s' | Response: '%s' | Processed in %.3fs",
+            form.get('sessionId'), form.get('phoneNumber'), form.get('text', ''), response, duration
+        )
+    if capture:
+        # Every hop, unsampled, for benchmarks/ussd_replay.py
+        capture.info({
+            't': round(received_at, 3),
+            'sid': form.get('sessionId'),
+            'phone': form.get('phoneNumber'),
+            'code': form.get('serviceCode'),
+            'text': form.get('text', ''),
+            'resp': response,
+            'ms': round(duration * 1000, 2)
+        })
+    return duration * 1000
+
+@app.route('/ussd', methods=['POST'])
+def ussd():
+    received_at = time.time()
+    start_time = time.perf_counter()
+    try:
+        response, stage = process_ussd(request.form)
+    except Exception as e:
+        logger.error("USSD Error: %s", e)
+        response, stage = "END System error. Please try again.", 'error'
+    elapsed_ms = record_hop(request.form, stage, response, received_at, start_time)
+    return response, 200, {'Server-Timing': f"app;dur={elapsed_ms:.2f}"}
+
+def health_payload() -> Dict:
+    return {
         "status": "healthy",
         "timestamp": datetime.now().isoformat(),
-        "active_sessions": len(_sessions),
+        "sessions": session_stats(),
+        "sms_queue": sms_queue.stats(),
+        "employees": directory.stats(),
+        "render_cache": render_cache.stats(),
+        "leave": leave_calendar.stats(),
+        "document_tokens": document_tokens.stats(),
+        "documents": document_store.stats(),
+        "payroll": payroll.stats(),
+        "latency": latency_summary(),
         "mode": "sandbox" if Config.AT_SANDBOX else "production"
-    })
+    }
+
+@app.route('/health', methods=['GET'])
+def health_check():
+    """Health check endpoint"""
+    return jsonify(health_payload())
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Latency histograms in Prometheus text format"""
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/leave/decisions', methods=['POST'])
+def leave_decisions():
+    """Approve/reject many leave requests in one transaction (HR systems, scripts)"""
+    status, body = bulk_decisions(request.headers.get('X-Approvals-Token'), request.get_json(silent=True))
+    return jsonify(body), status
+
+@app.route('/documents/<doc_type>/<phone>', methods=['GET'])
+def document_link(doc_type, phone):
+    """Serve a document from an SMS link; Range and If-None-Match are honoured
+    (with the document's ETag, until the link expires).
+
+    The file is handed to the WSGI server's file wrapper (sendfile under
+    gunicorn), so it is never read into Python memory.
+    """
+    validators = list(request.if_none_match)
+    if request.if_range.etag:
+        validators.append(request.if_range.etag)
+    status, body, document = verify_document_link(doc_type, phone, request.args.get('token'), validators)
+    if document is None:
+        return jsonify(body), status
+    try:
+        return send_file(document.path, as_attachment=True, download_name=document.name, conditional=True,
+                         etag=document.etag, last_modified=document.mtime)
+    except FileNotFoundError:
+        return jsonify({"error": "Document no longer available"}), 404
 
 def cleanup_sessions():
     """Regular session cleanup job"""
     with app.app_context():
         try:
             deleted = cleanup_old_sessions()
-            logging.info(f"Cleaned up {deleted} stale sessions")
+            if deleted:
+                logger.info("Cleaned up %d stale sessions", deleted)
         except Exception as e:
-            logging.error(f"Session cleanup failed: {str(e)}")
+            logger.error("Session cleanup failed: %s", e)
 
-if __name__ == '__main__':
+def start_scheduler() -> BackgroundScheduler:
+    """Background maintenance and broadcast jobs (also started by asgi.py)"""
     # Initialize scheduler with timezone
     scheduler = BackgroundScheduler(timezone=pytz.timezone('Africa/Nairobi'))
-    scheduler.add_job(cleanup_sessions, 'interval', minutes=30)
+    scheduler.add_job(cleanup_sessions, 'interval', minutes=1)
+    scheduler.add_job(directory.reload_if_changed, 'interval', minutes=1)
+    scheduler.add_job(compact_clock_records, 'interval', minutes=10)
+    scheduler.add_job(report_db.compact, 'interval', minutes=10)
+    scheduler.add_job(leave_calendar.compact, 'interval', minutes=10)
+    scheduler.add_job(document_store.purge_expired, 'interval', hours=1)
+    scheduler.add_job(summary_engine.refresh, 'interval', minutes=30)
+    scheduler.add_job(summary_engine.broadcast, 'cron', hour=18, minute=30, args=['daily'])
+    scheduler.add_job(summary_engine.broadcast, 'cron', day_of_week='fri', hour=18, minute=45, args=['weekly'])
     scheduler.start()
+    return scheduler
+
+if __name__ == '__main__':
+    scheduler = start_scheduler()
     
     try:
         app.run(
@@ -135,3 +238,4 @@ if __name__ == '__main__':
         )
     finally:
         scheduler.shutdown()
+        sms_queue.shutdown(drain=True)
@@ -0,0 +1,225 @@
+"""ASGI entry point: serve the gateway from one event loop.
+
+    uvicorn asgi:app --host 0.0.0.0 --port 5000
+
+Hops are parsed, rate limited and read from / written to the session store
+on the loop (SQLite sessions go through a worker thread). The synchronous
+menu handlers run on a small thread pool (ASGI_BRIDGE_THREADS), inside
+deferred_durability(): a clock-in or report no longer holds its thread
+while the journal commits, the loop awaits the commit before answering.
+Thousands of in-flight hops therefore cost coroutines, not threads.
+Document downloads are streamed from a memory map in small chunks (or
+handed to the server with zero-copy send where it offers it), so a
+payday of PDF downloads never holds whole files in Python memory.
+"""
+import asyncio
+import json
+import mimetypes
+import mmap
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
+from urllib.parse import parse_qs, parse_qsl
+from werkzeug.http import http_date, parse_etags, parse_if_range_header, parse_range_header
+
+from app import health_payload, logger, record_hop, reject_invalid, route_hop, start_scheduler
+from config import Config
+from handlers.approval_handler import bulk_decisions
+from handlers.document_handler import verify_document_link
+from sessions import get_user_session_async, update_user_session_async
+from utils.document_store import StoredDocument
+from utils.journal import Journal, await_synced, deferred_durability
+from utils.metrics import SESSION_STORE_SECONDS, render_metrics
+from utils.sms_queue import sms_queue
+
+_DOCUMENT_CHUNK = 64 * 1024
+_bridge = ThreadPoolExecutor(max_workers=Config.ASGI_BRIDGE_THREADS, thread_name_prefix='ussd-bridge')
+
+
+def _route_deferred(session: Dict, phone_number: str, text_input: str) -> Tuple[str, List[Tuple[Journal, int]]]:
+    with deferred_durability() as waits:
+        response = route_hop(session, phone_number, text_input)
+    return response, waits
+
+
+async def process_ussd_async(form: Dict) -> Tuple[str, str]:
+    """Async counterpart of app.process_ussd; returns (response, stage)"""
+    rejected = reject_invalid(form)
+    if rejected:
+        return rejected, 'rejected'
+
+    session_id = form['sessionId']
+    phone_number = form['phoneNumber']
+    stage = 'auth'
+    try:
+        with SESSION_STORE_SECONDS.time('get'):
+            session = await get_user_session_async(session_id)
+        stage = session.get('stage', 'auth')
+
+        loop = asyncio.get_running_loop()
+        response, waits = await loop.run_in_executor(
+            _bridge, _route_deferred, session, phone_number, form.get('text', '').strip()
+        )
+        await await_synced(waits)
+
+        with SESSION_STORE_SECONDS.time('update'):
+            await update_user_session_async(session_id, session)
+        return response, stage
+
+    except Exception as e:
+        logger.critical(
+            "USSD Processing Failed - Session: %s | Phone: %s | Error: %s",
+            session_id, phone_number, e
+        )
+        return "END System error. Please try again.", stage
+
+
+# --- HTTP plumbing ---
+async def _read_body(receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+
+async def _respond(send, status: int, body: str, content_type: str, headers: List = ()) -> None:
+    payload = body.encode('utf-8')
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', content_type.encode()), (b'content-length', str(len(payload)).encode()),
+                    *headers]
+    })
+    await send({'type': 'http.response.body', 'body': payload})
+
+
+async def _ussd(receive, send) -> None:
+    received_at = time.time()
+    start_time = time.perf_counter()
+    form = dict(parse_qsl((await _read_body(receive)).decode('utf-8'), keep_blank_values=True))
+    try:
+        response, stage = await process_ussd_async(form)
+    except Exception as e:
+        logger.error("USSD Error: %s", e)
+        response, stage = "END System error. Please try again.", 'error'
+    elapsed_ms = record_hop(form, stage, response, received_at, start_time)
+    await _respond(send, 200, response, 'text/html; charset=utf-8',
+                   [(b'server-timing', f"app;dur={elapsed_ms:.2f}".encode())])
+
+
+async def _leave_decisions(scope, receive, send) -> None:
+    headers = dict(scope['headers'])
+    token = headers.get(b'x-approvals-token', b'').decode('latin-1') or None
+    try:
+        payload = json.loads(await _read_body(receive) or b'null')
+    except ValueError:
+        payload = None
+    status, body = await asyncio.get_running_loop().run_in_executor(_bridge, bulk_decisions, token, payload)
+    await _respond(send, status, json.dumps(body), 'application/json')
+
+
+async def _document_link(scope, send, doc_type: str, phone: str) -> None:
+    token = parse_qs(scope.get('query_string', b'').decode('latin-1')).get('token', [None])[0]
+    request_headers = dict(scope['headers'])
+    validators = list(parse_etags(request_headers.get(b'if-none-match', b'').decode('latin-1')))
+    if_range = parse_if_range_header(request_headers.get(b'if-range', b'').decode('latin-1')).etag
+    if if_range:
+        validators.append(if_range)
+    status, body, document = await asyncio.get_running_loop().run_in_executor(
+        _bridge, verify_document_link, doc_type, phone, token, validators
+    )
+    if document is None:
+        await _respond(send, status, json.dumps(body), 'application/json')
+        return
+    try:
+        f = open(document.path, 'rb')
+    except FileNotFoundError:
+        await _respond(send, 404, json.dumps({"error": "Document no longer available"}), 'application/json')
+        return
+    with f:
+        await _send_document(scope, send, document, f)
+
+
+async def _send_document(scope, send, document: StoredDocument, f) -> None:
+    """Full, ranged (206/416) or not-modified (304) response for an open document"""
+    request_headers = dict(scope['headers'])
+    etag = f'"{document.etag}"'
+    headers = [(b'etag', etag.encode()), (b'last-modified', http_date(document.mtime).encode()),
+               (b'accept-ranges', b'bytes'), (b'cache-control', b'private, no-cache')]
+    if_none_match = request_headers.get(b'if-none-match')
+    if if_none_match and parse_etags(if_none_match.decode('latin-1')).contains(document.etag):
+        await send({'type': 'http.response.start', 'status': 304, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': b''})
+        return
+
+    start, end, status = 0, document.size, 200
+    range_header = request_headers.get(b'range')
+    if_range = request_headers.get(b'if-range', etag.encode())
+    byte_range = parse_range_header(range_header.decode('latin-1')) if range_header else None
+    if byte_range is not None and if_range.decode('latin-1') == etag:
+        span = byte_range.range_for_length(document.size)
+        if span is None:
+            await send({'type': 'http.response.start', 'status': 416,
+                        'headers': headers + [(b'content-range', f"bytes */{document.size}".encode()),
+                                              (b'content-length', b'0')]})
+            await send({'type': 'http.response.body', 'body': b''})
+            return
+        (start, end), status = span, 206
+        headers.append((b'content-range', f"bytes {start}-{end - 1}/{document.size}".encode()))
+
+    content_type = mimetypes.guess_type(document.name)[0] or 'application/octet-stream'
+    await send({'type': 'http.response.start', 'status': status, 'headers': headers + [
+        (b'content-type', content_type.encode()), (b'content-length', str(end - start).encode()),
+        (b'content-disposition', f'attachment; filename="{document.name}"'.encode())
+    ]})
+    if end == start:
+        await send({'type': 'http.response.body', 'body': b''})
+    elif 'http.response.zerocopysend' in scope.get('extensions', {}):
+        await send({'type': 'http.response.zerocopysend', 'file': f, 'offset': start, 'count': end - start})
+    else:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            for offset in range(start, end, _DOCUMENT_CHUNK):
+                stop = min(offset + _DOCUMENT_CHUNK, end)
+                await send({'type': 'http.response.body', 'body': view[offset:stop], 'more_body': stop < end})
+
+
+async def _lifespan(receive, send) -> None:
+    scheduler = None
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            scheduler = start_scheduler()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            if scheduler:
+                scheduler.shutdown()
+            await asyncio.get_running_loop().run_in_executor(None, sms_queue.shutdown)
+            _bridge.shutdown(wait=True)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send) -> None:
+    if scope['type'] == 'lifespan':
+        return await _lifespan(receive, send)
+    if scope['type'] != 'http':
+        return
+
+    route = (scope['method'], scope['path'])
+    if route == ('POST', '/ussd'):
+        await _ussd(receive, send)
+    elif route == ('GET', '/health'):
+        await _respond(send, 200, json.dumps(health_payload()), 'application/json')
+    elif route == ('GET', '/metrics'):
+        await _respond(send, 200, render_metrics(), 'text/plain; version=0.0.4; charset=utf-8')
+    elif route == ('POST', '/leave/decisions'):
+        await _leave_decisions(scope, receive, send)
+    elif scope['method'] == 'GET' and scope['path'].startswith('/documents/') and scope['path'].count('/') == 3:
+        _, _, doc_type, phone = scope['path'].split('/')
+        await _document_link(scope, send, doc_type, phone)
+    elif scope['path'] in ('/ussd', '/health', '/metrics', '/leave/decisions'):
+        await _respond(send, 405, "Method Not Allowed", 'text/plain')
+    else:
+        await _respond(send, 404, "Not Found", 'text/plain')
@@ -0,0 +1,153 @@
+"""Compare the threaded Flask gateway with the ASGI entry point under concurrency.
+
+Both modes replay the default load scenarios in-process, each in its own
+subprocess and scratch directory, with SMS_PROVIDER=stub:
+
+    threaded  one thread per in-flight session (what threaded=True does),
+              driving the Flask app through its test client
+    asgi      one event loop, each session a coroutine calling asgi.app
+              directly; handlers run on ASGI_BRIDGE_THREADS worker threads
+
+Neither mode opens sockets, so this isolates the serving model; for an
+over-the-wire comparison run benchmarks/ussd_load.py --url against
+`python app.py` and `uvicorn asgi:app`. Reports hops/s, per-hop latency
+and the peak number of live threads. Usage:
+
+    python benchmarks/bench_asgi.py [--sessions 2000] [--concurrency 500]
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import urlencode
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from ussd_load import (EMPLOYEE_IDS, REPO, Results, in_process_poster, load_scenarios, run_load, seed_payslips,
+                       session_phone)
+
+SCENARIOS = os.path.join(REPO, 'benchmarks', 'scenarios', 'default.jsonl')
+
+
+class _ThreadPeak:
+    """Samples threading.active_count() in the background"""
+
+    def __init__(self):
+        self.peak = threading.active_count()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+
+    def _sample(self) -> None:
+        while not self._stop.wait(0.005):
+            self.peak = max(self.peak, threading.active_count())
+
+    def stop(self) -> int:
+        self._stop.set()
+        self._thread.join()
+        return self.peak
+
+
+async def _asgi_post(app, session_id: str, phone: str, text: str):
+    body = urlencode({'sessionId': session_id, 'phoneNumber': phone, 'serviceCode': '*384#', 'text': text}).encode()
+    response = {}
+
+    async def receive():
+        return {'type': 'http.request', 'body': body, 'more_body': False}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            response['status'] = message['status']
+        else:
+            response['body'] = message['body'].decode()
+
+    await app({'type': 'http', 'method': 'POST', 'path': '/ussd', 'headers': []}, receive, send)
+    return response['status'], response['body']
+
+
+async def _asgi_session(app, scenario, n: int, results: Results, gate: asyncio.Semaphore) -> None:
+    from datetime import date, timedelta
+    context = {'emp_id': EMPLOYEE_IDS[n % len(EMPLOYEE_IDS)],
+               'start_date': (date.today() + timedelta(days=1)).strftime('%d-%m-%Y'), 'n': n}
+    segments = []
+    async with gate:
+        for hop in scenario['hops']:
+            if hop['input']:
+                segments.append(hop['input'].format(**context))
+            started = time.perf_counter()
+            status, body = await _asgi_post(app, f"asgi-{n}", session_phone(n), '*'.join(segments))
+            results.hop(scenario['scenario'], hop['name'], time.perf_counter() - started)
+            if status != 200 or not body.startswith(hop['expect']):
+                results.error(f"unexpected:{scenario['scenario']}/{hop['name']}")
+                results.session(scenario['scenario'], False)
+                return
+        results.session(scenario['scenario'], True)
+
+
+def _run_asgi(sessions: int, concurrency: int) -> dict:
+    import random
+    os.environ.setdefault('SMS_PROVIDER', 'stub')
+    import tempfile
+    os.chdir(tempfile.mkdtemp(prefix='bench-asgi-'))
+    from asgi import app
+    seed_payslips(map(session_phone, range(sessions)))
+
+    scenarios = load_scenarios(SCENARIOS)
+    plan = random.Random(0).choices(scenarios, weights=[s['weight'] for s in scenarios], k=sessions)
+    results = Results()
+
+    async def drive():
+        gate = asyncio.Semaphore(concurrency)
+        await asyncio.gather(*(_asgi_session(app, scenario, n, results, gate) for n, scenario in enumerate(plan)))
+
+    started = time.perf_counter()
+    asyncio.run(drive())
+    return results.report(time.perf_counter() - started)
+
+
+def _run_mode(mode: str, sessions: int, concurrency: int) -> None:
+    peak = _ThreadPeak()
+    if mode == 'asgi':
+        report = _run_asgi(sessions, concurrency)
+    else:
+        post = in_process_poster(map(session_phone, range(sessions)))
+        report = run_load(post, load_scenarios(SCENARIOS), sessions, concurrency)
+    report['peak_threads'] = peak.stop()
+    print(json.dumps(report))
+    sys.stdout.flush()
+    os._exit(0)  # Skip draining the stub SMS queue; it is not part of the measurement
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sessions', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=500)
+    parser.add_argument('--mode', choices=['threaded', 'asgi'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        _run_mode(args.mode, args.sessions, args.concurrency)
+        return
+
+    print(f"{args.sessions:,} sessions at concurrency {args.concurrency}")
+    for mode in ('threaded', 'asgi'):
+        output = subprocess.run(
+            [sys.executable, __file__, '--mode', mode, '--sessions', str(args.sessions),
+             '--concurrency', str(args.concurrency)],
+            check=True, capture_output=True, text=True
+        ).stdout
+        report = json.loads(output.strip().splitlines()[-1])
+        hops = [row for row in report['per_hop'].values()]
+        worst_p99 = max(hops, key=lambda row: row['p99_ms'])['p99_ms']
+        clock_in = report['per_hop'].get('clock_in/clock_in', {})
+        print(f"  {mode:<9} {report['hops_per_s']:>8,.0f} hops/s  errors {report['error_rate']:.2%}  "
+              f"peak threads {report['peak_threads']:>4}  clock-in p50/p99 "
+              f"{clock_in.get('p50_ms', 0):.1f}/{clock_in.get('p99_ms', 0):.1f} ms  worst hop p99 {worst_p99:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""Benchmark department rank / peer average queries under rating churn.
+
+Fills --departments departments of --size rated members each, then
+interleaves rating updates and standing() queries, and compares a query
+against recomputing the department from scratch (collect, sort, average),
+which is what a view would cost without the maintained index. Usage:
+
+    python benchmarks/bench_department_ranking.py [--size 50000] [--departments 4]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.department_ranking import DepartmentRanking
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', type=int, default=50_000)
+    parser.add_argument('--departments', type=int, default=4)
+    parser.add_argument('--operations', type=int, default=100_000)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    ranking = DepartmentRanking()
+    ratings = {}
+    members = args.size * args.departments
+    started = time.perf_counter()
+    for n in range(members):
+        ratings[n] = round(rng.uniform(1, 5), 1)
+        ranking.update(n, f"Dept {n % args.departments}", ratings[n])
+    print(f"{members:,} members loaded in {time.perf_counter() - started:.2f}s")
+
+    updates = queries = 0.0
+    for _ in range(args.operations):
+        n = rng.randrange(members)
+        ratings[n] = round(rng.uniform(1, 5), 1)
+        t = time.perf_counter()
+        ranking.update(n, f"Dept {n % args.departments}", ratings[n])
+        updates += time.perf_counter() - t
+        t = time.perf_counter()
+        ranking.standing(rng.randrange(members))
+        queries += time.perf_counter() - t
+    print(f"update:   {updates / args.operations * 1e6:.2f} us")
+    print(f"standing: {queries / args.operations * 1e6:.2f} us")
+
+    # Recompute-per-view baseline for one member
+    samples = 20
+    t = time.perf_counter()
+    for _ in range(samples):
+        n = rng.randrange(members)
+        department = [ratings[m] for m in range(n % args.departments, members, args.departments)]
+        department.sort()
+        rank = sum(1 for r in department if r > ratings[n]) + 1
+        peers = (sum(department) - ratings[n]) / (len(department) - 1)
+    print(f"recompute per view: {(time.perf_counter() - t) / samples * 1e6:,.0f} us")
+
+    # The maintained figures agree with the recomputed ones
+    n = rng.randrange(members)
+    department = [ratings[m] for m in range(n % args.departments, members, args.departments)]
+    standing = ranking.standing(n)
+    assert standing.rank == sum(1 for r in department if r > ratings[n]) + 1
+    assert abs(standing.peer_average - (sum(department) - ratings[n]) / (len(department) - 1)) < 1e-6
+
+
+if __name__ == '__main__':
+    main()
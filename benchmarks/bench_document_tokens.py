@@ -0,0 +1,68 @@
+"""Benchmark document link verification for a payroll-day SMS blast.
+
+Issues --links tokens (one payslip link per employee), then verifies each
+once from --threads concurrent requests (full HMAC check plus the replay
+filter), opens them again within the grace window (LRU hits), replays
+them once past the grace window (refused by the replay filter), and
+sends forged and mismatched tokens. Prints verifications per second for
+each. Usage:
+
+    python benchmarks/bench_document_tokens.py [--links 100000] [--threads 16]
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('SMS_PROVIDER', 'stub')
+
+from utils.document_tokens import DocumentTokens, TokenRejected
+
+
+def _run(label: str, tokens: DocumentTokens, links: list, threads: int) -> None:
+    outcomes = {}
+
+    def verify(link) -> str:
+        token, phone = link
+        try:
+            tokens.verify(token, phone, 'payslip')
+            return 'ok'
+        except TokenRejected as e:
+            return e.reason
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        for outcome in pool.map(verify, links, chunksize=256):
+            outcomes[outcome] = outcomes.get(outcome, 0) + 1
+    elapsed = time.perf_counter() - started
+    print(f"{label:<34} {len(links) / elapsed:10,.0f}/s  {outcomes}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--links', type=int, default=100_000)
+    parser.add_argument('--threads', type=int, default=16)
+    args = parser.parse_args()
+
+    tokens = DocumentTokens('bench-secret', cache_size=args.links)
+    phones = [f"+2547{n:08d}" for n in range(args.links)]
+    started = time.perf_counter()
+    links = [(tokens.issue(phone, 'payslip')[0], phone) for phone in phones]
+    print(f"issue: {args.links / (time.perf_counter() - started):,.0f}/s")
+
+    _run("first click (HMAC + replay filter)", tokens, links, args.threads)
+    _run("repeat click within grace (LRU)", tokens, links, args.threads)
+    tokens._recent.clear()  # As if past the grace window
+    tokens._replays._first_used.clear()
+    _run("replay (replay filter)", tokens, links, args.threads)
+    forged = [(token[:-4] + 'AAAA', phone) for token, phone in links[:args.links // 10]]
+    _run("forged signature", tokens, forged, args.threads)
+    swapped = [(token, phones[(n + 1) % args.links]) for n, (token, _) in enumerate(links[:args.links // 10])]
+    _run("token for another phone", tokens, swapped, args.threads)
+    print(tokens.stats())
+
+
+if __name__ == '__main__':
+    main()
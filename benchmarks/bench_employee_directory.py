@@ -0,0 +1,94 @@
+"""Benchmark the employee directory on a generated roster.
+
+Writes a CSV roster (10 employees per manager, 50 departments), then
+measures the build time and memory, authenticate()/reports_of() latency,
+and lookups from a reader thread while reload() rebuilds the index. The
+reader must not stall during the rebuild. Usage:
+
+    python benchmarks/bench_employee_directory.py [--employees 200000]
+"""
+import argparse
+import csv
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.employee_directory import EmployeeDirectory
+
+
+def _rss_mib() -> float:
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * resource.getpagesize() / 2 ** 20
+
+
+def _write_roster(path: str, employees: int) -> None:
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['emp_id', 'name', 'phone', 'department', 'manager_id', 'roles'])
+        for n in range(employees):
+            manager = f"E{n // 10:07d}" if n >= 10 else ''
+            roles = 'employee|manager' if n < employees // 10 else 'employee'
+            writer.writerow([f"E{n:07d}", f"Employee {n}", f"+2547{n:08d}", f"Dept {n % 50}", manager, roles])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--employees', type=int, default=200_000)
+    parser.add_argument('--lookups', type=int, default=200_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'employees.csv')
+        _write_roster(path, args.employees)
+
+        rss_before = _rss_mib()
+        started = time.perf_counter()
+        directory = EmployeeDirectory(path)
+        build = time.perf_counter() - started
+        print(f"{len(directory):,} employees built in {build:.2f}s, RSS +{_rss_mib() - rss_before:,.0f} MiB")
+
+        sample = [random.randrange(args.employees) for _ in range(args.lookups)]
+        started = time.perf_counter()
+        for n in sample:
+            directory.authenticate(f"E{n:07d}", f"+2547{n:08d}")
+        elapsed = time.perf_counter() - started
+        print(f"authenticate: {elapsed / args.lookups * 1e6:.2f} us/lookup")
+
+        started = time.perf_counter()
+        for n in sample[:20_000]:
+            directory.reports_of(f"E{n // 10:07d}")
+        print(f"reports_of:   {(time.perf_counter() - started) / 20_000 * 1e6:.2f} us/lookup")
+
+        # Reader keeps authenticating while the index is rebuilt
+        done = threading.Event()
+        stalls = []
+
+        def reader():
+            count = 0
+            while not done.is_set():
+                t = time.perf_counter()
+                assert directory.authenticate('E0000001', '+254700000001')
+                stalls.append(time.perf_counter() - t)
+                count += 1
+            stalls.append(count)
+
+        thread = threading.Thread(target=reader)
+        thread.start()
+        started = time.perf_counter()
+        directory.reload()
+        reload_time = time.perf_counter() - started
+        done.set()
+        thread.join()
+        count = stalls.pop()
+        print(f"reload: {reload_time:.2f}s; reader made {count:,} lookups meanwhile, "
+              f"slowest {max(stalls) * 1000:.2f} ms (GIL switch interval is 5 ms)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""Benchmark bulk leave approvals and their notifications.
+
+Bulk-books --requests pending requests for teams of 10, then decides
+--decisions of them: through set_status() one at a time (a durable
+journal write each, timed on a sample), through decide() as one journal
+record, and through the approval pipeline (decide + audit log + SMS).
+The SMS queue runs against the stub provider; provider calls are counted
+to show the decisions going out as multi-recipient sends. Usage:
+
+    python benchmarks/bench_leave_approvals.py [--requests 100000] [--decisions 5000]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('SMS_PROVIDER', 'stub')
+os.environ.setdefault('SMS_STUB_LATENCY_MS', '20')
+
+from handlers import approval_handler
+from utils.leave_calendar import LeaveCalendar, format_request_id
+from utils.sms_queue import sms_queue
+
+
+def _seed(calendar: LeaveCalendar, requests: int) -> int:
+    rng = random.Random(0)
+    year_start = date(date.today().year + 1, 1, 1)
+    rows = []
+    for _ in range(requests):
+        n = rng.randrange(requests // 3)
+        leave_type = rng.choice((1, 2, 3))
+        rows.append((f"+2547{n:08d}", f"MGR{n // 10:06d}", leave_type,
+                     year_start + timedelta(days=rng.randrange(360)), rng.randint(1, 5), 21))
+    booked, _ = calendar.import_requests(rows)
+    return booked
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=100_000)
+    parser.add_argument('--decisions', type=int, default=5000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        calendar = LeaveCalendar(tmp)
+        booked = _seed(calendar, args.requests)
+        print(f"{booked:,} pending requests booked")
+        rng = random.Random(1)
+        numbers = rng.sample(range(1, booked + 1), 3 * args.decisions)
+        batches = [numbers[n * args.decisions:(n + 1) * args.decisions] for n in range(3)]
+
+        def choices(batch):
+            return [(format_request_id(number), rng.choice(('approved', 'rejected'))) for number in batch]
+
+        decisions = choices(batches[0][:500])  # A durable write each; a sample is enough
+        t = time.perf_counter()
+        for request_id, status in decisions:
+            calendar.set_status(request_id, status)
+        elapsed = time.perf_counter() - t
+        print(f"set_status one at a time:  {len(decisions) / elapsed:10,.0f} decisions/s")
+
+        decisions = choices(batches[1])
+        t = time.perf_counter()
+        decided, skipped = calendar.decide(decisions)
+        elapsed = time.perf_counter() - t
+        print(f"decide() in one record:    {len(decided) / elapsed:10,.0f} decisions/s ({len(skipped)} skipped)")
+
+        approval_handler.leave_calendar = calendar
+        decisions = choices(batches[2])
+        t = time.perf_counter()
+        decided, _ = approval_handler.apply_decisions(decisions, 'bench')
+        elapsed = time.perf_counter() - t
+        print(f"pipeline (decide+SMS):     {len(decided) / elapsed:10,.0f} decisions/s")
+
+        t = time.perf_counter()
+        sms_queue.shutdown(drain=True, timeout=120)
+        batching = sms_queue.stats()['batching']
+        print(f"{batching['messages']:,} SMS in {batching['provider_calls']:,} provider calls "
+              f"(avg {batching['avg_batch_size']} recipients), drained in {time.perf_counter() - t:.1f}s")
+        print(calendar.stats())
+        calendar.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""Benchmark the leave calendar at organisation scale.
+
+Bulk-books --requests leave requests for --employees employees (teams
+of 10 under one manager, a few requests each over one year), then
+measures the check() run before the confirm screen, days_used(),
+on_leave(), durable submit() from concurrent sessions, and restart time
+from snapshot + journal and from the snapshot alone. Spot-checks the
+indexed answers against a brute-force scan.
+Usage:
+
+    python benchmarks/bench_leave_calendar.py [--employees 100000] [--requests 300000]
+"""
+import argparse
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('SMS_PROVIDER', 'stub')
+
+from utils.leave_calendar import LeaveCalendar, LeaveRejected
+
+MAX_DAYS = {1: 14, 2: 5, 3: 21}
+
+
+def _rss_mib() -> float:
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * resource.getpagesize() / 2 ** 20
+
+
+def _per_op(label: str, count: int, seconds: float) -> None:
+    print(f"{label:<30} {seconds / count * 1e6:8.2f} us")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--employees', type=int, default=100_000)
+    parser.add_argument('--requests', type=int, default=300_000)
+    parser.add_argument('--queries', type=int, default=50_000)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    year_start = date(date.today().year + 1, 1, 1)
+
+    def employee(n: int) -> str:
+        return f"+2547{n:08d}"
+
+    def team(n: int) -> str:
+        return f"MGR{n // 10:06d}"
+
+    def random_request():
+        n = rng.randrange(args.employees)
+        leave_type = rng.choice((1, 2, 3))
+        start = year_start + timedelta(days=rng.randrange(360))
+        return n, leave_type, start, rng.randint(1, min(5, MAX_DAYS[leave_type]))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        rss = _rss_mib()
+        calendar = LeaveCalendar(tmp)
+        rows = []
+        for _ in range(args.requests):
+            n, leave_type, start, days = random_request()
+            rows.append((employee(n), team(n), leave_type, start, days, MAX_DAYS[leave_type]))
+        started = time.perf_counter()
+        accepted, rejected = calendar.import_requests(rows)
+        elapsed = time.perf_counter() - started
+        del rows
+        print(f"{accepted:,} requests booked ({rejected:,} rejected as overlapping/over balance) "
+              f"in {elapsed:.1f}s, RSS +{_rss_mib() - rss:.0f} MiB")
+        _per_op("book (bulk, incl. checks)", args.requests, elapsed)
+
+        queries = [random_request() for _ in range(args.queries)]
+        t = time.perf_counter()
+        for n, leave_type, start, days in queries:
+            try:
+                calendar.check(employee(n), team(n), leave_type, start, days, MAX_DAYS[leave_type])
+            except LeaveRejected:
+                pass
+        _per_op("check (confirm screen)", args.queries, time.perf_counter() - t)
+
+        t = time.perf_counter()
+        for n, leave_type, _, _ in queries:
+            calendar.days_used(employee(n), leave_type, year_start.year)
+        _per_op("days_used", args.queries, time.perf_counter() - t)
+
+        t = time.perf_counter()
+        for n, _, start, _ in queries:
+            calendar.on_leave(team(n), start)
+        _per_op("on_leave", args.queries, time.perf_counter() - t)
+
+        # Brute force agrees with the indexes
+        for n, leave_type, start, _ in queries[:200]:
+            if n % 50:
+                continue
+            active = [r for r in (calendar.get(f"LV-{i:06d}") for i in range(1, accepted + 1))
+                      if r['team'] == team(n) and r['status'] == 'pending']
+            expected = sum(1 for r in active if r['start_date'] <= start.isoformat() <= r['end_date'])
+            assert calendar.on_leave(team(n), start) == expected
+            expected_used = sum(r['days'] for r in active if r['employee'] == employee(n) and r['type'] == leave_type)
+            assert calendar.days_used(employee(n), leave_type, year_start.year) == expected_used
+
+        def submit(request) -> None:
+            n, leave_type, start, days = request
+            try:
+                calendar.submit(employee(n), team(n), leave_type, start, days, MAX_DAYS[leave_type])
+            except LeaveRejected:
+                pass
+
+        submits = [random_request() for _ in range(4000)]
+        t = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=32) as pool:
+            list(pool.map(submit, submits))
+        elapsed = time.perf_counter() - t
+        print(f"submit (durable, 32 sessions):  {len(submits) / elapsed:,.0f}/s")
+
+        calendar._journal.close()
+        t = time.perf_counter()
+        calendar = LeaveCalendar(tmp)
+        print(f"restart replaying the journal: {time.perf_counter() - t:.2f}s")
+        calendar._journal.close()
+        t = time.perf_counter()
+        LeaveCalendar(tmp).close()
+        print(f"restart from the snapshot:     {time.perf_counter() - t:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
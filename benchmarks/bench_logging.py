@@ -0,0 +1,121 @@
+"""Benchmark USSD requests/sec with the logging pipeline on, off, and synchronous.
+
+Drives the Flask app in-process through its test client: each simulated
+session dials, signs in and opens the clock menu, so every hop goes through
+record_hop. Three runs over the same workload:
+
+    queued  - the QueueHandler/QueueListener pipeline (the default)
+    sync    - the old layout: FileHandler + StreamHandler in the request thread
+    off     - every destination disabled
+
+--disk-latency-ms adds a sleep to every file flush to stand in for a slow
+or contended disk; that is the case the queue exists for, since the sleep
+then lands on the listener thread instead of the request. The queued run
+also reports how long its listeners took to drain afterwards.
+
+Runs in a scratch directory so the repo's log files are untouched. Console
+output from the loggers goes to /dev/null for all runs. Usage:
+
+    python benchmarks/bench_logging.py [--sessions 2000] [--sample-rate 1.0] [--disk-latency-ms 0]
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+HOPS = ['', 'EMP123', 'EMP123*1', 'EMP123*1*3']
+
+
+def _drive(client, sessions: int, offset: int) -> float:
+    started = time.perf_counter()
+    for n in range(offset, offset + sessions):
+        form = {'sessionId': f"bench-{n}", 'phoneNumber': f"+2547{n:08d}", 'serviceCode': '*384#'}
+        for text in HOPS:
+            form['text'] = text
+            client.post('/ussd', data=form)
+    return sessions * len(HOPS) / (time.perf_counter() - started)
+
+
+def _drain(listeners) -> float:
+    """Wait for every listener queue to empty; returns the seconds it took"""
+    started = time.perf_counter()
+    while any(listener.queue.qsize() for listener in listeners.values()):
+        time.sleep(0.001)
+    return time.perf_counter() - started
+
+
+def _slow_flushes(latency: float) -> None:
+    """Make every file handler flush take `latency` seconds longer"""
+    flush = logging.StreamHandler.flush
+
+    def slow_flush(handler):
+        time.sleep(latency)
+        flush(handler)
+    logging.FileHandler.flush = slow_flush
+
+
+def _use_sync_handlers(loggers) -> list:
+    """Swap each queue handler for a synchronous file + console pair; returns the originals"""
+    from utils.logging_setup import DESTINATIONS, LOG_FORMAT
+    originals = []
+    for name, logger in loggers.items():
+        originals.append((logger, list(logger.handlers)))
+        logger.handlers = [logging.FileHandler(f"sync_{DESTINATIONS[name][0]}"), logging.StreamHandler()]
+        for handler in logger.handlers:
+            handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    return originals
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sessions', type=int, default=2000)
+    parser.add_argument('--sample-rate', type=float, default=1.0)
+    parser.add_argument('--disk-latency-ms', type=float, default=0.0)
+    args = parser.parse_args()
+
+    os.environ['USSD_LOG_SAMPLE_RATE'] = str(args.sample_rate)
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        from app import app
+        from utils import logging_setup
+        from utils.sms_queue import sms_queue
+
+        client = app.test_client()
+        saved_stderr = os.dup(2)
+        os.dup2(devnull, 2)
+        try:
+            _drive(client, 50, 0)  # Warm up imports, stores and listeners
+            _drain(logging_setup._listeners)
+            if args.disk_latency_ms:
+                _slow_flushes(args.disk_latency_ms / 1000)
+            logging_setup.set_logging_enabled(False)
+            off = _drive(client, args.sessions, 100_000)
+            logging_setup.set_logging_enabled(True)
+            queued = _drive(client, args.sessions, 200_000)
+            drain = _drain(logging_setup._listeners)
+            originals = _use_sync_handlers(logging_setup._loggers)
+            sync = _drive(client, args.sessions, 300_000)
+            for logger, handlers in originals:
+                logger.handlers = handlers
+            sms_queue.shutdown(drain=True)
+            logging_setup.shutdown_logging()
+        finally:
+            os.dup2(saved_stderr, 2)
+        os.chdir(REPO)
+
+    hops = args.sessions * len(HOPS)
+    print(f"{hops:,} USSD hops per run, interaction log sample rate {args.sample_rate}, "
+          f"disk latency {args.disk_latency_ms}ms per flush")
+    for label, rate in (('off', off), ('queued', queued), ('sync', sync)):
+        print(f"  {label:<7} {rate:>9,.0f} req/s  ({rate / off:.0%} of logging off)")
+    print(f"  queued listeners drained {drain:.2f}s after the last request")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""Benchmark the disk-backed performance store.
+
+Writes --records records through update() (batched by the writer
+thread), reopens the store the way a restart would, and measures the
+startup time and memory, get() latency for resident records, disk loads
+and phones with no record, and update throughput. It also checks that
+looking up unknown phones stores nothing. Usage:
+
+    python benchmarks/bench_performance_store.py [--records 200000] [--resident 5000]
+"""
+import argparse
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.performance_store import PerformanceStore
+
+
+def _rss_mib() -> float:
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * resource.getpagesize() / 2 ** 20
+
+
+def _record(n: int) -> dict:
+    return {
+        "last_review": "2025-06-30", "rating": round(1 + n % 40 / 10, 1),
+        "current_goals": [{"id": g, "text": f"Goal {g} for {n}", "progress": (n * g) % 100, "due": "2025-12-31"}
+                          for g in range(1, 4)],
+        "completed_training": [{"course": f"Course {c}", "date": "2025-05-15", "score": "A"} for c in range(2)],
+        "feedback_requests": []
+    }
+
+
+def _per_op(label: str, count: int, seconds: float) -> None:
+    print(f"{label:<28} {seconds / count * 1e6:8.2f} us")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--records', type=int, default=200_000)
+    parser.add_argument('--resident', type=int, default=5000)
+    parser.add_argument('--lookups', type=int, default=50_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'performance.db')
+        store = PerformanceStore(path, max_resident=args.resident)
+        started = time.perf_counter()
+        for n in range(args.records):
+            store.update(f"+2547{n:08d}", lambda record, n=n: record.update(_record(n)))
+        store.close()
+        stats = store.stats()
+        print(f"{args.records:,} updates in {time.perf_counter() - started:.2f}s, "
+              f"{stats['flushes']:,} flushes, db {os.path.getsize(path) / 2 ** 20:.1f} MiB")
+
+        rss = _rss_mib()
+        started = time.perf_counter()
+        store = PerformanceStore(path, max_resident=args.resident)
+        print(f"restart: {(time.perf_counter() - started) * 1000:.1f} ms, RSS +{_rss_mib() - rss:.1f} MiB")
+
+        rng = random.Random(0)
+        hot = [f"+2547{n:08d}" for n in rng.sample(range(args.records), args.resident // 2)]
+        for phone in hot:
+            store.get(phone)
+        t = time.perf_counter()
+        for _ in range(args.lookups):
+            store.get(rng.choice(hot))
+        _per_op("get (resident)", args.lookups, time.perf_counter() - t)
+
+        t = time.perf_counter()
+        for _ in range(args.lookups):
+            store.get(f"+2547{rng.randrange(args.records):08d}")
+        _per_op("get (mostly from disk)", args.lookups, time.perf_counter() - t)
+
+        t = time.perf_counter()
+        for n in range(args.lookups):
+            store.get(f"+2541{n:08d}")
+        _per_op("get (no record, default)", args.lookups, time.perf_counter() - t)
+
+        t = time.perf_counter()
+        for _ in range(args.lookups):
+            phone = rng.choice(hot)
+            store.update(phone, lambda record: record.__setitem__('rating', 3.5))
+        _per_op("update (resident)", args.lookups, time.perf_counter() - t)
+        store.close()
+
+        stats = store.stats()
+        print(f"resident {stats['resident']:,} of {args.records:,}; {stats}")
+        rows = store._conn().execute('SELECT COUNT(*) FROM performance').fetchone()[0]
+        assert rows == args.records, "default records must not be stored"
+
+
+if __name__ == '__main__':
+    main()
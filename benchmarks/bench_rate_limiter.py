@@ -0,0 +1,83 @@
+"""Compare the sliding-window RateLimiter against the original list-based one.
+
+Each implementation runs in its own subprocess so resident memory is measured
+in isolation. Usage:
+
+    python benchmarks/bench_rate_limiter.py [--phones 1000000] [--rounds 3]
+"""
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class LegacyRateLimiter:
+    """The list-of-timestamps limiter this benchmark replaces."""
+
+    def __init__(self, max_requests, period_seconds):
+        self.max_requests = max_requests
+        self.period_seconds = period_seconds
+        self.requests = defaultdict(list)
+
+    def is_allowed(self, client_id):
+        now = time.time()
+        self.requests[client_id] = [
+            t for t in self.requests[client_id]
+            if now - t < self.period_seconds
+        ]
+        if len(self.requests[client_id]) < self.max_requests:
+            self.requests[client_id].append(now)
+            return True
+        return False
+
+
+def _rss_kb() -> int:
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * resource.getpagesize() // 1024
+
+
+def run_single(impl: str, phones: int, rounds: int) -> None:
+    if impl == 'legacy':
+        limiter = LegacyRateLimiter(max_requests=10, period_seconds=60)
+    else:
+        from utils.rate_limiter import RateLimiter
+        limiter = RateLimiter(max_requests=10, period_seconds=60)
+
+    ids = [f"2547{n:08d}" for n in range(phones)]
+    rss_before = _rss_kb()
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for phone in ids:
+            limiter.is_allowed(phone)
+    elapsed = time.perf_counter() - start
+    ops = phones * rounds
+    print(f"{impl:>8}: {ops / elapsed:>12,.0f} ops/sec | "
+          f"RSS +{(_rss_kb() - rss_before) / 1024:,.1f} MiB for {phones:,} phones")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--phones', type=int, default=1_000_000)
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--impl', choices=['legacy', 'current'])
+    args = parser.parse_args()
+
+    if args.impl:
+        run_single(args.impl, args.phones, args.rounds)
+        return
+
+    for impl in ('legacy', 'current'):
+        subprocess.run(
+            [sys.executable, __file__, '--impl', impl,
+             '--phones', str(args.phones), '--rounds', str(args.rounds)],
+            check=True
+        )
+
+
+if __name__ == '__main__':
+    main()
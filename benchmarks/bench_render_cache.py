@@ -0,0 +1,68 @@
+"""Benchmark the performance screens with and without the render cache.
+
+Seeds --employees performance records with a few goals and courses each,
+then repeatedly opens the goals menu, a goal detail and training history,
+and renders the SMS report, for random employees. It runs once with the
+cache disabled (size 0) and once enabled, with --writes of rating/goal
+updates per 1000 views to exercise invalidation. Usage:
+
+    python benchmarks/bench_render_cache.py [--employees 5000] [--views 200000]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('SMS_PROVIDER', 'stub')
+
+from handlers import performance_handler as perf
+from utils.render_cache import RenderCache
+
+
+def _seed(employees: int) -> list:
+    phones = [f"+2547{n:08d}" for n in range(employees)]
+    for n, phone in enumerate(phones):
+        perf.set_rating(phone, round(1 + n % 40 / 10, 1), '2025-06-30')
+        perf.set_goals(phone, [{"id": g, "text": f"Goal {g}", "progress": (n * g) % 100, "due": "2025-12-31"}
+                               for g in range(1, 5)])
+        for c in range(3):
+            perf.record_training(phone, f"Course {c}", "2025-05-15", "A")
+    return phones
+
+
+def _run(phones: list, views: int, writes: int) -> float:
+    rng = random.Random(1)
+    session = {}
+    started = time.perf_counter()
+    for n in range(views):
+        phone = rng.choice(phones)
+        perf._handle_view_goals([], phone, session)
+        perf._handle_view_goals(['2'], phone, session)
+        perf._handle_view_training(phone)
+        perf.render_cache.get(phone, 'report', lambda: perf._render_report(perf._get_user_data(phone)))
+        if rng.randrange(1000) < writes:
+            perf.update_goal_progress(rng.choice(phones), 2, rng.randrange(100))
+    return time.perf_counter() - started
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--employees', type=int, default=5000)
+    parser.add_argument('--views', type=int, default=200_000)
+    parser.add_argument('--writes', type=int, default=10, help="Updates per 1000 views")
+    args = parser.parse_args()
+
+    phones = _seed(args.employees)
+    for label, size in (('uncached', 0), ('cached', args.employees)):
+        perf.render_cache = RenderCache(size)
+        elapsed = _run(phones, args.views, args.writes)
+        stats = perf.render_cache.stats()
+        print(f"{label:<9} {elapsed / args.views * 1e6:6.2f} us per view set  "
+              f"hit rate {stats['hit_rate']:.1%}  invalidations {stats['invalidations']:,}")
+    os._exit(0)  # Nothing was queued; skip the SMS queue drain
+
+
+if __name__ == '__main__':
+    main()
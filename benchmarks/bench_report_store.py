@@ -0,0 +1,116 @@
+"""Benchmark per-employee report lookups: indexed ReportStore vs the old full scan.
+
+Loads one report per employee per day into a ReportStore, then times
+"latest 10", a 30-day range query and a journaled save. The legacy
+scan-and-sort lookup is timed on a smaller dict (--legacy-employees)
+because at full size it would need tens of GB. Usage:
+
+    python benchmarks/bench_report_store.py [--employees 100000] [--days 365]
+"""
+import argparse
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.report_store import ReportStore
+
+STATUSES = ['Present', 'Sick Leave', 'Emergency']
+
+
+def _rss_mib() -> float:
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * resource.getpagesize() / 2 ** 20
+
+
+def _percentiles(samples):
+    samples = sorted(samples)
+    return {p: samples[min(len(samples) - 1, int(len(samples) * p / 100))] * 1e6 for p in (50, 99)}
+
+
+def _rows(employees: int, days: int, start: date):
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        ts = datetime.combine(day, datetime.min.time()).timestamp() + 9 * 3600
+        for n in range(employees):
+            yield f"2547{n:08d}", day, STATUSES[(n + offset) % 3], ts
+
+
+def bench_store(employees: int, days: int, queries: int) -> None:
+    start = date.today() - timedelta(days=days)
+    phones = [f"2547{n:08d}" for n in random.sample(range(employees), min(queries, employees))]
+    with tempfile.TemporaryDirectory() as tmp:
+        rss_before = _rss_mib()
+        t0 = time.perf_counter()
+        store = ReportStore(tmp)
+        loaded = store.import_reports(_rows(employees, days, start))
+        build = time.perf_counter() - t0
+        print(f"ReportStore: loaded {loaded:,} reports in {build:.1f}s, RSS +{_rss_mib() - rss_before:,.0f} MiB, "
+              f"snapshot {os.path.getsize(os.path.join(tmp, 'reports.snapshot')) / 2 ** 20:,.0f} MiB")
+
+        timings = []
+        for phone in phones:
+            t = time.perf_counter()
+            store.latest(phone, 10)
+            timings.append(time.perf_counter() - t)
+        p = _percentiles(timings)
+        print(f"  latest(10):      p50 {p[50]:8.1f}us  p99 {p[99]:8.1f}us")
+
+        timings = []
+        range_end = start + timedelta(days=days - 1)
+        for phone in phones:
+            t = time.perf_counter()
+            store.between(phone, range_end - timedelta(days=29), range_end)
+            timings.append(time.perf_counter() - t)
+        p = _percentiles(timings)
+        print(f"  between(30d):    p50 {p[50]:8.1f}us  p99 {p[99]:8.1f}us")
+
+        timings = []
+        for phone in phones[:1000]:
+            t = time.perf_counter()
+            store.save(phone, 'Emergency')
+            timings.append(time.perf_counter() - t)
+        p = _percentiles(timings)
+        print(f"  save (journaled):p50 {p[50]:8.1f}us  p99 {p[99]:8.1f}us")
+        store.close()
+
+
+def bench_legacy(employees: int, days: int, queries: int) -> None:
+    start = date.today() - timedelta(days=days)
+    report_db = {}
+    for phone, day, status, ts in _rows(employees, days, start):
+        report_id = f"{phone}_{day.isoformat()}"
+        report_db[report_id] = {'id': report_id, 'phone': phone, 'date': day.isoformat(), 'status': status,
+                                'timestamp': datetime.fromtimestamp(ts).isoformat()}
+
+    phones = [f"2547{n:08d}" for n in random.sample(range(employees), min(queries, employees))]
+    timings = []
+    for phone in phones:
+        t = time.perf_counter()
+        reports = [r for r in report_db.values() if r.get('phone') == phone]
+        sorted(reports, key=lambda r: r['date'], reverse=True)[:10]
+        timings.append(time.perf_counter() - t)
+    p = _percentiles(timings)
+    print(f"Legacy scan over {len(report_db):,} reports: p50 {p[50] / 1000:8.1f}ms  p99 {p[99] / 1000:8.1f}ms "
+          f"(grows linearly with total reports)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--employees', type=int, default=100_000)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--legacy-employees', type=int, default=2_000)
+    args = parser.parse_args()
+
+    bench_store(args.employees, args.days, args.queries)
+    bench_legacy(args.legacy_employees, args.days, min(args.queries, 50))
+
+
+if __name__ == '__main__':
+    main()
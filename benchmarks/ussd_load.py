@@ -0,0 +1,255 @@
+"""USSD load generator: replays multi-hop dial-in scenarios against /ussd.
+
+Scenarios come from a JSON-lines file (one object per line, like
+requests.jsonl): a name, a relative weight and the hops of one session.
+Each hop gives the segment the subscriber types and the prefix the
+response must start with. The harness sends what Africa's Talking
+sends, i.e. the cumulative "1*3*..." text on every hop. Placeholders:
+
+    {emp_id}      an Employee ID that signs in (rotates per session)
+    {start_date}  tomorrow as DD-MM-YYYY (leave requests reject past dates)
+    {n}           the session number
+
+Sessions are spread over --concurrency worker threads, each with its own
+phone number so the per-phone rate limiter and clock-in state do not
+collide. Two targets:
+
+    in-process (default)  Flask test client in a scratch directory, with
+                          SMS_PROVIDER=stub so sends hit the local stand-in
+                          and a payslip on file for every session's phone
+    --url URL             a running server, e.g. http://127.0.0.1:5000/ussd
+                          (start it with SMS_PROVIDER=stub; document
+                          requests need payslips in its document store)
+
+Reports throughput, p50/p95/p99/max latency per hop and errors by kind.
+Usage:
+
+    python benchmarks/ussd_load.py [--sessions 2000] [--concurrency 16]
+        [--scenarios benchmarks/scenarios/default.jsonl] [--url URL] [--json]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from typing import Callable, Dict, Iterable, List, Tuple
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+EMPLOYEE_IDS = ['EMP123', 'EMP456', 'MGR789']
+
+# Seeded for the document_request scenario
+PAYSLIP = b'%PDF-1.4\n% load test payslip\n'
+
+# post(session_id, phone, text[, service_code]) -> (status code, body, headers)
+Poster = Callable[..., Tuple[int, str, Dict[str, str]]]
+
+
+def load_scenarios(path: str) -> List[Dict]:
+    scenarios = []
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                scenario = json.loads(line)
+                scenario.setdefault('weight', 1)
+                scenarios.append(scenario)
+    if not scenarios:
+        raise ValueError(f"No scenarios in {path}")
+    return scenarios
+
+
+def _percentile(samples: List[float], p: float) -> float:
+    return samples[min(len(samples) - 1, int(len(samples) * p / 100))]
+
+
+class Results:
+    """Latencies per (scenario, hop) and error counts, shared by all workers"""
+
+    def __init__(self):
+        self.latencies: Dict[Tuple[str, str], List[float]] = defaultdict(list)
+        self.errors: Counter = Counter()
+        self.sessions: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def hop(self, scenario: str, hop: str, seconds: float) -> None:
+        with self._lock:
+            self.latencies[(scenario, hop)].append(seconds)
+
+    def error(self, kind: str) -> None:
+        with self._lock:
+            self.errors[kind] += 1
+
+    def session(self, scenario: str, ok: bool) -> None:
+        with self._lock:
+            self.sessions[(scenario, ok)] += 1
+
+    def report(self, elapsed: float) -> Dict:
+        hops = sum(len(samples) for samples in self.latencies.values())
+        completed = sum(count for (_, ok), count in self.sessions.items() if ok)
+        per_hop = {}
+        for (scenario, hop), samples in self.latencies.items():
+            samples.sort()
+            per_hop[f"{scenario}/{hop}"] = {
+                'count': len(samples),
+                **{f"p{p}_ms": round(_percentile(samples, p) * 1000, 2) for p in (50, 95, 99)},
+                'max_ms': round(samples[-1] * 1000, 2)
+            }
+        return {
+            'elapsed_s': round(elapsed, 2),
+            'hops': hops,
+            'hops_per_s': round(hops / elapsed, 1),
+            'sessions_completed': completed,
+            'sessions_failed': sum(self.sessions.values()) - completed,
+            'sessions_per_s': round(completed / elapsed, 1),
+            'error_rate': round(sum(self.errors.values()) / max(hops, 1), 4),
+            'errors': dict(self.errors),
+            'per_hop': per_hop
+        }
+
+
+def session_phone(n: int) -> str:
+    return f"+2547{n:08d}"
+
+
+def run_session(post: Poster, scenario: Dict, n: int, results: Results) -> None:
+    context = {
+        'emp_id': EMPLOYEE_IDS[n % len(EMPLOYEE_IDS)],
+        'start_date': (date.today() + timedelta(days=1)).strftime('%d-%m-%Y'),
+        'n': n
+    }
+    session_id = f"load-{os.getpid()}-{n}"
+    phone = session_phone(n)
+    segments: List[str] = []
+    for hop in scenario['hops']:
+        if hop['input']:
+            segments.append(hop['input'].format(**context))
+        started = time.perf_counter()
+        try:
+            status, body, _ = post(session_id, phone, '*'.join(segments))
+        except Exception as e:
+            results.error(f"exception:{type(e).__name__}")
+            results.session(scenario['scenario'], False)
+            return
+        results.hop(scenario['scenario'], hop['name'], time.perf_counter() - started)
+        if status != 200:
+            results.error(f"http_{status}")
+        elif body.startswith('END System error') or body.startswith('END An unexpected error'):
+            results.error('system_error')
+        elif body.startswith('END Too many requests'):
+            results.error('rate_limited')
+        elif not body.startswith(hop['expect']):
+            results.error(f"unexpected:{scenario['scenario']}/{hop['name']}")
+        else:
+            continue
+        results.session(scenario['scenario'], False)
+        return
+    results.session(scenario['scenario'], True)
+
+
+def seed_payslips(phones: Iterable[str]) -> None:
+    """Put a payslip on file for each phone, so document requests find one (app already imported)"""
+    from handlers.document_handler import document_store
+    for phone in phones:
+        document_store.put('payslip', phone, 'payslip.pdf', PAYSLIP)
+
+
+def in_process_poster(phones: Iterable[str] = ()) -> Poster:
+    """Import the app in a scratch directory with the SMS stub; one test client per thread.
+
+    `phones` get a payslip on file (see seed_payslips).
+    """
+    os.environ.setdefault('SMS_PROVIDER', 'stub')
+    os.chdir(tempfile.mkdtemp(prefix='ussd-load-'))
+    from app import app
+    seed_payslips(phones)
+    clients = threading.local()
+
+    def post(session_id: str, phone: str, text: str, service_code: str = '*384#') -> Tuple[int, str, Dict]:
+        client = getattr(clients, 'client', None)
+        if client is None:
+            client = clients.client = app.test_client()
+        response = client.post('/ussd', data={
+            'sessionId': session_id, 'phoneNumber': phone, 'serviceCode': service_code, 'text': text
+        })
+        return response.status_code, response.get_data(as_text=True), response.headers
+    return post
+
+
+def http_poster(url: str, timeout: float) -> Poster:
+    import requests
+    sessions = threading.local()
+
+    def post(session_id: str, phone: str, text: str, service_code: str = '*384#') -> Tuple[int, str, Dict]:
+        http = getattr(sessions, 'http', None)
+        if http is None:
+            http = sessions.http = requests.Session()
+        response = http.post(url, data={
+            'sessionId': session_id, 'phoneNumber': phone, 'serviceCode': service_code, 'text': text
+        }, timeout=timeout)
+        return response.status_code, response.text, response.headers
+    return post
+
+
+def run_load(post: Poster, scenarios: List[Dict], sessions: int, concurrency: int,
+             seed: int = 0, phone_offset: int = 0) -> Dict:
+    rng = random.Random(seed)
+    plan = rng.choices(scenarios, weights=[s['weight'] for s in scenarios], k=sessions)
+    results = Results()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for n, scenario in enumerate(plan):
+            pool.submit(run_session, post, scenario, phone_offset + n, results)
+    return results.report(time.perf_counter() - started)
+
+
+def _print_report(report: Dict, concurrency: int) -> None:
+    print(f"{report['sessions_completed']:,} sessions completed, {report['sessions_failed']:,} failed "
+          f"in {report['elapsed_s']}s at concurrency {concurrency}")
+    print(f"throughput: {report['hops_per_s']:,} hops/s, {report['sessions_per_s']:,} sessions/s; "
+          f"error rate {report['error_rate']:.2%}")
+    for kind, count in sorted(report['errors'].items()):
+        print(f"  error {kind}: {count}")
+    print(f"{'hop':<36}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for name, row in sorted(report['per_hop'].items()):
+        print(f"{name:<36}{row['count']:>8}{row['p50_ms']:>10}{row['p95_ms']:>10}{row['p99_ms']:>10}{row['max_ms']:>10}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scenarios', default=os.path.join(REPO, 'benchmarks', 'scenarios', 'default.jsonl'))
+    parser.add_argument('--sessions', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--url', help="POST to a running server instead of the in-process app")
+    parser.add_argument('--timeout', type=float, default=10.0, help="Per-hop HTTP timeout (--url only)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--phone-offset', type=int, default=0,
+                        help="First phone number; change it between runs against the same server")
+    parser.add_argument('--json', action='store_true', help="Print the report as JSON")
+    args = parser.parse_args()
+
+    scenarios = load_scenarios(args.scenarios)
+    post = (http_poster(args.url, args.timeout) if args.url else
+            in_process_poster(map(session_phone, range(args.phone_offset, args.phone_offset + args.sessions))))
+    report = run_load(post, scenarios, args.sessions, args.concurrency, args.seed, args.phone_offset)
+
+    if not args.url:
+        from utils.sms_queue import sms_queue
+        sms_queue.shutdown(drain=True)
+        report['sms_queue'] = sms_queue.stats()
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        _print_report(report, args.concurrency)
+        if 'sms_queue' in report:
+            print(f"sms queue: {report['sms_queue']}")
+
+
+if __name__ == '__main__':
+    main()
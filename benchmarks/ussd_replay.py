@@ -0,0 +1,264 @@
+"""Replay captured USSD traffic against a build and diff the responses.
+
+Input is the hop capture written when the gateway runs with
+USSD_CAPTURE=true (JSON lines: t, sid, phone, code, text, resp, ms). It
+may be several files, e.g. a day's rotated captures. --from-log reads
+ussd_gateway.log instead. That only reproduces a session faithfully if
+it was written with USSD_LOG_SAMPLE_RATE=1.0, because sampled-out hops
+are missing from it.
+
+Each captured session is replayed in order, under a fresh session id,
+on a pool of --concurrency workers:
+
+    --speed 1     original timing (hop offsets from the first hop)
+    --speed N     N times faster
+    --speed 0     as fast as possible, keeping each session's hop order
+
+Responses are compared with the recorded ones after masking values that
+legitimately change between runs (clock times, dates, request IDs; add
+more with --mask REGEX). The report has mismatches per screen with
+examples, recorded vs replayed p50/p95 latency per screen, and how far
+behind schedule the pool fell. Replayed latency is the server's own
+figure from its Server-Timing header, the same clock the capture used;
+the client round trip is used only against builds that do not send it.
+
+The target is the in-process app (a scratch directory with the SMS
+stub; the rate limiter window is scaled by --speed) or a running server
+via --url. Usage:
+
+    python benchmarks/ussd_replay.py ussd_capture.jsonl [more files...]
+        [--speed 0] [--concurrency 32] [--url URL] [--json]
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from ussd_load import Poster, _percentile, http_poster, in_process_poster
+
+DEFAULT_MASKS = [
+    r'\d{1,2}:\d{2}(:\d{2})? ?[AP]M',   # Clock times
+    r'\d{2}:\d{2}(:\d{2})?',
+    r'\d{4}-\d{2}-\d{2}',                # Dates
+    r'\d{2}-\d{2}-\d{4}',
+    r'\d{2}/\d{2}/\d{4}',
+    r'LV-[\w-]+',                        # Leave request IDs
+    r'token=[\w.-]+',                    # Document links
+    r'Worked: \d+h \d+m',
+]
+
+_SERVER_TIMING = re.compile(r'app;dur=([\d.]+)')
+_LOG_RECORD = re.compile(r'^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d{3}) \[\w+\] ', re.M)
+_LOG_HOP = re.compile(
+    r"USSD Request - Session: (?P<sid>.*?) \| Phone: (?P<phone>.*?) \| Input: '(?P<text>.*?)' \| "
+    r"Response: '(?P<resp>.*)' \| Processed in (?P<secs>[\d.]+)s\s*$", re.S
+)
+
+
+def read_capture(paths: Iterable[str]) -> List[Dict]:
+    hops = []
+    for path in paths:
+        with open(path) as f:
+            hops.extend(json.loads(line) for line in f if line.strip())
+    return hops
+
+
+def read_gateway_log(paths: Iterable[str]) -> List[Dict]:
+    """Recover hops from ussd_gateway.log interaction records"""
+    hops = []
+    for path in paths:
+        with open(path) as f:
+            content = f.read()
+        starts = list(_LOG_RECORD.finditer(content))
+        for index, start in enumerate(starts):
+            end = starts[index + 1].start() if index + 1 < len(starts) else len(content)
+            match = _LOG_HOP.match(content, start.end(), end)
+            if not match:
+                continue
+            logged_at = datetime.strptime(start.group(1), '%Y-%m-%d %H:%M:%S,%f').timestamp()
+            seconds = float(match.group('secs'))
+            hops.append({
+                't': logged_at - seconds, 'sid': match.group('sid'), 'phone': match.group('phone'),
+                'code': '*384#', 'text': match.group('text'), 'resp': match.group('resp'),
+                'ms': seconds * 1000
+            })
+    return hops
+
+
+class Masker:
+    def __init__(self, patterns: List[str]):
+        self._pattern = re.compile('|'.join(f"(?:{p})" for p in patterns))
+
+    def __call__(self, text: str) -> str:
+        return self._pattern.sub('#', text)
+
+
+def screen_of(response: str, mask: Masker) -> str:
+    """The first line of a response, masked: 'CON Main Menu', 'END Clocked IN at #...'"""
+    return mask(response.split('\n', 1)[0])[:48]
+
+
+class Replay:
+    """Outcome of one replay run"""
+
+    def __init__(self):
+        self.recorded: Dict[str, List[float]] = defaultdict(list)
+        self.replayed: Dict[str, List[float]] = defaultdict(list)
+        self.mismatches: Counter = Counter()
+        self.examples: Dict[str, Tuple[str, str]] = {}
+        self.errors: Counter = Counter()
+        self.lag: List[float] = []
+        self._lock = threading.Lock()
+
+    def hop(self, screen: str, recorded_ms: float, replayed_ms: float, lag: float,
+            expected: Optional[str] = None, actual: Optional[str] = None) -> None:
+        with self._lock:
+            self.recorded[screen].append(recorded_ms)
+            self.replayed[screen].append(replayed_ms)
+            self.lag.append(lag)
+            if expected is not None:
+                self.mismatches[screen] += 1
+                self.examples.setdefault(screen, (expected, actual))
+
+    def error(self, kind: str) -> None:
+        with self._lock:
+            self.errors[kind] += 1
+
+    def report(self, elapsed: float, span: float) -> Dict:
+        hops = sum(len(samples) for samples in self.replayed.values())
+        screens = {}
+        for screen, replayed in self.replayed.items():
+            recorded = sorted(self.recorded[screen])
+            replayed.sort()
+            screens[screen] = {
+                'count': len(replayed),
+                'mismatches': self.mismatches[screen],
+                **{f"recorded_p{p}_ms": round(_percentile(recorded, p), 2) for p in (50, 95)},
+                **{f"replayed_p{p}_ms": round(_percentile(replayed, p), 2) for p in (50, 95)},
+                'delta_p95_ms': round(_percentile(replayed, 95) - _percentile(recorded, 95), 2)
+            }
+        self.lag.sort()
+        return {
+            'hops': hops,
+            'captured_span_s': round(span, 1),
+            'elapsed_s': round(elapsed, 2),
+            'hops_per_s': round(hops / elapsed, 1) if elapsed else 0.0,
+            'mismatches': sum(self.mismatches.values()),
+            'mismatch_rate': round(sum(self.mismatches.values()) / max(hops, 1), 4),
+            'errors': dict(self.errors),
+            'schedule_lag_p95_ms': round(_percentile(self.lag, 95) * 1000, 2) if self.lag else 0.0,
+            'screens': screens,
+            'examples': {screen: {'recorded': expected, 'replayed': actual}
+                         for screen, (expected, actual) in self.examples.items()}
+        }
+
+
+def replay_session(post: Poster, hops: List[Dict], session_id: str, origin: float, t0: float,
+                   speed: float, mask: Masker, replay: Replay) -> None:
+    offset = 0.0
+    for hop in hops:
+        offset = max(offset, hop['t'] - t0)
+        due = origin + offset / speed if speed else time.perf_counter()
+        delay = due - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        lag = time.perf_counter() - due
+        started = time.perf_counter()
+        try:
+            status, body, headers = post(session_id, hop['phone'], hop['text'], hop.get('code') or '*384#')
+        except Exception as e:
+            replay.error(f"exception:{type(e).__name__}")
+            return
+        server_timing = _SERVER_TIMING.search(headers.get('Server-Timing', ''))
+        replayed_ms = float(server_timing.group(1)) if server_timing else (time.perf_counter() - started) * 1000
+        if status != 200:
+            replay.error(f"http_{status}")
+        screen = screen_of(hop['resp'], mask)
+        if mask(body) != mask(hop['resp']):
+            replay.hop(screen, hop['ms'], replayed_ms, lag, hop['resp'], body)
+        else:
+            replay.hop(screen, hop['ms'], replayed_ms, lag)
+
+
+def run_replay(post: Poster, hops: List[Dict], speed: float, concurrency: int, mask: Masker) -> Dict:
+    # Hops keep their file order within a session: a session's hops are
+    # written one after another, while logged timestamps can tie or invert
+    sessions: Dict[str, List[Dict]] = defaultdict(list)
+    for hop in hops:
+        sessions[hop['sid']].append(hop)
+    t0 = min((h['t'] for h in hops), default=0.0)
+    span = max((h['t'] for h in hops), default=0.0) - t0
+    run_id = f"replay-{os.getpid()}-{int(time.time())}"
+    replay = Replay()
+    origin = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for sid, session_hops in sessions.items():
+            pool.submit(replay_session, post, session_hops, f"{run_id}-{sid}", origin, t0, speed, mask, replay)
+    return replay.report(time.perf_counter() - origin, span)
+
+
+def _print_report(report: Dict, speed: float) -> None:
+    pace = f"{speed}x" if speed else "as fast as possible"
+    print(f"Replayed {report['hops']:,} hops ({report['captured_span_s']}s captured) in {report['elapsed_s']}s "
+          f"at {pace}: {report['hops_per_s']:,} hops/s, schedule lag p95 {report['schedule_lag_p95_ms']}ms")
+    print(f"Response mismatches: {report['mismatches']:,} ({report['mismatch_rate']:.2%})")
+    for kind, count in sorted(report['errors'].items()):
+        print(f"  error {kind}: {count}")
+    print(f"{'screen':<50}{'hops':>7}{'diff':>6}{'rec p95':>9}{'new p95':>9}{'delta':>9}")
+    ordered = sorted(report['screens'].items(), key=lambda item: -item[1]['count'])
+    for screen, row in ordered:
+        print(f"{screen:<50}{row['count']:>7}{row['mismatches']:>6}{row['recorded_p95_ms']:>9}"
+              f"{row['replayed_p95_ms']:>9}{row['delta_p95_ms']:>+9}")
+    for screen, example in report['examples'].items():
+        print(f"\n[{screen}]\n  recorded: {example['recorded']!r}\n  replayed: {example['replayed']!r}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('files', nargs='+', help="Capture files (or gateway logs with --from-log)")
+    parser.add_argument('--from-log', action='store_true', help="Read ussd_gateway.log records instead")
+    parser.add_argument('--speed', type=float, default=1.0, help="Time compression; 0 = as fast as possible")
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--url', help="POST to a running server instead of the in-process app")
+    parser.add_argument('--timeout', type=float, default=10.0)
+    parser.add_argument('--mask', action='append', default=[], help="Extra regex to ignore when diffing")
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+
+    paths = [os.path.abspath(path) for path in args.files]
+    hops = read_gateway_log(paths) if args.from_log else read_capture(paths)
+    if not hops:
+        sys.exit("No hops found")
+
+    if args.url:
+        post = http_poster(args.url, args.timeout)
+    else:
+        post = in_process_poster({hop['phone'] for hop in hops})
+        import app as gateway
+        from utils.rate_limiter import RateLimiter
+        # Keep the per-phone limit proportional to the compressed timeline
+        limit = gateway.limiter
+        gateway.limiter = (RateLimiter(limit.max_requests, limit.period_seconds / args.speed) if args.speed
+                           else RateLimiter(1 << 16, limit.period_seconds))
+
+    report = run_replay(post, hops, args.speed, args.concurrency, Masker(DEFAULT_MASKS + args.mask))
+    if not args.url:
+        from utils.sms_queue import sms_queue
+        sms_queue.shutdown(drain=True)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        _print_report(report, args.speed)
+
+
+if __name__ == '__main__':
+    main()
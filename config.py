@@ -13,11 +13,73 @@ class Config:
     # System Settings
     MAX_SESSION_AGE = 3600  # 1 hour in seconds
 
+    # Session storage: "memory" for a single process, "sqlite" to share
+    # sessions between worker processes on the same host
+    SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory").lower()
+    SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", "sessions.db")
+
+    # Employee roster (CSV or JSON); the demo IDs are used if it is missing
+    EMPLOYEE_ROSTER = os.getenv("EMPLOYEE_ROSTER", "employees.csv")
+
+    # Performance records: SQLite file, records kept in memory, and how
+    # often changed records are written back
+    PERF_DB_PATH = os.getenv("PERF_DB_PATH", "performance.db")
+    PERF_RESIDENT_MAX = int(os.getenv("PERF_RESIDENT_MAX", "5000"))
+    PERF_FLUSH_INTERVAL_MS = int(os.getenv("PERF_FLUSH_INTERVAL_MS", "200"))
+    # Employees whose rendered performance screens are kept in memory
+    PERF_RENDER_CACHE_SIZE = int(os.getenv("PERF_RENDER_CACHE_SIZE", "10000"))
+
+    # Document download links: signing secret (SECRET_KEY if unset), how
+    # long a link lasts, verified links kept in memory, and how long a used
+    # link may be opened again (previews, retried downloads)
+    DOC_BASE_URL = os.getenv("DOC_BASE_URL", "https://secure.elevatehr.com/documents").rstrip("/")
+    DOC_TOKEN_SECRET = os.getenv("DOC_TOKEN_SECRET") or os.getenv("SECRET_KEY", "")
+    DOC_TOKEN_TTL_SECONDS = int(os.getenv("DOC_TOKEN_TTL_SECONDS", "86400"))
+    DOC_TOKEN_CACHE_SIZE = int(os.getenv("DOC_TOKEN_CACHE_SIZE", "10000"))
+    DOC_TOKEN_GRACE_SECONDS = int(os.getenv("DOC_TOKEN_GRACE_SECONDS", "300"))
+    # Where the served documents and their index live
+    DOC_STORE_ROOT = os.getenv("DOC_STORE_ROOT", "documents")
+
+    # Payroll runs: manifest directory and payslip rendering processes (0 = one per core)
+    PAYROLL_DATA_DIR = os.getenv("PAYROLL_DATA_DIR", "payroll")
+    PAYROLL_WORKERS = int(os.getenv("PAYROLL_WORKERS", "0"))
+
+    # Shared secret for POST /leave/decisions (X-Approvals-Token header);
+    # the endpoint is disabled while it is unset
+    APPROVALS_API_TOKEN = os.getenv("APPROVALS_API_TOKEN", "")
+
+    # Outbound SMS dispatch
+    SMS_QUEUE_WORKERS = int(os.getenv("SMS_QUEUE_WORKERS", "4"))
+    SMS_QUEUE_MAXSIZE = int(os.getenv("SMS_QUEUE_MAXSIZE", "10000"))
+    SMS_BATCH_WINDOW_MS = int(os.getenv("SMS_BATCH_WINDOW_MS", "50"))
+    SMS_BATCH_MAX = int(os.getenv("SMS_BATCH_MAX", "100"))
+    # "stub" answers locally like Africa's Talking (for load tests)
+    SMS_PROVIDER = os.getenv("SMS_PROVIDER", "africastalking").lower()
+    SMS_STUB_LATENCY_MS = int(os.getenv("SMS_STUB_LATENCY_MS", "150"))
+
+    # ASGI mode: threads that run the synchronous menu handlers
+    ASGI_BRIDGE_THREADS = int(os.getenv("ASGI_BRIDGE_THREADS", "16"))
+
+    # Logging
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+    LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(50 * 1024 * 1024)))
+    LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+    LOG_AUDIT_RETENTION_DAYS = int(os.getenv("LOG_AUDIT_RETENTION_DAYS", "90"))
+    # Fraction of successful USSD hops written to the interaction log
+    USSD_LOG_SAMPLE_RATE = float(os.getenv("USSD_LOG_SAMPLE_RATE", "1.0"))
+    # Capture every hop as JSON lines for benchmarks/ussd_replay.py
+    USSD_CAPTURE = os.getenv("USSD_CAPTURE", "False").lower() == "true"
+    USSD_CAPTURE_FILE = os.getenv("USSD_CAPTURE_FILE", "ussd_capture.jsonl")
+
     @classmethod
     def check_config(cls):
         """Validate configuration"""
-        if not cls.AT_SANDBOX and (not cls.AT_USERNAME or not cls.AT_API_KEY):
+        if cls.SMS_PROVIDER not in ("africastalking", "stub"):
+            raise ValueError("SMS_PROVIDER must be 'africastalking' or 'stub'")
+        if not cls.AT_SANDBOX and cls.SMS_PROVIDER != "stub" and (not cls.AT_USERNAME or not cls.AT_API_KEY):
             raise ValueError("Live mode requires AT_USERNAME and AT_API_KEY")
+        if cls.SESSION_BACKEND not in ("memory", "sqlite"):
+            raise ValueError("SESSION_BACKEND must be 'memory' or 'sqlite'")
 
 # Validate on import
 Config.check_config()
\ No newline at end of file
@@ -0,0 +1,173 @@
+import hmac
+from collections import defaultdict
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Tuple
+from config import Config
+from handlers.leave_handler import LEAVE_TYPES, leave_calendar
+from utils.employee_directory import directory
+from utils.leave_calendar import DECISIONS
+from utils.logging_setup import get_logger
+from utils.sms_queue import sms_queue
+from utils.sms_utils import SMSService
+
+# --- Configuration ---
+logger = get_logger('leave_requests')
+PAGE_SIZE = 3  # Requests per inbox screen; keys 1..PAGE_SIZE open one
+MAX_BULK_DECISIONS = 10000
+_SESSION_KEYS = ('approval_offset', 'approval_ids', 'approval_open')
+
+def ussd_response(text):
+    return text
+
+def _reset_approvals(session: Dict) -> None:
+    for key in _SESSION_KEYS:
+        session.pop(key, None)
+
+def _requester_name(phone: str) -> str:
+    employee = directory.by_phone(phone)
+    return employee.name if employee else phone
+
+def _short(record: Dict) -> str:
+    start = date.fromisoformat(record['start_date']).strftime('%d %b')
+    return f"{_requester_name(record['employee'])} {record['days']}d {LEAVE_TYPES[str(record['type'])]['name']} {start}"
+
+# --- Notifications ---
+def notify_decisions(records: Iterable[Dict]) -> int:
+    """SMS each requester their decision; returns how many distinct messages were queued.
+
+    Requesters getting the same text share one enqueue, so the SMS workers
+    send them as one multi-recipient provider call rather than one per
+    decision.
+    """
+    recipients: Dict[str, List[str]] = defaultdict(list)
+    for record in records:
+        body = SMSService.render_template("leave_approval", {
+            "status": record['status'].capitalize(),
+            "type": LEAVE_TYPES[str(record['type'])]['name'],
+            "days": record['days']
+        })
+        recipients[body].append(record['employee'])
+    for body, phones in recipients.items():
+        sms_queue.enqueue(phones, body)
+    return len(recipients)
+
+def apply_decisions(decisions: Iterable[Tuple[str, str]], decided_by: str,
+                    team: Optional[str] = None) -> Tuple[List[Dict], Dict[str, str]]:
+    """Record a batch of decisions, audit it and notify the requesters"""
+    decided, skipped = leave_calendar.decide(decisions, team=team)
+    if decided:
+        logger.info("%s decided %d leave request(s): %s", decided_by, len(decided),
+                    ", ".join(f"{record['id']}={record['status']}" for record in decided))
+        notify_decisions(decided)
+    if skipped:
+        logger.warning("%s: %d leave decision(s) skipped: %s", decided_by, len(skipped), skipped)
+    return decided, skipped
+
+# --- Bulk endpoint (shared by the Flask view and asgi.py) ---
+def bulk_decisions(token: Optional[str], payload) -> Tuple[int, Dict]:
+    """Apply {"decided_by": ..., "decisions": [{"id": ..., "status": ...}]}; returns (HTTP status, body).
+
+    Disabled (404) unless APPROVALS_API_TOKEN is set; callers send it in
+    the X-Approvals-Token header.
+    """
+    if not Config.APPROVALS_API_TOKEN:
+        return 404, {"error": "Not Found"}
+    if not token or not hmac.compare_digest(token.encode(), Config.APPROVALS_API_TOKEN.encode()):
+        return 401, {"error": "Invalid approvals token"}
+    if not isinstance(payload, dict) or not isinstance(payload.get('decisions'), list):
+        return 400, {"error": "Expected a JSON object with a 'decisions' list"}
+    decided_by = str(payload.get('decided_by') or 'api')
+    items = payload['decisions']
+    if len(items) > MAX_BULK_DECISIONS:
+        return 413, {"error": f"At most {MAX_BULK_DECISIONS} decisions per request"}
+    if not all(isinstance(item, dict) and isinstance(item.get('id'), str) for item in items):
+        return 400, {"error": "Each decision needs an 'id' and a 'status'"}
+
+    decided, skipped = apply_decisions(((item['id'], item.get('status')) for item in items), decided_by)
+    return 200, {"decided": len(decided), "skipped": skipped}
+
+# --- USSD inbox ---
+def _show_inbox(session: Dict, team: str) -> str:
+    offset = session.get('approval_offset', 0)
+    total, page = leave_calendar.pending_for(team, offset, PAGE_SIZE)
+    if not page and offset:
+        # Decisions emptied this page; start again from the top
+        offset = session['approval_offset'] = 0
+        total, page = leave_calendar.pending_for(team, 0, PAGE_SIZE)
+    if not page:
+        _reset_approvals(session)
+        return ussd_response("END No leave requests awaiting your approval.")
+
+    session['approval_ids'] = [record['id'] for record in page]
+    lines = [f"{n}. {_short(record)}" for n, record in enumerate(page, 1)]
+    more = "\n9. More" if offset + len(page) < total else ""
+    return ussd_response(
+        f"CON Pending approval ({offset + 1}-{offset + len(page)} of {total}):\n" + "\n".join(lines) +
+        f"\n7. Approve all shown\n8. Reject all shown{more}\n0. Back"
+    )
+
+def _show_request(record: Dict, team: str) -> str:
+    leave_type = LEAVE_TYPES[str(record['type'])]
+    start = date.fromisoformat(record['start_date'])
+    off = leave_calendar.team_peak(team, start, record['days'])
+    return ussd_response(
+        f"CON {record['id']}: {_requester_name(record['employee'])}\n"
+        f"{record['days']} days of {leave_type['name']}\n"
+        f"{start.strftime('%d %b, %Y')} to {date.fromisoformat(record['end_date']).strftime('%d %b, %Y')}\n"
+        f"Team off then: {off} (incl. this)\n"
+        "1. Approve\n2. Reject\n0. Back"
+    )
+
+def _decide_open(choice: str, emp_id: str, session: Dict) -> str:
+    request_id = session.pop('approval_open')
+    if choice == '0':
+        return _show_inbox(session, emp_id)
+    decided, skipped = apply_decisions([(request_id, DECISIONS[int(choice) - 1])], emp_id, team=emp_id)
+    session.pop('approval_ids', None)
+    if decided:
+        note = f"{request_id} {decided[0]['status']}."
+    else:
+        note = f"{request_id} was already {skipped.get(request_id, 'decided')}."
+    return ussd_response(f"CON {note}\n1. Next\n0. Back")
+
+# --- Main Handler ---
+def handle_approvals(inputs: List[str], phone: str, session: Dict) -> Optional[str]:
+    """Paged inbox of the manager's team's pending leave requests."""
+    emp_id = session.get('emp_id', '')
+    if not (directory.has_role(emp_id, 'manager') or directory.reports_of(emp_id)):
+        return ussd_response("END Leave approvals are only available to managers.")
+    if not inputs:
+        return _show_inbox(session, emp_id)
+
+    choice = inputs[0]
+    if 'approval_open' in session:
+        if choice not in ('1', '2', '0'):
+            return ussd_response("CON Invalid choice. 1 to approve, 2 to reject, 0 to go back.")
+        return _decide_open(choice, emp_id, session)
+
+    shown = session.get('approval_ids')
+    if not shown:  # Coming back from a decision note
+        if choice == '0':
+            _reset_approvals(session)
+            return None
+        return _show_inbox(session, emp_id)
+
+    if choice == '0':
+        _reset_approvals(session)
+        return None # Go back to main menu
+    if choice in ('7', '8'):
+        verb = 'approved' if choice == '7' else 'rejected'
+        decided, skipped = apply_decisions(((request_id, verb) for request_id in shown), emp_id, team=emp_id)
+        session.pop('approval_ids', None)
+        already = f" ({len(skipped)} already decided)" if skipped else ""
+        return ussd_response(f"CON {len(decided)} request(s) {verb}{already}.\n1. Next\n0. Back")
+    if choice == '9':
+        session['approval_offset'] = session.get('approval_offset', 0) + PAGE_SIZE
+        return _show_inbox(session, emp_id)
+    if choice.isdigit() and 0 < int(choice) <= len(shown):
+        record = leave_calendar.get(shown[int(choice) - 1])
+        if record and record['status'] == 'pending':
+            session['approval_open'] = record['id']
+            return _show_request(record, emp_id)
+        return _show_inbox(session, emp_id)
+    return ussd_response("CON Invalid choice. Try again.")
@@ -1,24 +1,21 @@
 import requests
-import logging
-import threading
 from datetime import datetime
-from typing import Dict, Optional, Tuple, List
+from typing import Dict, Iterable, Optional, Tuple, List
+from config import Config
+from utils.document_store import DocumentStore, StoredDocument
+from utils.document_tokens import TokenRejected, document_tokens
+from utils.employee_directory import directory
+from utils.logging_setup import get_logger
+from utils.sms_queue import sms_queue
 
 # Configure atomic logging
-logging.basicConfig(
-    level=logging.INFO,
-    handlers=[
-        logging.FileHandler('document_audit.log', mode='a'),
-        logging.StreamHandler()
-    ],
-    format='%(asctime)s [%(levelname)s] %(message)s'
-)
+logger = get_logger('document_audit')
 
 # Configuration (move to environment variables in production)
 CONFIG = {
     'SMS_API_KEY': 'your_api_key_here',
     'SMS_URL': 'https://api.africastalking.com/version1/messaging',
-    'DOCUMENT_BASE_URL': 'https://secure.elevatehr.com/documents',
+    'DOCUMENT_BASE_URL': Config.DOC_BASE_URL,
     'MAX_ATTEMPTS': 3,
     'SMS_RETRIES': 2
 }
@@ -42,6 +39,12 @@ DOCUMENT_PERMISSIONS = {
     }
 }
 
+# Files follow each type's 'path' under DOC_STORE_ROOT; retention is indexed
+document_store = DocumentStore(Config.DOC_STORE_ROOT, {
+    doc_type: (permissions['path'], permissions['retention_days'])
+    for doc_type, permissions in DOCUMENT_PERMISSIONS.items()
+})
+
 def ussd_response(text: str) -> str:
     """Ensure proper USSD response formatting"""
     return text if text.startswith(('CON ', 'END ')) else f"CON {text}"
@@ -53,56 +56,89 @@ def _sanitize_phone(phone: str) -> Optional[str]:
     except:
         return None
 
-def _generate_temp_token() -> str:
-    """Mock token generation (use JWT in production)"""
-    return "tmp_" + str(hash(datetime.now()))[:12]
+def _generate_temp_token(phone: str, doc_type: str) -> str:
+    """Signed, expiring token for one phone's document (checked by verify_document_link)"""
+    token, expires = document_tokens.issue(phone, doc_type)
+    logger.info("Document link issued: %s for %s, expires %s", doc_type, phone,
+                datetime.fromtimestamp(expires).isoformat(timespec='seconds'))
+    return token
+
+def _may_access(emp_id: Optional[str], doc_type: str) -> bool:
+    """Whether the signed-in employee holds one of the document's roles"""
+    employee = directory.get(emp_id) if emp_id else None
+    return bool(employee and employee.roles.intersection(DOCUMENT_PERMISSIONS[doc_type]['roles']))
 
-def _generate_document_url(phone: str, doc_type: str) -> Optional[str]:
+def _generate_document_url(phone: str, doc_type: str, emp_id: Optional[str]) -> Optional[str]:
     """Secure document URL generation"""
     if doc_type not in DOCUMENT_PERMISSIONS:
         return None
+    if not _may_access(emp_id, doc_type):
+        logger.warning("Document %s refused for %s (%s): role not permitted", doc_type, emp_id, phone)
+        return None
+    if document_store.latest(doc_type, phone) is None:
+        logger.warning("Document %s requested by %s (%s) but none is on file", doc_type, emp_id, phone)
+        return None
         
-    # In production: Verify user has permission
     return (
         f"{CONFIG['DOCUMENT_BASE_URL']}/{doc_type}/"
-        f"{phone}?token={_generate_temp_token()}&expires={int(datetime.now().timestamp()) + 86400}"
+        f"{phone}?token={_generate_temp_token(phone, doc_type)}"
     )
 
-def _send_sms_with_retries(phone: str, message: str, attempt: int = 1):
-    """Retry mechanism with circuit breaker"""
-    from utils.sms_utils import SMSService
-    sms_service = SMSService()
-    sms_service.send([phone], message)
-    logging.info(f"SMS delivered to {phone} (attempt {attempt})")
+# HTTP status per rejection: unusable links are forbidden, spent ones gone
+_REJECTION_STATUS = {'expired': 410, 'replayed': 410}
+
+def verify_document_link(doc_type: str, phone: str, token: Optional[str],
+                         validators: Iterable[str] = ()) -> Tuple[int, Dict, Optional[StoredDocument]]:
+    """Check a download link (shared by the Flask view and asgi.py).
+
+    `validators` are the ETags the client sent in If-None-Match or If-Range.
+    If one is the current document's, the client already downloaded it
+    through this link, so revalidating or resuming needs only a valid,
+    unexpired token and does not count as another use.
+
+    Returns (HTTP status, error body, None) or (200, {}, the document to serve).
+    """
+    if doc_type not in DOCUMENT_PERMISSIONS or not token:
+        return 404, {"error": "Not Found"}, None
+    try:
+        if validators:
+            claims = document_tokens.check(token, phone, doc_type)
+            document = document_store.latest(claims.doc_type, claims.phone)
+            if document is not None and document.etag in validators:
+                return 200, {}, document
+        claims = document_tokens.verify(token, phone, doc_type)
+    except TokenRejected as e:
+        logger.warning("Document link refused (%s): %s for %s", e.reason, doc_type, phone)
+        return _REJECTION_STATUS.get(e.reason, 403), {"error": str(e), "reason": e.reason}, None
+    document = document_store.latest(claims.doc_type, claims.phone)
+    if document is None:
+        return 404, {"error": "Document no longer available"}, None
+    return 200, {}, document
 
 def _send_document_sms_async(phone: str, doc_name: str, url: str):
-    """Self-healing SMS delivery system"""
+    """Queue the download link; retries happen in the SMS workers"""
     message = (
         f"ElevateHR Document Ready\n"
         f"Type: {doc_name}\n"
         f"Download: {url}\n"
-        "Expires in 24 hours"
+        f"Expires in {document_tokens.ttl // 3600} hours"
     )
-    
-    threading.Thread(
-        target=_send_sms_with_retries,
-        args=(phone, message),
-        daemon=True
-    ).start()
+    sms_queue.enqueue([phone], message)
+
+DOCUMENT_MENU_OPTIONS = {
+    '1': ('payslip', 'Payslip'),
+    '2': ('contract', 'Employment Contract'),
+    '3': ('tax_cert', 'Tax Certificate')
+}
 
 def _get_document_mapping(choice: str) -> Tuple[Optional[str], Optional[str]]:
     """Fault-tolerant option mapping"""
-    mapping = {
-        '1': ('payslip', 'Payslip'),
-        '2': ('contract', 'Employment Contract'),
-        '3': ('tax_cert', 'Tax Certificate')
-    }
-    return mapping.get(choice, (None, None))
+    return DOCUMENT_MENU_OPTIONS.get(choice, (None, None))
 
 def _handle_help_request(phone: str) -> str:
     """Help system with guaranteed response"""
-    logging.info(f"Help requested by {phone}")
-    _send_sms_with_retries(phone, "HR will contact you about your document request")
+    logger.info("Help requested by %s", phone)
+    sms_queue.enqueue([phone], "HR will contact you about your document request")
     return ussd_response("END Help request received")
 
 def handle_document(inputs: List[str], phone: str, session: Dict) -> Optional[str]:
@@ -114,8 +150,8 @@ def handle_document(inputs: List[str], phone: str, session: Dict) -> Optional[st
 
     stage = session['doc_stage']
     
-    # If no input or returning to menu, show main document menu
-    if not inputs or stage == 'menu':
+    # No new input: show main document menu
+    if not inputs:
         session['doc_stage'] = 'menu' # Reset stage to menu
         return ussd_response(
             "CON Download Documents:\n"
@@ -136,7 +172,7 @@ def handle_document(inputs: List[str], phone: str, session: Dict) -> Optional[st
     if stage == 'menu':
         doc_key, doc_name = _get_document_mapping(choice)
         if doc_key:
-            doc_url = _generate_document_url(phone, doc_key)
+            doc_url = _generate_document_url(phone, doc_key, session.get('emp_id'))
             if doc_url:
                 _send_document_sms_async(phone, doc_name, doc_url)
                 return ussd_response(f"END {doc_name} link sent via SMS.\nCheck your messages.")
@@ -1,24 +1,41 @@
-from datetime import datetime, timedelta
-import logging
+from datetime import date, datetime, timedelta
 from typing import Dict, Optional, List
+from utils.employee_directory import directory
+from utils.leave_calendar import LeaveCalendar, LeaveRejected
+from utils.logging_setup import get_logger
+from utils.sms_queue import sms_queue
 
-# --- Configuration & Mock DB ---
-logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
-leave_requests: Dict[str, Dict] = {}
+# --- Configuration & Calendar ---
+logger = get_logger('leave_requests')
 LEAVE_TYPES = {
     '1': {'name': 'Sick Leave', 'max_days': 14},
     '2': {'name': 'Casual Leave', 'max_days': 5},
     '3': {'name': 'Annual Leave', 'max_days': 21}
 }
+leave_calendar = LeaveCalendar('leave', type_count=len(LEAVE_TYPES))
+
+# Pre-rendered leave type menu
+_TYPE_MENU = "CON Select Leave Type:\n" + "\n".join(f"{k}. {v['name']}" for k, v in LEAVE_TYPES.items()) + "\n0. Back"
 
 def ussd_response(text):
     return text
 
+def _team_of(phone: str) -> str:
+    """Coverage group: the employee's manager, else their department ('' if unknown)"""
+    employee = directory.by_phone(phone)
+    if employee is None:
+        return ''
+    return employee.manager_id or f"dept:{employee.department}"
+
+def _reset_leave(session: Dict) -> None:
+    """Forget the in-progress request without touching the rest of the session"""
+    for key in ('leave_stage', 'leave_type', 'leave_days', 'start_date'):
+        session.pop(key, None)
+
 # --- Sub-Handlers ---
 def _handle_type_selection(inputs: List[str], session: Dict) -> Optional[str]:
     if not inputs:
-        menu = "\n".join([f"{k}. {v['name']}" for k, v in LEAVE_TYPES.items()])
-        return ussd_response(f"CON Select Leave Type:\n{menu}\n0. Back")
+        return ussd_response(_TYPE_MENU)
     
     choice = inputs[0]
     if choice == '0':
@@ -42,7 +59,7 @@ def _handle_days_input(inputs: List[str], session: Dict) -> Optional[str]:
         return ussd_response("CON Enter start date (DD-MM-YYYY):")
     return ussd_response(f"CON Invalid days. Max for {leave_type['name']} is {leave_type['max_days']}.")
 
-def _handle_date_input(inputs: List[str], session: Dict) -> Optional[str]:
+def _handle_date_input(inputs: List[str], phone: str, session: Dict) -> Optional[str]:
     if not inputs:
         return ussd_response("CON Please enter a start date (DD-MM-YYYY):")
 
@@ -50,37 +67,53 @@ def _handle_date_input(inputs: List[str], session: Dict) -> Optional[str]:
         start_date = datetime.strptime(inputs[0], "%d-%m-%Y").date()
         if start_date < datetime.now().date():
             return ussd_response("CON Date cannot be in the past. Try again:")
-        
-        session['leave_stage'] = 'confirm'
-        session['start_date'] = start_date.isoformat()
-        
-        leave_name = LEAVE_TYPES[session['leave_type']]['name']
-        days = session['leave_days']
-        date_str = start_date.strftime('%d %b, %Y')
-        return ussd_response(f"CON Confirm Request:\n{days} days of {leave_name} starting {date_str}.\n1. Confirm\n0. Cancel")
     except ValueError:
         return ussd_response("CON Invalid date format. Use DD-MM-YYYY.")
 
+    leave_type = LEAVE_TYPES[session['leave_type']]
+    days = session['leave_days']
+    try:
+        outlook = leave_calendar.check(phone, _team_of(phone), int(session['leave_type']), start_date, days,
+                                       leave_type['max_days'])
+    except LeaveRejected as e:
+        if e.reason == 'overlap':
+            return ussd_response(f"CON Those dates overlap {e.details['request_id']}. Enter another start date:")
+        session['leave_stage'] = 'days'
+        return ussd_response(
+            f"CON Only {e.details['remaining']} days of {leave_type['name']} left for {e.details['year']}. "
+            "Enter number of days:"
+        )
+
+    session['leave_stage'] = 'confirm'
+    session['start_date'] = start_date.isoformat()
+    date_str = start_date.strftime('%d %b, %Y')
+    team_line = f"\nTeammates off then: {outlook['team_off']}" if outlook['team_off'] else ""
+    return ussd_response(
+        f"CON Confirm Request:\n{days} days of {leave_type['name']} starting {date_str}.\n"
+        f"Balance after: {outlook['remaining_after']}/{leave_type['max_days']} days{team_line}\n"
+        "1. Confirm\n0. Cancel"
+    )
+
 def _handle_confirmation(inputs: List[str], phone: str, session: Dict) -> Optional[str]:
     if not inputs or inputs[0] not in ['1', '0']:
         return ussd_response("CON Invalid choice. 1 to confirm, 0 to cancel.")
 
     if inputs[0] == '0':
-        session.clear() # Reset session
+        _reset_leave(session)
         return None # Go back to main menu
 
-    request_id = f"LV-{phone[-4:]}-{int(datetime.now().timestamp() % 1000)}"
-    leave_requests[request_id] = {
-        'phone': phone,
-        'type': LEAVE_TYPES[session['leave_type']]['name'],
-        'days': session['leave_days'],
-        'start_date': session['start_date'],
-        'status': 'Pending Approval'
-    }
-    logging.info(f"Leave request submitted: {request_id}")
-    from utils.sms_utils import SMSService
-    sms_service = SMSService()
-    sms_service.send_template(
+    leave_type = LEAVE_TYPES[session['leave_type']]
+    try:
+        # Checked again: another session may have booked days since the confirm screen
+        request_id = leave_calendar.submit(
+            phone, _team_of(phone), int(session['leave_type']), date.fromisoformat(session['start_date']),
+            session['leave_days'], leave_type['max_days']
+        )
+    except LeaveRejected as e:
+        _reset_leave(session)
+        return ussd_response(f"END Leave request not submitted: {e}.")
+    logger.info("Leave request submitted: %s", request_id)
+    sms_queue.enqueue_template(
         phone_number=phone,
         template_name="leave_approval",
         template_vars={
@@ -89,9 +122,16 @@ def _handle_confirmation(inputs: List[str], phone: str, session: Dict) -> Option
             "days": session['leave_days']
         }
     )
-    session.clear()
+    _reset_leave(session)
     return ussd_response(f"END Leave request {request_id} submitted successfully.")
 
+_STAGE_HANDLERS = {
+    'type': _handle_type_selection,
+    'days': _handle_days_input,
+    'date': _handle_date_input,
+    'confirm': _handle_confirmation
+}
+
 # --- Main Handler ---
 def handle_leave(inputs: List[str], phone: str, session: Dict) -> Optional[str]:
     """Handles the multi-step leave application process."""
@@ -99,18 +139,10 @@ def handle_leave(inputs: List[str], phone: str, session: Dict) -> Optional[str]:
         session['leave_stage'] = 'type'
 
     stage = session['leave_stage']
-    
-    handler_map = {
-        'type': _handle_type_selection,
-        'days': _handle_days_input,
-        'date': _handle_date_input,
-        'confirm': _handle_confirmation
-    }
-
-    handler = handler_map.get(stage)
+    handler = _STAGE_HANDLERS.get(stage)
     if handler:
-        # Pass only the relevant part of inputs
-        input_for_stage = inputs[1:] if stage != 'type' and inputs else inputs
-        return handler(input_for_stage, session if stage != 'confirm' else phone, session)
+        if stage in ('date', 'confirm'):
+            return handler(inputs, phone, session)
+        return handler(inputs, session)
 
     return ussd_response("END An unexpected error occurred in the leave module.")
@@ -1,44 +1,59 @@
 from handlers.clock_handler import handle_clock
 from handlers.leave_handler import handle_leave
+from handlers.approval_handler import handle_approvals
 from handlers.performance_handler import handle_performance
 from handlers.report_handler import handle_reporting
 from handlers.document_handler import handle_document
+from handlers.payroll_handler import handle_payment_summary
+from handlers.menu_tree import Action, End, MenuTree, Screen
+from utils.employee_directory import directory
 from utils.sms_utils import SMSService
-import logging
+from utils.logging_setup import get_logger
 import time
 
 # Configuration
 MAX_ATTEMPTS = 3
 SESSION_TIMEOUT = 300  # 5 minutes
-VALID_JOB_IDS = {'EMP123', 'EMP456', 'MGR789'}
 
 sms = SMSService()
+logger = get_logger('ussd_gateway')
 
 def ussd_response(text):
     """Ensure proper USSD response formatting."""
     return text if text.startswith(('CON ', 'END ')) else f"CON {text}"
 
+# --- Menu definition (compiled once at import) ---
+MENU = MenuTree({
+    'main_menu': Screen(
+        title="Main Menu",
+        dynamic=lambda session: f"\nSigned in as: {session.get('emp_id', 'Unknown')}",
+        options=[
+            ('1', 'Clock In/Out', 'clock_menu'),
+            ('2', 'Report Status', 'report_menu'),
+            ('3', 'Request Leave', 'leave_menu'),
+            ('4', 'Performance', 'performance_menu'),
+            ('5', 'Payment Summary', 'payment_summary'),
+            ('6', 'Documents', 'docs_menu'),
+            ('7', 'Leave Approvals', 'approvals_menu'),
+            ('0', 'Exit', 'exit'),
+        ]
+    ),
+    'clock_menu': Action(handle_clock),
+    'report_menu': Action(handle_reporting),
+    'leave_menu': Action(handle_leave),
+    'performance_menu': Action(handle_performance),
+    'docs_menu': Action(handle_document),
+    'approvals_menu': Action(handle_approvals),
+    'payment_summary': Action(handle_payment_summary),
+    'exit': End("END Thank you for using ElevateHR."),
+})
+
 def show_main_menu(session, error_msg=None):
-    """Generates the main menu string."""
-    menu_text = [
-        f"CON Main Menu\nSigned in as: {session.get('emp_id', 'Unknown')}",
-    ]
-    if error_msg:
-        menu_text.append(f"\n{error_msg}")
-    
-    menu_text.extend([
-        "\n",
-        "1. Clock In/Out",
-        "2. Report Status",
-        "3. Request Leave",
-        "4. Performance",
-        "5. Payment Summary",
-        "6. Documents",
-        "0. Exit"
-    ])
-    return "\n".join(menu_text)
+    """Renders the pre-compiled main menu for this session."""
+    return MENU.render('main_menu', session, invalid=bool(error_msg))
 
 def handle_main_menu(inputs, phone, session):
+    """Route one hop. `inputs` holds only the segments entered since the last hop."""
     try:
         # Initialize session if it's new
         if 'init_time' not in session:
@@ -57,12 +72,15 @@ def handle_main_menu(inputs, phone, session):
             if not inputs:
                 return ussd_response("CON Welcome to ElevateHR\nPlease enter your Employee ID:")
             
-            emp_id = inputs[0].upper().strip()
-            if emp_id in VALID_JOB_IDS:
+            # The ID must exist and, if the roster binds it to a phone, be dialled from it
+            employee = directory.authenticate(inputs[0], phone)
+            if employee:
                 session['authenticated'] = True
-                session['emp_id'] = emp_id
+                session['emp_id'] = employee.emp_id
                 session['stage'] = 'main_menu'
-                return show_main_menu(session)
+                inputs = inputs[1:]  # Anything entered with the ID carries on into the menu
+                if not inputs:
+                    return show_main_menu(session)
             else:
                 session['auth_attempts'] += 1
                 if session['auth_attempts'] >= MAX_ATTEMPTS:
@@ -74,54 +92,12 @@ def handle_main_menu(inputs, phone, session):
             return ussd_response("END Authentication failed. Please dial again.")
 
         # --- Menu Navigation ---
-        menu_inputs = inputs[1:] if len(inputs) > 1 else []
         stage = session.get('stage', 'main_menu')
-
-        if stage == 'main_menu':
-            if not menu_inputs:
-                return show_main_menu(session)
-
-            choice = menu_inputs[0]
-            
-            menu_options = {
-                '1': 'clock_menu',
-                '2': 'report_menu',
-                '3': 'leave_menu',
-                '4': 'performance_menu',
-                '6': 'docs_menu',
-            }
-
-            if choice == '0':
-                return ussd_response("END Thank you for using ElevateHR.")
-            elif choice == '5':
-                return ussd_response("END Your payment summary will be sent via SMS.")
-            elif choice in menu_options:
-                session['stage'] = menu_options[choice]
-                stage = session['stage']
-                menu_inputs = menu_inputs[1:]
-            else:
-                return show_main_menu(session, "Invalid option. Try again:")
-
-        # --- Submenu Stages ---
-        submenu_handlers = {
-            'clock_menu': handle_clock,
-            'report_menu': handle_reporting,
-            'leave_menu': handle_leave,
-            'performance_menu': handle_performance,
-            'docs_menu': handle_document
-        }
-
-        if stage in submenu_handlers:
-            handler = submenu_handlers[stage]
-            response = handler(menu_inputs, phone, session)
-            
-            if response is None:
-                session['stage'] = 'main_menu'
-                return show_main_menu(session)
-            return response
-
-        return ussd_response("END An unexpected error occurred. Please try again.")
+        response = MENU.dispatch(stage, inputs, phone, session)
+        if response is None:
+            return ussd_response("END An unexpected error occurred. Please try again.")
+        return response
 
     except Exception as e:
-        logging.error(f"Main Menu Error: {e}", exc_info=True)
+        logger.error("Main Menu Error: %s", e, exc_info=True)
         return ussd_response("END System error. Please try again later.")
\ No newline at end of file
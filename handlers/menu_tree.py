@@ -0,0 +1,94 @@
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple, Union
+from utils.metrics import USSD_HANDLER_SECONDS
+
+# An action handler takes (inputs, phone, session) and returns a USSD response,
+# or None to hand control back to the screen that opened it.
+ActionHandler = Callable[[List[str], str, Dict], Optional[str]]
+
+
+class Screen(NamedTuple):
+    """A static menu: a title, numbered options and where each one leads."""
+    title: str
+    options: List[Tuple[str, str, str]]  # (input, label, target node)
+    dynamic: Optional[Callable[[Dict], str]] = None  # Text inserted after the title
+    invalid: str = "Invalid option. Try again:"
+
+
+class Action(NamedTuple):
+    """A node whose behaviour is delegated to an existing handler."""
+    handler: ActionHandler
+
+
+class End(NamedTuple):
+    """A terminal node with a fixed response."""
+    text: str
+
+
+Node = Union[Screen, Action, End]
+
+
+class MenuTree:
+    """A menu definition compiled once into lookup tables.
+
+    Static screens are rendered to their final CON strings at compile time
+    (split around the dynamic fragment, if any), and every (node, input)
+    pair is resolved to its target node, so a hop is a dict lookup plus the
+    dynamic fragment or the action handler it lands on.
+    """
+
+    def __init__(self, nodes: Dict[str, Node], stage_key: str = 'stage'):
+        self.stage_key = stage_key
+        self._nodes = nodes
+        self._transitions: Dict[Tuple[str, str], str] = {}
+        self._parents: Dict[str, str] = {}
+        self._rendered: Dict[str, Tuple[str, str]] = {}
+        self._invalid: Dict[str, Tuple[str, str]] = {}
+        self._compile()
+
+    def _compile(self) -> None:
+        for name, node in self._nodes.items():
+            if not isinstance(node, Screen):
+                continue
+            body = "\n".join(f"{key}. {label}" for key, label, _ in node.options)
+            head = f"CON {node.title}"
+            tail = f"\n\n\n{body}"
+            self._rendered[name] = (head, tail)
+            self._invalid[name] = (head, f"\n\n{node.invalid}{tail}")
+            for key, _, target in node.options:
+                if target not in self._nodes:
+                    raise ValueError(f"Menu option {name}.{key} points at unknown node {target}")
+                self._transitions[(name, key)] = target
+                self._parents.setdefault(target, name)
+
+    def render(self, name: str, session: Dict, invalid: bool = False) -> str:
+        head, tail = (self._invalid if invalid else self._rendered)[name]
+        dynamic = self._nodes[name].dynamic
+        return f"{head}{dynamic(session)}{tail}" if dynamic else f"{head}{tail}"
+
+    def dispatch(self, name: str, inputs: List[str], phone: str, session: Dict) -> Optional[str]:
+        """Advance from node `name` using `inputs`; returns the USSD response"""
+        node = self._nodes.get(name)
+        if isinstance(node, Screen):
+            if not inputs:
+                return self.render(name, session)
+            target = self._transitions.get((name, inputs[0]))
+            if target is None:
+                return self.render(name, session, invalid=True)
+            target_node = self._nodes[target]
+            if isinstance(target_node, End):
+                return target_node.text
+            session[self.stage_key] = target
+            return self.dispatch(target, inputs[1:], phone, session)
+
+        if isinstance(node, Action):
+            with USSD_HANDLER_SECONDS.time(name):
+                response = node.handler(inputs, phone, session)
+            if response is None:
+                parent = self._parents[name]
+                session[self.stage_key] = parent
+                return self.render(parent, session)
+            return response
+
+        if isinstance(node, End):
+            return node.text
+        return None
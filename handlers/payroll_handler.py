@@ -0,0 +1,22 @@
+from typing import Dict, List, Optional
+from handlers.document_handler import document_store
+from utils.logging_setup import get_logger
+from utils.payroll import PayrollPipeline
+from utils.sms_queue import sms_queue
+
+# --- Configuration & Pipeline ---
+logger = get_logger('payroll')
+payroll = PayrollPipeline(document_store)
+
+def ussd_response(text):
+    return text
+
+# --- Main Handler ---
+def handle_payment_summary(inputs: List[str], phone: str, session: Dict) -> Optional[str]:
+    """SMS the employee's latest payment summary from the payroll manifest."""
+    summary = payroll.latest_summary(session.get('emp_id', ''))
+    if summary is None:
+        return ussd_response("END No payment summary is available yet. Contact HR.")
+    sms_queue.enqueue([phone], payroll.summary_message(**summary))
+    logger.info("Payment summary %s sent to %s (%s)", summary['period'], session.get('emp_id'), phone)
+    return ussd_response(f"END Your {summary['period']} payment summary will be sent via SMS.")
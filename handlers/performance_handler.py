@@ -1,20 +1,19 @@
 from datetime import datetime, timedelta
-import logging
-import json
+import threading
 from typing import Dict, List, Optional
+from config import Config
+from utils.department_ranking import DepartmentRanking
+from utils.employee_directory import directory
+from utils.logging_setup import get_logger
+from utils.performance_store import performance_store
+from utils.render_cache import RenderCache
+from utils.sms_queue import sms_queue
 
 # Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s [%(levelname)s] %(message)s',
-    handlers=[
-        logging.FileHandler('performance_reviews.log'),
-        logging.StreamHandler()
-    ]
-)
-
-# Performance database (would be DB in production)
-performance_db = {
+logger = get_logger('performance_reviews')
+
+# Demo record, stored on first start (records live in utils.performance_store)
+DEMO_PERFORMANCE = {
     "254743158232": {
         "last_review": (datetime.now() - timedelta(days=30)).strftime("%Y-%m-%d"),
         "rating": 4.5,
@@ -29,34 +28,98 @@ performance_db = {
         "feedback_requests": []
     }
 }
+for _phone, _record in DEMO_PERFORMANCE.items():
+    performance_store.seed(_phone, _record)
 
 def ussd_response(text: str) -> str:
     """Format USSD response"""
     return text if text.startswith(('CON ', 'END ')) else f"CON {text}"
 
 def _get_user_data(phone: str) -> Dict:
-    """Get or create user performance record"""
-    if phone not in performance_db:
-        performance_db[phone] = {
-            "last_review": "Not reviewed",
-            "rating": "N/A",
-            "current_goals": [{"id": 0, "text": "No current goals", "progress": 0, "due": "N/A"}],
-            "completed_training": [{"course": "No training", "date": "N/A", "score": "N/A"}]
-        }
-    return performance_db[phone]
+    """User performance record (a default one, not stored, if there is none)"""
+    return performance_store.get(phone)
 
-def _send_performance_report(phone: str, data: Dict) -> None:
-    """Send detailed performance report via SMS"""
-    from utils.sms_utils import SMSService
-    sms_service = SMSService()
-    report_message = (
+# --- Department standings ---
+department_ranking = DepartmentRanking()
+_ranking_seeded = threading.Event()
+_ranking_seed_lock = threading.Lock()
+
+def _numeric_rating(rating) -> Optional[float]:
+    return float(rating) if isinstance(rating, (int, float)) else None
+
+def _sync_standing(phone: str, rating) -> Optional[str]:
+    """Keep the caller's entry in their department's ranking current; their emp_id"""
+    employee = directory.by_phone(phone)
+    if employee is None:
+        return None
+    department_ranking.update(employee.emp_id, employee.department, _numeric_rating(rating))
+    return employee.emp_id
+
+def _seed_ranking() -> None:
+    """Rank every stored rating, once, on the first standing query (reads only the rating column)"""
+    with _ranking_seed_lock:
+        if _ranking_seeded.is_set():
+            return
+        for phone, rating in performance_store.ratings():
+            _sync_standing(phone, rating)
+        _ranking_seeded.set()
+
+# --- Rendered screens ---
+# Per-employee screens and SMS bodies; every writer below invalidates the
+# employee it changed, so a cached piece is never older than the record
+render_cache = RenderCache(Config.PERF_RENDER_CACHE_SIZE)
+
+def set_rating(phone: str, rating: float, last_review: Optional[str] = None) -> None:
+    """Record a new overall rating and move it within the department ranking"""
+    def change(record: Dict) -> None:
+        record['rating'] = rating
+        if last_review is not None:
+            record['last_review'] = last_review
+    performance_store.update(phone, change)
+    _sync_standing(phone, rating)
+    render_cache.invalidate(phone)
+
+def set_goals(phone: str, goals: List[Dict]) -> None:
+    """Replace the employee's current goals (id, text, progress, due)"""
+    performance_store.update(phone, lambda record: record.__setitem__('current_goals', goals))
+    render_cache.invalidate(phone)
+
+def update_goal_progress(phone: str, goal_id: int, progress: int) -> bool:
+    if not any(goal['id'] == goal_id for goal in _get_user_data(phone)['current_goals']):
+        return False
+
+    def change(record: Dict) -> None:
+        record['current_goals'] = [dict(goal, progress=max(0, min(100, progress))) if goal['id'] == goal_id else goal
+                                   for goal in record['current_goals']]
+    performance_store.update(phone, change)
+    render_cache.invalidate(phone)
+    return True
+
+def record_training(phone: str, course: str, date: str, score: str) -> None:
+    def change(record: Dict) -> None:
+        history = [c for c in record['completed_training'] if c['date'] != "N/A"]  # Drop the placeholder
+        history.append({"course": course, "date": date, "score": score})
+        record['completed_training'] = history
+    performance_store.update(phone, change)
+    render_cache.invalidate(phone)
+
+def _render_report(data: Dict) -> str:
+    try:
+        next_review = (datetime.strptime(data['last_review'], "%Y-%m-%d") + timedelta(days=90)).strftime("%d %b %Y")
+    except ValueError:
+        next_review = "Not scheduled"  # e.g. "Not reviewed"
+    return (
         "PERFORMANCE REPORT\n"
         f"Rating: {data['rating']}/5\n"
         "Goals:\n" + "\n".join(f"- {g['text']} ({g['progress']}%)" for g in data['current_goals']) + "\n"
-        "Upcoming Review: " + (datetime.strptime(data['last_review'], "%Y-%m-%d") + timedelta(days=90)).strftime("%d %b %Y")
+        "Upcoming Review: " + next_review
     )
-    sms_service.send([phone], report_message)
-    logging.info(f"Performance Report Sent to {phone}")
+
+def _send_performance_report(phone: str, data: Dict) -> None:
+    """Queue detailed performance report via SMS"""
+    report_message = render_cache.get(phone, 'report', lambda: _render_report(data))
+    sms_queue.enqueue([phone], report_message)
+    logger.info("Performance Report Queued for %s", phone)
 
 def _submit_feedback_request(phone: str, comment: str) -> None:
     """Submit feedback to manager"""
@@ -66,9 +129,14 @@ def _submit_feedback_request(phone: str, comment: str) -> None:
         "comment": comment,
         "status": "pending"
     }
-    # In production, this would notify the manager
-    logging.info(f"Feedback Request: {json.dumps(request)}")
-    _get_user_data(phone)['feedback_requests'].append(request)
+    employee = directory.by_phone(phone)
+    manager = directory.manager_of(employee.emp_id) if employee else None
+    if manager and manager.phone:
+        sms_queue.enqueue([manager.phone], f"ElevateHR: {employee.name} ({employee.emp_id}) requests feedback: {comment}")
+    logger.info("Feedback Request: %s", request)
+    performance_store.update(
+        phone, lambda record: record.__setitem__('feedback_requests', record.get('feedback_requests', []) + [request])
+    )
 
 
 def _show_main_menu() -> str:
@@ -86,13 +154,24 @@ def _show_main_menu() -> str:
 def _handle_view_rating(phone: str) -> str:
     """Display comprehensive rating information"""
     user_data = _get_user_data(phone)
-    
-    rating_info = (
+    if not _ranking_seeded.is_set():
+        _seed_ranking()
+    # Cheap when nothing moved; picks up roster department changes
+    emp_id = _sync_standing(phone, user_data.get('rating'))
+    standing = department_ranking.standing(emp_id) if emp_id else None
+    peer_avg = f"{standing.peer_average:.1f}/5" if standing and standing.peer_average is not None else "N/A"
+    dept_rank = f"{standing.rank}/{standing.size}" if standing else "N/A"
+
+    # Standing moves with colleagues' ratings, so only the employee's own lines are cached
+    header = render_cache.get(phone, 'rating', lambda: (
         f"END Performance Rating:\n"
         f"Last Review: {user_data.get('last_review', 'N/A')}\n"
         f"Overall: {user_data.get('rating', 'N/A')}/5\n"
-        f"Peer Avg: 4.2/5\n"
-        f"Dept Rank: 12/45\n\n"
+    ))
+    rating_info = (
+        f"{header}"
+        f"Peer Avg: {peer_avg}\n"
+        f"Dept Rank: {dept_rank}\n\n"
         "Detailed report sent via SMS"
     )
     
@@ -101,9 +180,7 @@ def _handle_view_rating(phone: str) -> str:
     
     return ussd_response(rating_info)
 
-def _handle_view_goals(inputs: List[str], phone: str, session: Dict) -> Optional[str]:
-    """Interactive goal tracking system"""
-    user_data = _get_user_data(phone)
+def _render_goals_menu(user_data: Dict) -> str:
     goals_menu = ["CON Current Goals:"]
     
     for idx, goal in enumerate(user_data.get('current_goals', []), 1):
@@ -115,9 +192,25 @@ def _handle_view_goals(inputs: List[str], phone: str, session: Dict) -> Optional
         )
     
     goals_menu.append("0. Back")
+    return ussd_response("\n".join(goals_menu))
+
+def _render_goal_detail(goal: Dict) -> str:
+    return ussd_response(
+        f"CON Goal Details:\n"
+        f"{goal['text']}\n"
+        f"Progress: {goal['progress']}%\n"
+        f"Due: {goal['due']}\n\n"
+        "1. Update Progress\n"
+        "2. Request Help\n"
+        "0. Back"
+    )
+
+def _handle_view_goals(inputs: List[str], phone: str, session: Dict) -> Optional[str]:
+    """Interactive goal tracking system"""
+    user_data = _get_user_data(phone)
     
     if not inputs:
-        return ussd_response("\n".join(goals_menu))
+        return render_cache.get(phone, 'goals', lambda: _render_goals_menu(user_data))
     
     choice = inputs[0]
     if choice == '0':
@@ -126,23 +219,12 @@ def _handle_view_goals(inputs: List[str], phone: str, session: Dict) -> Optional
     try:
         goal_idx = int(choice) - 1
         selected_goal = user_data['current_goals'][goal_idx]
-        
-        return ussd_response(
-            f"CON Goal Details:\n"
-            f"{selected_goal['text']}\n"
-            f"Progress: {selected_goal['progress']}%\n"
-            f"Due: {selected_goal['due']}\n\n"
-            "1. Update Progress\n"
-            "2. Request Help\n"
-            "0. Back"
-        )
+        return render_cache.get(phone, f"goal:{goal_idx}", lambda: _render_goal_detail(selected_goal))
     
     except (ValueError, IndexError):
         return ussd_response("CON Invalid selection. Try again:")
 
-def _handle_view_training(phone: str) -> str:
-    """Display training history with certifications"""
-    user_data = _get_user_data(phone)
+def _render_training(user_data: Dict) -> str:
     training_history = ["END Completed Training:"]
     
     for course in user_data.get('completed_training', []):
@@ -156,6 +238,11 @@ def _handle_view_training(phone: str) -> str:
     
     return ussd_response("\n".join(training_history))
 
+def _handle_view_training(phone: str) -> str:
+    """Display training history with certifications"""
+    user_data = _get_user_data(phone)
+    return render_cache.get(phone, 'training', lambda: _render_training(user_data))
+
 def _handle_request_feedback(inputs: List[str], phone: str, session: Dict) -> Optional[str]:
     """Feedback request workflow"""
     if not inputs:
@@ -1,44 +1,29 @@
-from datetime import datetime, timedelta
-import logging
 from typing import Dict, List, Optional
-import json
+from utils.attendance_summary import AttendanceSummaryEngine
+from utils.employee_directory import directory
+from utils.hr_data import get_attendance_store
+from utils.logging_setup import get_logger
+from utils.report_store import ReportStore
 
 # Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s [%(levelname)s] %(message)s',
-    handlers=[
-        logging.FileHandler('attendance_reports.log'),
-        logging.StreamHandler()
-    ]
-)
+logger = get_logger('attendance_reports')
+
+# --- Report storage (per-phone index, persisted under reports/) ---
+report_db = ReportStore('reports')
+summary_engine = AttendanceSummaryEngine(get_attendance_store, report_db, roster=directory.phones)
 
-# --- Mock Database ---
-report_db = {}
-manager_db = {
-    '254712345678': '254787654321'  # employee_phone: manager_phone
-}
 
 def ussd_response(text):
     return text
 
-def _get_user_reports(phone: str) -> List[Dict]:
-    """Fetches and sorts reports for a user."""
-    reports = [r for r in report_db.values() if r.get('phone') == phone]
-    return sorted(reports, key=lambda r: r['date'], reverse=True)
+def _get_user_reports(phone: str, limit: Optional[int] = None) -> List[Dict]:
+    """Fetches a user's reports, newest first."""
+    return report_db.latest(phone, limit)
 
 def _save_report(phone: str, status: str):
     """Saves a new report for the user."""
-    today_str = datetime.now().strftime("%Y-%m-%d")
-    report_id = f"{phone}_{today_str}"
-    report_db[report_id] = {
-        'id': report_id,
-        'phone': phone,
-        'date': today_str,
-        'status': status,
-        'timestamp': datetime.now().isoformat()
-    }
-    logging.info(f"Report saved: {report_db[report_id]}")
+    report = report_db.save(phone, status)
+    logger.info("Report saved: %s", report)
     # In a real app, you would send SMS confirmations here
 
 def handle_reporting(inputs: List[str], phone: str, session: Dict) -> Optional[str]:
@@ -60,9 +45,11 @@ def handle_reporting(inputs: List[str], phone: str, session: Dict) -> Optional[s
             return None  # Go back to main menu
         elif choice == '1':
             session['reporting_stage'] = 'daily_report'
+            summary_engine.request('daily', phone)
             return ussd_response("END Your daily report will be sent via SMS.")
         elif choice == '2':
             session['reporting_stage'] = 'weekly_summary'
+            summary_engine.request('weekly', phone)
             return ussd_response("END Your weekly summary will be sent via SMS.")
         elif choice == '3':
             session['reporting_stage'] = 'log_absence'
@@ -76,10 +63,10 @@ def handle_reporting(inputs: List[str], phone: str, session: Dict) -> Optional[s
             return ussd_response("CON Invalid option. Please try again.")
 
     elif stage == 'log_absence':
-        if not inputs or len(inputs) < 2:
+        if not inputs:
             return ussd_response("CON Invalid input for logging absence.")
 
-        choice = inputs[1]
+        choice = inputs[0]
         if choice == '0':
             session['reporting_stage'] = 'menu'
             return handle_reporting([], phone, session) # Show previous menu
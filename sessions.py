@@ -1,25 +1,256 @@
-from datetime import datetime, timedelta
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict
+from config import Config
 
-_sessions = {}
+# Sessions expire MAX_SESSION_AGE seconds after their last touch.
+SESSION_TTL = Config.MAX_SESSION_AGE
+INLINE_EVICTION_BATCH = 8  # Max expired sessions evicted per request
+
+
+class SessionBackend(ABC):
+    """Interface every session store implements."""
+
+    # Whether calls may wait on I/O (the async helpers then use a worker thread)
+    blocking = True
+
+    @abstractmethod
+    def get(self, session_id: str) -> Dict:
+        """The live session (touching it), or {} if there is none."""
+
+    @abstractmethod
+    def update(self, session_id: str, session_data: Dict) -> None:
+        """Store the session and touch it."""
+
+    @abstractmethod
+    def clear(self, session_id: str) -> None:
+        """Forget the session."""
+
+    @abstractmethod
+    def cleanup(self) -> int:
+        """Evict every session that is due and return how many were removed."""
+
+    @abstractmethod
+    def stats(self) -> Dict:
+        """Size and eviction counters for health reporting."""
+
+
+class MemorySessionBackend(SessionBackend):
+    """Single-process store kept in touch order.
+
+    Because the TTL is the same for every session, touch order is also expiry
+    order: the head is always the next session due, so cleanup only ever looks
+    at sessions that are actually expired.
+    """
+
+    blocking = False
+
+    def __init__(self, ttl_seconds: float = SESSION_TTL, inline_batch: int = INLINE_EVICTION_BATCH):
+        self.ttl_seconds = ttl_seconds
+        self.inline_batch = inline_batch
+        self._data: "OrderedDict[str, Dict]" = OrderedDict()
+        self._touched: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self.evicted_total = 0
+
+    def _touch(self, session_id: str, now: float) -> None:
+        self._touched[session_id] = now
+        self._data.move_to_end(session_id)
+
+    def _evict_due(self, now: float, limit: int = 0) -> int:
+        """Pop expired sessions from the head of the touch order."""
+        deadline = now - self.ttl_seconds
+        evicted = 0
+        while self._data and (not limit or evicted < limit):
+            session_id = next(iter(self._data))
+            if self._touched[session_id] > deadline:
+                break
+            del self._data[session_id]
+            del self._touched[session_id]
+            evicted += 1
+        self.evicted_total += evicted
+        return evicted
+
+    def _evict_if_due(self, session_id: str, now: float) -> None:
+        """Drop one session that is expired but beyond the inline batch."""
+        touched = self._touched.get(session_id)
+        if touched is not None and touched <= now - self.ttl_seconds:
+            del self._data[session_id]
+            del self._touched[session_id]
+            self.evicted_total += 1
+
+    def get(self, session_id: str) -> Dict:
+        now = time.time()
+        with self._lock:
+            self._evict_due(now, self.inline_batch)
+            self._evict_if_due(session_id, now)
+            session = self._data.get(session_id)
+            if session is None:
+                return {}
+            self._touch(session_id, now)
+            session['last_activity'] = now
+            return session
+
+    def update(self, session_id: str, session_data: Dict) -> None:
+        now = time.time()
+        with self._lock:
+            self._evict_due(now, self.inline_batch)
+            self._evict_if_due(session_id, now)
+            session_data['last_activity'] = now
+            self._data[session_id] = session_data
+            self._touch(session_id, now)
+
+    def clear(self, session_id: str) -> None:
+        with self._lock:
+            if session_id in self._data:
+                del self._data[session_id]
+                del self._touched[session_id]
+
+    def cleanup(self) -> int:
+        with self._lock:
+            return self._evict_due(time.time())
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'backend': 'memory',
+                'active_sessions': len(self._data),
+                'evicted_total': self.evicted_total,
+                'ttl_seconds': self.ttl_seconds
+            }
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SQLiteSessionBackend(SessionBackend):
+    """Store shared by every worker process on one host.
+
+    Runs SQLite in WAL mode so readers never block the writer, with one
+    connection per thread (re-opened after fork). Sessions are touched on
+    every get and update, like the memory store, and expired rows are
+    removed through the expires_at index in small batches.
+    """
+
+    EVICT_EVERY = 64  # Updates between inline eviction passes
+
+    def __init__(self, db_path: str, ttl_seconds: float = SESSION_TTL, inline_batch: int = INLINE_EVICTION_BATCH):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.inline_batch = inline_batch
+        self._local = threading.local()
+        self._updates = 0
+        self.evicted_total = 0
+        self._init_schema()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _init_schema(self) -> None:
+        conn = self._conn()
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS sessions ('
+            'session_id TEXT PRIMARY KEY, data TEXT NOT NULL, expires_at REAL NOT NULL)'
+        )
+        conn.execute('CREATE INDEX IF NOT EXISTS sessions_expires_at ON sessions (expires_at)')
+
+    def _evict_due(self, now: float, limit: int = 0) -> int:
+        conn = self._conn()
+        if limit:
+            cursor = conn.execute(
+                'DELETE FROM sessions WHERE rowid IN '
+                '(SELECT rowid FROM sessions WHERE expires_at <= ? LIMIT ?)',
+                (now, limit)
+            )
+        else:
+            cursor = conn.execute('DELETE FROM sessions WHERE expires_at <= ?', (now,))
+        self.evicted_total += cursor.rowcount
+        return cursor.rowcount
+
+    def get(self, session_id: str) -> Dict:
+        now = time.time()
+        rows = self._conn().execute(
+            "UPDATE sessions SET expires_at = ?, data = json_set(data, '$.last_activity', ?) "
+            'WHERE session_id = ? AND expires_at > ? RETURNING data',
+            (now + self.ttl_seconds, now, session_id, now)
+        ).fetchall()
+        return json.loads(rows[0][0]) if rows else {}
+
+    def update(self, session_id: str, session_data: Dict) -> None:
+        now = time.time()
+        session_data['last_activity'] = now
+        self._conn().execute(
+            'INSERT OR REPLACE INTO sessions (session_id, data, expires_at) VALUES (?, ?, ?)',
+            (session_id, json.dumps(session_data, separators=(',', ':')), now + self.ttl_seconds)
+        )
+        self._updates += 1
+        if self._updates % self.EVICT_EVERY == 0:
+            self._evict_due(now, self.inline_batch * self.EVICT_EVERY)
+
+    def clear(self, session_id: str) -> None:
+        self._conn().execute('DELETE FROM sessions WHERE session_id = ?', (session_id,))
+
+    def cleanup(self) -> int:
+        return self._evict_due(time.time())
+
+    def stats(self) -> Dict:
+        count = self._conn().execute('SELECT COUNT(*) FROM sessions').fetchone()[0]
+        return {
+            'backend': 'sqlite',
+            'active_sessions': count,
+            'evicted_total': self.evicted_total,
+            'ttl_seconds': self.ttl_seconds
+        }
+
+
+def create_session_backend(name: str = Config.SESSION_BACKEND) -> SessionBackend:
+    """Build the session backend selected in configuration."""
+    if name == 'memory':
+        return MemorySessionBackend()
+    if name == 'sqlite':
+        return SQLiteSessionBackend(Config.SESSION_DB_PATH)
+    raise ValueError(f"Unknown session backend: {name}")
+
+
+_sessions = create_session_backend()
 
 def get_user_session(session_id):
-    return _sessions.get(session_id, {})
+    return _sessions.get(session_id)
 
 def update_user_session(session_id, session_data):
-    _sessions[session_id] = session_data
+    _sessions.update(session_id, session_data)
+
+async def get_user_session_async(session_id):
+    """Awaitable get: inline for the memory store, in a worker thread for SQLite."""
+    if not _sessions.blocking:
+        return _sessions.get(session_id)
+    return await asyncio.get_running_loop().run_in_executor(None, _sessions.get, session_id)
+
+async def update_user_session_async(session_id, session_data):
+    if not _sessions.blocking:
+        return _sessions.update(session_id, session_data)
+    await asyncio.get_running_loop().run_in_executor(None, _sessions.update, session_id, session_data)
 
 def clear_user_session(session_id):
-    if session_id in _sessions:
-        del _sessions[session_id]
+    _sessions.clear(session_id)
 
 def cleanup_old_sessions():
-    """Removes sessions older than 1 hour to prevent memory leaks."""
-    now = datetime.now()
-    old_sessions = []
-    for session_id, session_data in _sessions.items():
-        last_activity = session_data.get('last_activity', now)
-        if now - last_activity > timedelta(hours=1):
-            old_sessions.append(session_id)
-    
-    for session_id in old_sessions:
-        clear_user_session(session_id)
+    """Removes sessions idle for longer than the session TTL."""
+    return _sessions.cleanup()
+
+def session_stats():
+    """Session store size and eviction counters for health reporting."""
+    return _sessions.stats()
@@ -0,0 +1,285 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from utils.journal import Journal, write_snapshot
+from utils.logging_setup import get_logger
+
+logger = get_logger('clock_utils')
+
+# A day's attendance for one employee: (clock_in epoch, clock_out epoch or None)
+Entry = Tuple[float, Optional[float]]
+
+
+def _entry_to_record(phone: str, day: str, entry: Entry) -> Dict:
+    """Expand a compact entry into the record shape the rest of the app uses"""
+    clock_in, clock_out = entry
+    record = {
+        'phone': phone,
+        'date': day,
+        'clock_in': datetime.fromtimestamp(clock_in).isoformat(),
+        'status': 'clocked_in'
+    }
+    if clock_out is not None:
+        total_minutes = int((clock_out - clock_in) // 60)
+        record.update({
+            'clock_out': datetime.fromtimestamp(clock_out).isoformat(),
+            'duration_hours': total_minutes // 60,
+            'duration_minutes': total_minutes % 60,
+            'status': 'clocked_out'
+        })
+    return record
+
+
+class AttendanceStore:
+    """Attendance history partitioned by day and indexed by phone.
+
+    Each day is a partition mapping phone -> compact entry. The most recent
+    `resident_days` partitions stay in memory (LRU); older ones live in
+    `<data_dir>/partitions/YYYY-MM-DD.json` and are loaded on demand. Changes
+    are appended to a journal and folded into partition files by compact().
+    An index of open clock-ins answers "who is clocked in now" directly; it
+    and the set of known phones are written to `<data_dir>/index.json` with
+    each compaction, so a restart restores them without reading old days.
+    """
+
+    def __init__(self, data_dir: str = 'attendance', resident_days: int = 8):
+        self.data_dir = data_dir
+        self.resident_days = resident_days
+        self._partition_dir = os.path.join(data_dir, 'partitions')
+        os.makedirs(self._partition_dir, exist_ok=True)
+        self._journal_path = os.path.join(data_dir, 'attendance.journal')
+        self._index_path = os.path.join(data_dir, 'index.json')
+        self._lock = threading.RLock()
+        self._compaction_lock = threading.Lock()
+        self._partitions: "OrderedDict[str, Dict[str, Entry]]" = OrderedDict()
+        self._dirty: Set[str] = set()
+        self._writing: Set[str] = set()  # Days being written by compact(); not yet safe to evict
+        self._open: Dict[str, str] = {}  # phone -> day of the open clock-in
+        self._known_phones: Set[str] = set()
+        self._recover()
+        self._journal = Journal(self._journal_path)
+
+    # --- Partition management ---
+
+    def _partition_path(self, day: str) -> str:
+        return os.path.join(self._partition_dir, f"{day}.json")
+
+    def _partition(self, day: str) -> Dict[str, Entry]:
+        """Return a day's partition, loading it from disk if needed (lock held)"""
+        partition = self._partitions.get(day)
+        if partition is None:
+            partition = {}
+            path = self._partition_path(day)
+            if os.path.exists(path):
+                with open(path) as f:
+                    partition = {phone: tuple(entry) for phone, entry in json.load(f).items()}
+                self._known_phones.update(partition)
+            self._partitions[day] = partition
+            self._evict()
+        else:
+            self._partitions.move_to_end(day)
+        return partition
+
+    def _evict(self) -> None:
+        """Drop least recently used partitions that are on disk, beyond the residency budget"""
+        excess = len(self._partitions) - self.resident_days
+        # Never the most recent: it was just requested and may be about to change
+        for day in list(self._partitions)[:-1]:
+            if excess <= 0:
+                break
+            if day not in self._dirty and day not in self._writing:
+                del self._partitions[day]
+                excess -= 1
+
+    def _apply(self, day: str, phone: str, entry: Entry) -> None:
+        self._partition(day)[phone] = entry
+        self._dirty.add(day)
+        self._known_phones.add(phone)
+        if entry[1] is None:
+            self._open[phone] = day
+        elif self._open.get(phone) == day:
+            del self._open[phone]
+
+    def _index(self) -> Dict:
+        """Open clock-ins and known phones, as written to index.json (lock held)"""
+        return {'open': dict(self._open), 'known': sorted(self._known_phones)}
+
+    def _load_index(self) -> None:
+        if os.path.exists(self._index_path):
+            with open(self._index_path) as f:
+                index = json.load(f)
+            self._open.update(index['open'])
+            self._known_phones.update(index['known'])
+            return
+        # No index yet (data from before it existed): scan every partition once
+        for name in sorted(os.listdir(self._partition_dir)):
+            if not name.endswith('.json'):
+                continue
+            with open(os.path.join(self._partition_dir, name)) as f:
+                partition = json.load(f)
+            self._known_phones.update(partition)
+            for phone, entry in partition.items():
+                if entry[1] is None:
+                    self._open[phone] = name[:-len('.json')]
+        write_snapshot(self._index_path, self._index())
+
+    def _recover(self) -> None:
+        """Rebuild state from the index and partition files plus any journal segments"""
+        self._load_index()
+        sealed = self._journal_path + '.compacting'
+        replayed = 0
+        for segment in (sealed, self._journal_path):
+            for event in Journal.replay(segment):
+                self._apply(event['d'], event['k'], tuple(event['v']))
+                replayed += 1
+        if replayed:
+            self._write_partitions({day: dict(self._partitions[day]) for day in self._dirty})
+            write_snapshot(self._index_path, self._index())
+            self._dirty.clear()
+            for segment in (sealed, self._journal_path):
+                if os.path.exists(segment):
+                    os.remove(segment)
+            self._evict()
+        logger.info("Attendance store ready (%d journal events replayed, %d open)", replayed, len(self._open))
+
+    def _write_partitions(self, partitions: Dict[str, Dict[str, Entry]]) -> None:
+        for day, partition in partitions.items():
+            write_snapshot(self._partition_path(day), partition)
+
+    def _record(self, day: str, phone: str, entry: Entry) -> Tuple[Journal, int]:
+        """Apply and journal a change (lock held); caller waits on the commit after unlocking"""
+        self._apply(day, phone, entry)
+        return self._journal, self._journal.append({'d': day, 'k': phone, 'v': entry}, durable=False)
+
+    # --- Writes ---
+
+    def clock_in(self, phone: str, now: datetime) -> Dict:
+        """Open today's entry; raises ValueError if today already has one"""
+        day = now.date().isoformat()
+        with self._lock:
+            if phone in self._partition(day):
+                raise ValueError("already clocked in today")
+            if phone in self._open:
+                raise ValueError("still clocked in from a previous day")
+            entry = (now.timestamp(), None)
+            journal, seq = self._record(day, phone, entry)
+        journal.wait_synced(seq)
+        return _entry_to_record(phone, day, entry)
+
+    def clock_out(self, phone: str, now: datetime) -> Dict:
+        """Close the open entry, which may have been opened on a previous day"""
+        with self._lock:
+            day = self._open.get(phone)
+            if day is None:
+                raise ValueError("not clocked in")
+            entry = (self._partition(day)[phone][0], now.timestamp())
+            journal, seq = self._record(day, phone, entry)
+        journal.wait_synced(seq)
+        return _entry_to_record(phone, day, entry)
+
+    def import_records(self, records: Iterable[Dict]) -> int:
+        """Load records in the legacy clock_records.json shape"""
+        count, seq = 0, 0
+        with self._lock:
+            for record in records:
+                clock_in = datetime.fromisoformat(record['clock_in']).timestamp()
+                clock_out = record.get('clock_out')
+                entry = (clock_in, datetime.fromisoformat(clock_out).timestamp() if clock_out else None)
+                journal, seq = self._record(record['date'], record['phone'], entry)
+                count += 1
+        if count:
+            journal.wait_synced(seq)
+        return count
+
+    # --- Queries ---
+
+    def get(self, phone: str, day: date) -> Optional[Dict]:
+        with self._lock:
+            entry = self._partition(day.isoformat()).get(phone)
+        return _entry_to_record(phone, day.isoformat(), entry) if entry else None
+
+    def get_today(self, phone: str) -> Optional[Dict]:
+        return self.get(phone, date.today())
+
+    def is_clocked_in(self, phone: str) -> bool:
+        return phone in self._open
+
+    def clocked_in_now(self) -> List[str]:
+        with self._lock:
+            return list(self._open)
+
+    def history(self, phone: str, days: int = 30, until: Optional[date] = None) -> List[Dict]:
+        """Records for the last `days` days, newest first"""
+        until = until or date.today()
+        records = []
+        with self._lock:
+            for offset in range(days):
+                day = (until - timedelta(days=offset)).isoformat()
+                entry = self._partition(day).get(phone)
+                if entry:
+                    records.append(_entry_to_record(phone, day, entry))
+        return records
+
+    def day_entries(self, day: date) -> Dict[str, Entry]:
+        """A copy of one day's compact entries (phone -> (clock_in, clock_out))"""
+        with self._lock:
+            return dict(self._partition(day.isoformat()))
+
+    def absent_on(self, day: date, roster: Optional[Iterable[str]] = None) -> Set[str]:
+        """Employees in the roster (default: everyone seen) with no entry that day"""
+        with self._lock:
+            present = self._partition(day.isoformat()).keys()
+            roster = set(roster) if roster is not None else set(self._known_phones)
+            return roster - present
+
+    def known_phones(self) -> Set[str]:
+        with self._lock:
+            return set(self._known_phones)
+
+    # --- Maintenance ---
+
+    def compact(self) -> int:
+        """Write dirty partitions to disk and drop the folded journal segment"""
+        if not self._compaction_lock.acquire(blocking=False):
+            return 0
+        try:
+            with self._lock:
+                dirty = {day: dict(self._partitions[day]) for day in self._dirty}
+                index = self._index()
+                sealed = self._journal.rotate()
+                # Pinned until written: evicting now would reload the stale file
+                self._writing.update(self._dirty)
+                self._dirty.clear()
+            written = False
+            try:
+                self._write_partitions(dirty)
+                write_snapshot(self._index_path, index)
+                written = True
+            finally:
+                with self._lock:
+                    self._writing.difference_update(dirty)
+                    if not written:
+                        self._dirty.update(dirty)
+            if sealed:
+                os.remove(sealed)
+            with self._lock:
+                self._evict()
+            return len(dirty)
+        finally:
+            self._compaction_lock.release()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'resident_partitions': len(self._partitions),
+                'dirty_partitions': len(self._dirty),
+                'clocked_in': len(self._open),
+                'known_employees': len(self._known_phones)
+            }
+
+    def close(self) -> None:
+        self.compact()
+        self._journal.close()
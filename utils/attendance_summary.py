@@ -0,0 +1,185 @@
+import threading
+import time
+from datetime import date, datetime, timedelta
+from operator import add
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from utils.attendance_store import AttendanceStore
+from utils.logging_setup import get_logger
+from utils.report_store import ReportStore
+from utils.sms_queue import sms_queue
+
+logger = get_logger('attendance_reports')
+
+CONFIG = {
+    'WORK_START': (9, 0),      # Expected clock-in (hour, minute)
+    'LATE_GRACE_MINUTES': 15,  # Clock-ins after start + grace count as late
+    'WORK_DAYS': {0, 1, 2, 3, 4}  # Monday..Friday
+}
+
+PERIOD_TITLES = {'daily': 'Daily Report', 'weekly': 'Weekly Summary'}
+
+
+class AttendanceSummaryEngine:
+    """Batch daily/weekly attendance summaries for every employee at once.
+
+    Each day of a period is turned into columns aligned with the roster
+    (clock-in, clock-out, reported absence) and the per-employee figures are
+    produced by whole-column operations, then summed across days. Results
+    are cached per period; menu requests are answered from the cache, and
+    requests that arrive before the first computation are queued and
+    answered when it finishes.
+    """
+
+    def __init__(self, attendance: Callable[[], AttendanceStore], reports: ReportStore,
+                 roster: Optional[Callable[[], Iterable[str]]] = None):
+        self._attendance = attendance
+        self._reports = reports
+        self._roster = roster
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._results: Dict[str, Dict] = {}
+        self._pending: Dict[str, List[str]] = {'daily': [], 'weekly': []}
+        self._refreshing = False  # A refresh for queued requests has been started
+
+    # --- Computation ---
+
+    @staticmethod
+    def period_bounds(kind: str, today: date) -> Tuple[date, date]:
+        if kind == 'daily':
+            return today, today
+        start = today - timedelta(days=today.weekday())  # ISO week starts Monday
+        return start, start + timedelta(days=6)
+
+    def _current_roster(self) -> List[str]:
+        phones = set(self._roster()) if self._roster else set()
+        # A roster without bound phones (the demo roster) falls back to
+        # everyone the attendance store has seen
+        return sorted(phones or self._attendance().known_phones())
+
+    def compute(self, kind: str, today: Optional[date] = None) -> Dict:
+        """Aggregate hours, late arrivals and absences for the period containing `today`"""
+        today = today or date.today()
+        start, end = self.period_bounds(kind, today)
+        roster = self._current_roster()
+        size = len(roster)
+        hours = [0.0] * size
+        late = [0] * size
+        present = [0] * size
+        absent = [0] * size
+        excused = [0] * size
+        start_hour, start_minute = CONFIG['WORK_START']
+        started = time.perf_counter()
+
+        day = start
+        while day <= min(end, today):
+            entries = self._attendance().day_entries(day)
+            reported = self._reports.statuses_on(day)
+            late_after = (datetime.combine(day, datetime.min.time())
+                          + timedelta(hours=start_hour, minutes=start_minute + CONFIG['LATE_GRACE_MINUTES'])).timestamp()
+
+            # One column per attribute, aligned with the roster
+            entry_col = list(map(entries.get, roster))
+            seen_col = [e is not None for e in entry_col]
+            hours_col = [(e[1] - e[0]) / 3600.0 if e and e[1] is not None else 0.0 for e in entry_col]
+            late_col = [e is not None and e[0] > late_after for e in entry_col]
+
+            hours = list(map(add, hours, hours_col))
+            late = list(map(add, late, late_col))
+            present = list(map(add, present, seen_col))
+            if day.weekday() in CONFIG['WORK_DAYS']:
+                reported_col = [p in reported for p in roster]
+                absent = [a + (not s) for a, s in zip(absent, seen_col)]
+                excused = [x + (not s and r) for x, s, r in zip(excused, seen_col, reported_col)]
+            day += timedelta(days=1)
+
+        by_phone = {
+            phone: {'hours': round(h, 1), 'late': l, 'present': p, 'absent': a, 'reported': x}
+            for phone, h, l, p, a, x in zip(roster, hours, late, present, absent, excused)
+        }
+        logger.info("Computed %s attendance summary for %d employees in %.2fs", kind, size, time.perf_counter() - started)
+        return {
+            'kind': kind,
+            'start': start.isoformat(),
+            'end': end.isoformat(),
+            'computed_at': datetime.now().isoformat(),
+            'by_phone': by_phone
+        }
+
+    def refresh(self, today: Optional[date] = None, wait: bool = False) -> None:
+        """Recompute the current daily and weekly summaries and answer queued requests.
+
+        Returns at once if a refresh is already running, unless `wait`.
+        """
+        if not self._refresh_lock.acquire(blocking=wait):
+            return
+        try:
+            for kind in PERIOD_TITLES:
+                result = self.compute(kind, today)
+                with self._lock:
+                    self._results[kind] = result
+                    pending, self._pending[kind] = self._pending[kind], []
+                self._send(result, pending)
+        except Exception as e:
+            logger.error("Attendance summary refresh failed: %s", e)
+        finally:
+            self._refresh_lock.release()
+
+    def _refresh_pending(self) -> None:
+        try:
+            self.refresh(wait=True)
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    # --- Delivery ---
+
+    @staticmethod
+    def render(result: Dict, phone: str) -> str:
+        summary = result['by_phone'].get(phone)
+        start = date.fromisoformat(result['start'])
+        label = start.strftime('%d %b %Y') if result['kind'] == 'daily' else f"Week of {start.strftime('%d %b %Y')}"
+        title = PERIOD_TITLES[result['kind']]
+        if summary is None:
+            return f"ElevateHR {title}\n{label}\nNo attendance recorded."
+        return (
+            f"ElevateHR {title}\n{label}\n"
+            f"Days present: {summary['present']}\n"
+            f"Hours worked: {summary['hours']:.1f}\n"
+            f"Late arrivals: {summary['late']}\n"
+            f"Absences: {summary['absent']} ({summary['reported']} reported)"
+        )
+
+    def _send(self, result: Dict, phones: Iterable[str]) -> int:
+        """Queue summaries off the request path, waiting for room rather than dropping"""
+        return sms_queue.enqueue_bulk((phone, self.render(result, phone), None) for phone in phones)
+
+    def _is_current(self, result: Optional[Dict], kind: str) -> bool:
+        return result is not None and result['start'] == self.period_bounds(kind, date.today())[0].isoformat()
+
+    def request(self, kind: str, phone: str) -> None:
+        """Send one employee's summary from the precomputed result"""
+        with self._lock:
+            result = self._results.get(kind)
+            start = False
+            if not self._is_current(result, kind):
+                self._pending[kind].append(phone)
+                result = None
+                start, self._refreshing = not self._refreshing, True
+        if result is not None:
+            sms_queue.enqueue([phone], self.render(result, phone))
+        elif start:
+            threading.Thread(target=self._refresh_pending, name="attendance-summary", daemon=True).start()
+
+    def broadcast(self, kind: str) -> int:
+        """Recompute and queue the summary for every employee seen in the period"""
+        self.refresh()
+        with self._lock:
+            result = self._results.get(kind)
+        if result is None:
+            return 0
+        active = [phone for phone, s in result['by_phone'].items() if s['present'] or s['reported']]
+        queued = self._send(result, active)
+        if queued < len(active):
+            logger.warning("Dropped %d of %d %s attendance summaries", len(active) - queued, len(active), kind)
+        logger.info("Queued %d %s attendance summaries", queued, kind)
+        return queued
@@ -0,0 +1,82 @@
+import threading
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from typing import Dict, NamedTuple, Optional, Tuple
+
+
+class Standing(NamedTuple):
+    rank: int                       # 1 = highest rated; ties share a rank
+    size: int                       # Rated members of the department
+    peer_average: Optional[float]   # Mean of the other members; None if alone
+    percentile: float               # Share of the department rated below
+
+
+class _Department:
+    __slots__ = ('ratings', 'total')
+
+    def __init__(self):
+        self.ratings = array('d')  # Kept sorted ascending
+        self.total = 0.0
+
+
+class DepartmentRanking:
+    """Rank and peer average per department, maintained on each rating change.
+
+    Every department keeps its ratings in one sorted array plus a running
+    total. A rating change removes the old value and inserts the new one by
+    bisection (a memmove within the array), so a view answers rank and
+    peer average with one bisect instead of re-sorting the department.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._departments: Dict[str, _Department] = {}
+        self._members: Dict[str, Tuple[str, float]] = {}
+
+    def update(self, member: str, department: str, rating: Optional[float]) -> None:
+        """Record `member`'s current department and rating (None = unrated)"""
+        with self._lock:
+            current = self._members.get(member)
+            if current == (department, rating):
+                return
+            if current is not None:
+                self._remove_locked(member, *current)
+            if rating is None:
+                return
+            entry = self._departments.get(department)
+            if entry is None:
+                entry = self._departments[department] = _Department()
+            insort(entry.ratings, rating)
+            entry.total += rating
+            self._members[member] = (department, rating)
+
+    def remove(self, member: str) -> None:
+        with self._lock:
+            current = self._members.get(member)
+            if current is not None:
+                self._remove_locked(member, *current)
+
+    def _remove_locked(self, member: str, department: str, rating: float) -> None:
+        entry = self._departments[department]
+        del entry.ratings[bisect_left(entry.ratings, rating)]
+        entry.total -= rating
+        del self._members[member]
+        if not entry.ratings:
+            del self._departments[department]
+
+    def standing(self, member: str) -> Optional[Standing]:
+        with self._lock:
+            current = self._members.get(member)
+            if current is None:
+                return None
+            department, rating = current
+            entry = self._departments[department]
+            size = len(entry.ratings)
+            below = bisect_left(entry.ratings, rating)
+            above = size - bisect_right(entry.ratings, rating)
+            peers = (entry.total - rating) / (size - 1) if size > 1 else None
+            return Standing(rank=above + 1, size=size, peer_average=peers, percentile=below / size * 100)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {'departments': len(self._departments), 'rated': len(self._members)}
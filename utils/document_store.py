@@ -0,0 +1,207 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Dict, Iterable, NamedTuple, Optional, Tuple
+from config import Config
+from utils.logging_setup import get_logger
+
+logger = get_logger('document_audit')
+
+_PURGE_BATCH = 1000
+
+
+class StoredDocument(NamedTuple):
+    doc_type: str
+    owner: str
+    name: str
+    path: str  # Absolute path of the file
+    size: int
+    mtime: float
+    etag: str  # Strong ETag value, unquoted
+    created: float
+    expires: float  # Unix time the retention period ends
+
+
+class DocumentStore:
+    """Employee documents on local disk, indexed in SQLite.
+
+    Files live under `root`, at the per-type directory from `layout`
+    ({doc_type: (subdirectory, retention_days)}), then the owner's phone
+    digits: root/payslips/254712345678/2025-06.pdf. The index records each
+    file's size, mtime, ETag and retention deadline, so finding an owner's
+    latest document is one indexed query, responses can be validated without
+    a stat(), and purge_expired() walks the deadline index instead of the
+    directory tree. Files are written to a temporary name and renamed into
+    place, so a reader never sees half a document. Batch jobs can write()
+    files from worker processes and index() them in one transaction.
+    """
+
+    def __init__(self, root: str = Config.DOC_STORE_ROOT, layout: Optional[Dict[str, Tuple[str, int]]] = None):
+        self.root = os.path.abspath(root)
+        self.layout = layout or {}
+        self.db_path = os.path.join(self.root, 'index.db')
+        self._local = threading.local()
+        self._counters = {'stored': 0, 'purged': 0}
+        self._counter_lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+        self._init_schema()
+
+    # --- Index ---
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _init_schema(self) -> None:
+        conn = self._conn()
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS documents ('
+            'doc_type TEXT NOT NULL, owner TEXT NOT NULL, name TEXT NOT NULL, path TEXT NOT NULL, '
+            'size INTEGER NOT NULL, mtime REAL NOT NULL, etag TEXT NOT NULL, '
+            'created REAL NOT NULL, expires REAL NOT NULL, '
+            'PRIMARY KEY (doc_type, owner, name)) WITHOUT ROWID'
+        )
+        conn.execute('CREATE INDEX IF NOT EXISTS documents_latest ON documents (doc_type, owner, created)')
+        conn.execute('CREATE INDEX IF NOT EXISTS documents_expires ON documents (expires)')
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._counter_lock:
+            self._counters[name] += amount
+
+    # --- Writes ---
+
+    @staticmethod
+    def owner_key(phone: str) -> str:
+        """Directory and index key for a phone: its digits"""
+        return ''.join(c for c in phone if c.isdigit())
+
+    def _target(self, doc_type: str, owner: str, name: str) -> str:
+        if doc_type not in self.layout:
+            raise ValueError(f"Unknown document type {doc_type}")
+        if not owner or os.path.basename(name) != name or name.startswith('.'):
+            raise ValueError(f"Invalid document name {name!r} for {owner!r}")
+        return os.path.join(self.root, self.layout[doc_type][0].strip('/'), owner, name)
+
+    def _describe(self, doc_type: str, owner: str, name: str, path: str, created: Optional[float]) -> StoredDocument:
+        stat = os.stat(path)
+        created = created if created is not None else time.time()
+        return StoredDocument(
+            doc_type, owner, name, path, stat.st_size, stat.st_mtime,
+            f"{stat.st_size:x}-{stat.st_mtime_ns:x}", created, created + self.layout[doc_type][1] * 86400
+        )
+
+    def index(self, documents: Iterable[StoredDocument]) -> int:
+        """Record written documents in one transaction; returns how many"""
+        rows = [(d.doc_type, d.owner, d.name, d.path, d.size, d.mtime, d.etag, d.created, d.expires)
+                for d in documents]
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.executemany(
+                'INSERT OR REPLACE INTO documents (doc_type, owner, name, path, size, mtime, etag, created, expires) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', rows
+            )
+            conn.execute('COMMIT')
+        except sqlite3.Error:
+            conn.execute('ROLLBACK')
+            raise
+        self._count('stored', len(rows))
+        return len(rows)
+
+    def write(self, doc_type: str, phone: str, name: str, data: bytes,
+              created: Optional[float] = None) -> StoredDocument:
+        """Write the file only; it is not served until passed to index()"""
+        owner = self.owner_key(phone)
+        path = self._target(doc_type, owner, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        return self._describe(doc_type, owner, name, path, created)
+
+    def put(self, doc_type: str, phone: str, name: str, data: bytes,
+            created: Optional[float] = None) -> StoredDocument:
+        """Store `data` as the phone's document `name` (replacing one of the same name)"""
+        document = self.write(doc_type, phone, name, data, created)
+        self.index([document])
+        return document
+
+    def put_file(self, doc_type: str, phone: str, name: str, source: str,
+                 created: Optional[float] = None) -> StoredDocument:
+        """Copy the file at `source` in (in kernel on Linux) as the phone's document `name`"""
+        owner = self.owner_key(phone)
+        path = self._target(doc_type, owner, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+        os.close(fd)
+        try:
+            shutil.copyfile(source, tmp)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        document = self._describe(doc_type, owner, name, path, created)
+        self.index([document])
+        return document
+
+    # --- Reads ---
+
+    def latest(self, doc_type: str, phone: str) -> Optional[StoredDocument]:
+        """The phone's most recent document of `doc_type` still within retention"""
+        row = self._conn().execute(
+            'SELECT doc_type, owner, name, path, size, mtime, etag, created, expires FROM documents '
+            'WHERE doc_type = ? AND owner = ? AND expires > ? ORDER BY created DESC LIMIT 1',
+            (doc_type, self.owner_key(phone), time.time())
+        ).fetchone()
+        return StoredDocument(*row) if row else None
+
+    # --- Retention ---
+
+    def purge_expired(self, now: Optional[float] = None) -> int:
+        """Delete documents past retention, oldest deadline first; returns how many"""
+        now = now if now is not None else time.time()
+        conn = self._conn()
+        purged = 0
+        while True:
+            rows = conn.execute(
+                'SELECT doc_type, owner, name, path FROM documents WHERE expires <= ? ORDER BY expires LIMIT ?',
+                (now, _PURGE_BATCH)
+            ).fetchall()
+            if not rows:
+                break
+            for *_, path in rows:
+                try:
+                    os.unlink(path)
+                    os.rmdir(os.path.dirname(path))  # Only succeeds once the owner has no documents left
+                except OSError:
+                    pass
+            conn.execute('BEGIN IMMEDIATE')
+            conn.executemany('DELETE FROM documents WHERE doc_type = ? AND owner = ? AND name = ?',
+                             [row[:3] for row in rows])
+            conn.execute('COMMIT')
+            purged += len(rows)
+        if purged:
+            self._count('purged', purged)
+            logger.info("Purged %d document(s) past retention", purged)
+        return purged
+
+    def stats(self) -> Dict:
+        count, size = self._conn().execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM documents').fetchone()
+        with self._counter_lock:
+            stats = dict(self._counters)
+        stats.update(documents=count, bytes=size)
+        return stats
@@ -0,0 +1,210 @@
+import hashlib
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional, Tuple
+from itsdangerous import BadData, BadSignature, URLSafeSerializer
+from itsdangerous.encoding import base64_decode
+from config import Config
+from utils.logging_setup import get_logger
+
+logger = get_logger('document_audit')
+
+
+class DocumentClaims(NamedTuple):
+    phone: str
+    doc_type: str
+    expires: int  # Unix time
+
+
+class TokenRejected(ValueError):
+    """A link token that must not be honoured; `reason` says why.
+
+    'malformed' or 'bad_signature' (not ours), 'mismatch' (signed for
+    another phone or document), 'expired', or 'replayed' (already used
+    beyond the grace window).
+    """
+
+    def __init__(self, reason: str, message: str):
+        super().__init__(message)
+        self.reason = reason
+
+
+class _ReplayFilter:
+    """Tokens already used, as two generations of Bloom-style bitmaps.
+
+    A token sets `hashes` bits taken straight from its HMAC signature
+    (already uniformly random, so no further hashing). Generations rotate
+    every `period` seconds, at least the token lifetime, so a used token
+    stays in one of the two until it has expired anyway and memory never
+    grows: 2 x `bits` / 8 bytes. A false positive refuses a fresh link;
+    at 4 MiB per generation and 100k links a day that is under 1 in 10^7.
+
+    Tokens first used in the last `grace` seconds are also kept exactly,
+    with their first-use time, in insertion (so time) order; the oldest
+    are dropped as they leave the window.
+    """
+
+    def __init__(self, bits: int, hashes: int, period: float, grace: float):
+        self.bits = bits
+        self.hashes = hashes
+        self.period = period
+        self.grace = grace
+        self._current = bytearray(bits // 8)
+        self._previous = bytearray(bits // 8)
+        self._started = time.monotonic()
+        self._first_used: "OrderedDict[bytes, float]" = OrderedDict()
+        self.rotations = 0
+
+    def _positions(self, digest: bytes):
+        return [int.from_bytes(digest[4 * n:4 * n + 4], 'little') % self.bits for n in range(self.hashes)]
+
+    def _rotate(self, now: float) -> None:
+        if now - self._started < self.period:
+            return
+        self._previous = self._current if now - self._started < 2 * self.period else bytearray(self.bits // 8)
+        self._current = bytearray(self.bits // 8)
+        self._started = now
+        self.rotations += 1
+
+    def first_use(self, digest: bytes, now: float) -> Optional[float]:
+        """When the token was first used: `now` if this is the first time
+        (recording it), the earlier time if still within the grace window,
+        or None if it was used before that."""
+        self._rotate(now)
+        first_used = self._first_used
+        while first_used and now - next(iter(first_used.values())) > self.grace:
+            first_used.popitem(last=False)
+        key = digest[:16]
+        if key in first_used:
+            return first_used[key]
+        positions = self._positions(digest)
+        current, previous = self._current, self._previous
+        if (all(current[p >> 3] >> (p & 7) & 1 for p in positions) or
+                all(previous[p >> 3] >> (p & 7) & 1 for p in positions)):
+            return None
+        for p in positions:
+            current[p >> 3] |= 1 << (p & 7)
+        first_used[key] = now
+        return now
+
+    def __len__(self) -> int:
+        return len(self._first_used)
+
+
+class DocumentTokens:
+    """Signed, expiring document link tokens that verify without storage.
+
+    A token is an itsdangerous HMAC-SHA256 signature over (phone, doc_type,
+    expiry, nonce), so any process holding the secret can check it. A token
+    may be used again for `grace` seconds after its first use (link
+    previews, a retried download); the most recent of those sit in an LRU
+    of `cache_size` and are answered without recomputing the HMAC. After
+    that a token is one-time: the replay filter refuses it until it
+    expires. Replays are tracked per process, so behind several workers a
+    link may be used once per worker.
+    """
+
+    def __init__(self, secret: str, ttl: int = Config.DOC_TOKEN_TTL_SECONDS,
+                 cache_size: int = Config.DOC_TOKEN_CACHE_SIZE, grace: float = Config.DOC_TOKEN_GRACE_SECONDS,
+                 replay_bits: int = 1 << 25, replay_hashes: int = 4):
+        self.ttl = ttl
+        self.cache_size = cache_size
+        self.grace = grace
+        self._serializer = URLSafeSerializer(secret, salt='document-link',
+                                             signer_kwargs={'digest_method': hashlib.sha256})
+        self._lock = threading.Lock()
+        self._recent: "OrderedDict[str, Tuple[DocumentClaims, float]]" = OrderedDict()
+        self._replays = _ReplayFilter(replay_bits, replay_hashes, period=ttl + grace, grace=grace)
+        self._counters = {'issued': 0, 'verified': 0, 'cache_hits': 0, 'rejected': 0}
+
+    def issue(self, phone: str, doc_type: str, now: Optional[float] = None) -> Tuple[str, int]:
+        """A new token for the phone's document and its expiry (Unix time)"""
+        expires = int(now if now is not None else time.time()) + self.ttl
+        token = self._serializer.dumps([phone, doc_type, expires, secrets.randbits(32)])
+        with self._lock:
+            self._counters['issued'] += 1
+        return token, expires
+
+    def _reject(self, reason: str, message: str) -> TokenRejected:
+        with self._lock:
+            self._counters['rejected'] += 1
+        return TokenRejected(reason, message)
+
+    def verify(self, token: str, phone: str, doc_type: str, now: Optional[float] = None) -> DocumentClaims:
+        """The token's claims if it may be honoured for this phone and document.
+
+        Raises TokenRejected otherwise.
+        """
+        wall = now if now is not None else time.time()
+        clock = time.monotonic()
+        with self._lock:
+            cached = self._recent.get(token)
+            if cached is not None:
+                claims, first_used = cached
+                if clock - first_used <= self.grace:
+                    self._recent.move_to_end(token)
+                    self._counters['cache_hits'] += 1
+                else:
+                    del self._recent[token]
+                    claims = None
+        if cached is not None:
+            if claims is None:
+                raise self._reject('replayed', "Link already used")
+            return self._check_claims(claims, phone, doc_type, wall)
+
+        claims, digest = self._load(token, phone, doc_type, wall)
+        with self._lock:
+            first_used = self._replays.first_use(digest, clock)
+            if first_used is None:
+                self._counters['rejected'] += 1
+                raise TokenRejected('replayed', "Link already used")
+            self._recent[token] = (claims, first_used)
+            while len(self._recent) > self.cache_size:
+                self._recent.popitem(last=False)
+            self._counters['verified'] += 1
+        return claims
+
+    def check(self, token: str, phone: str, doc_type: str, now: Optional[float] = None) -> DocumentClaims:
+        """Signature, claims and expiry only; not counted as a use of the link.
+
+        For requests that prove the client already holds the document (a
+        revalidation or a resumed download), so they keep working until
+        the link expires. Raises TokenRejected.
+        """
+        return self._load(token, phone, doc_type, now if now is not None else time.time())[0]
+
+    def _load(self, token: str, phone: str, doc_type: str, now: float) -> Tuple[DocumentClaims, bytes]:
+        try:
+            phone_claim, doc_claim, expires, _ = self._serializer.loads(token)
+            digest = base64_decode(token.rsplit('.', 1)[1])
+        except (BadData, ValueError, TypeError) as e:
+            reason = 'bad_signature' if isinstance(e, BadSignature) else 'malformed'
+            raise self._reject(reason, "Invalid link") from None
+        return self._check_claims(DocumentClaims(phone_claim, doc_claim, int(expires)), phone, doc_type, now), digest
+
+    def _check_claims(self, claims: DocumentClaims, phone: str, doc_type: str, now: float) -> DocumentClaims:
+        if claims.phone != phone or claims.doc_type != doc_type:
+            raise self._reject('mismatch', "Link does not match this document")
+        if now > claims.expires:
+            raise self._reject('expired', "Link expired")
+        return claims
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._counters)
+            stats['cached'] = len(self._recent)
+            stats['in_grace'] = len(self._replays)
+            stats['replay_rotations'] = self._replays.rotations
+        return stats
+
+
+def _secret() -> str:
+    if Config.DOC_TOKEN_SECRET:
+        return Config.DOC_TOKEN_SECRET
+    logger.warning("DOC_TOKEN_SECRET is not set; document links will not survive a restart")
+    return secrets.token_hex(32)
+
+
+document_tokens = DocumentTokens(_secret())
@@ -0,0 +1,284 @@
+import csv
+import json
+import os
+import threading
+from array import array
+from typing import Dict, FrozenSet, Iterable, Iterator, List, NamedTuple, Optional
+from config import Config
+from utils.logging_setup import get_logger
+
+logger = get_logger('ussd_gateway')
+
+COUNTRY_CODE = '+254'
+
+# Roles a roster may grant; each is one bit of a row's role mask
+ROLES = ('employee', 'manager', 'hr', 'finance', 'admin')
+_ROLE_BITS = {role: 1 << bit for bit, role in enumerate(ROLES)}
+# Every possible mask's role set, built once so records share them
+_ROLE_SETS = [frozenset(role for role, bit in _ROLE_BITS.items() if mask & bit) for mask in range(1 << len(ROLES))]
+
+# Used when no roster file exists: the IDs the gateway has always accepted,
+# not bound to a phone
+DEMO_EMPLOYEES = [
+    {'emp_id': 'EMP123', 'name': 'Demo Employee', 'department': 'Operations', 'roles': 'employee'},
+    {'emp_id': 'EMP456', 'name': 'Demo Employee', 'department': 'Operations', 'manager_id': 'MGR789',
+     'roles': 'employee'},
+    {'emp_id': 'MGR789', 'name': 'Demo Manager', 'department': 'Operations', 'roles': 'employee|manager'},
+]
+
+
+class Employee(NamedTuple):
+    emp_id: str
+    name: str
+    phone: Optional[str]  # +254XXXXXXXXX (see normalize_phone); None if unbound
+    department: str
+    manager_id: Optional[str]
+    roles: FrozenSet[str]
+
+
+def normalize_phone(phone: Optional[str]) -> Optional[str]:
+    """International form, so '+254712345678', '254712345678' and '0712345678' match"""
+    if not phone:
+        return None
+    if len(phone) == 13 and phone.startswith(COUNTRY_CODE) and phone[1:].isdigit():
+        return phone
+    digits = ''.join(c for c in phone if c.isdigit())
+    if len(digits) < 9:
+        return None
+    return COUNTRY_CODE + digits[-9:]
+
+
+class _DirectoryIndex:
+    """One immutable build of the roster.
+
+    Fields are stored as columns indexed by row: strings in lists, the
+    department as an index into a shared name table, the manager as a row
+    number and roles as a bit mask. Direct reports are kept in CSR form
+    (offsets into one row array), so 100k employees cost a few arrays rather
+    than 100k dicts. Lookups go through two dicts: emp_id -> row and
+    phone -> row; each role's members are a frozenset of emp_ids.
+    """
+
+    def __init__(self, rows: Iterable[Dict], source: str):
+        self.source = source
+        self.emp_ids: List[str] = []
+        self.names: List[str] = []
+        self.phones: List[Optional[str]] = []
+        self.departments = array('H')
+        self.department_names: List[str] = []
+        self.roles = array('H')
+        self.by_id: Dict[str, int] = {}
+        self.by_phone: Dict[str, int] = {}
+        self.warnings = 0
+        manager_ids: List[Optional[str]] = []
+        department_codes: Dict[str, int] = {}
+
+        for row in rows:
+            emp_id = (row.get('emp_id') or '').strip().upper()
+            if not emp_id:
+                self.warnings += 1
+                continue
+            if emp_id in self.by_id:
+                raise ValueError(f"Duplicate emp_id {emp_id} in {source}")
+            index = len(self.emp_ids)
+            phone = normalize_phone(row.get('phone'))
+            if phone is not None:
+                if phone in self.by_phone:
+                    logger.warning("Phone of %s already belongs to %s; left unbound",
+                                   emp_id, self.emp_ids[self.by_phone[phone]])
+                    self.warnings += 1
+                    phone = None
+                else:
+                    self.by_phone[phone] = index
+            department = (row.get('department') or '').strip()
+            code = department_codes.get(department)
+            if code is None:
+                code = department_codes[department] = len(self.department_names)
+                self.department_names.append(department)
+
+            self.by_id[emp_id] = index
+            self.emp_ids.append(emp_id)
+            self.names.append((row.get('name') or '').strip())
+            self.phones.append(phone)
+            self.departments.append(code)
+            self.roles.append(self._role_mask(row.get('roles'), emp_id))
+            manager_ids.append((row.get('manager_id') or '').strip().upper() or None)
+
+        self.role_members: Dict[str, FrozenSet[str]] = {
+            role: frozenset(emp_id for emp_id, mask in zip(self.emp_ids, self.roles) if mask & bit)
+            for role, bit in _ROLE_BITS.items()
+        }
+
+        # Managers as row numbers, then direct reports grouped per manager
+        self.managers = array('i', [-1]) * len(self.emp_ids)
+        report_counts = [0] * (len(self.emp_ids) + 1)
+        for index, manager_id in enumerate(manager_ids):
+            if manager_id is None:
+                continue
+            manager = self.by_id.get(manager_id)
+            if manager is None or manager == index:
+                self.warnings += 1
+                continue
+            self.managers[index] = manager
+            report_counts[manager + 1] += 1
+        self.report_offsets = array('I', [0]) * (len(self.emp_ids) + 1)
+        for index in range(1, len(report_counts)):
+            self.report_offsets[index] = self.report_offsets[index - 1] + report_counts[index]
+        self.report_rows = array('I', [0]) * self.report_offsets[-1]
+        fill = array('I', self.report_offsets)
+        for index, manager in enumerate(self.managers):
+            if manager >= 0:
+                self.report_rows[fill[manager]] = index
+                fill[manager] += 1
+
+    def _role_mask(self, roles: Optional[str], emp_id: str) -> int:
+        mask = _ROLE_BITS['employee']
+        for role in (roles or '').replace(';', '|').split('|'):
+            role = role.strip().lower()
+            if not role:
+                continue
+            bit = _ROLE_BITS.get(role)
+            if bit is None:
+                logger.warning("Unknown role %r for %s ignored", role, emp_id)
+                self.warnings += 1
+                continue
+            mask |= bit
+        return mask
+
+    def record(self, index: int) -> Employee:
+        manager = self.managers[index]
+        return Employee(
+            emp_id=self.emp_ids[index],
+            name=self.names[index],
+            phone=self.phones[index],
+            department=self.department_names[self.departments[index]],
+            manager_id=self.emp_ids[manager] if manager >= 0 else None,
+            roles=_ROLE_SETS[self.roles[index]]
+        )
+
+
+def _read_roster(path: str) -> Iterator[Dict]:
+    if path.endswith('.json'):
+        with open(path) as f:
+            data = json.load(f)
+        yield from (data['employees'] if isinstance(data, dict) else data)
+        return
+    with open(path, newline='') as f:
+        yield from csv.DictReader(f)
+
+
+class EmployeeDirectory:
+    """Employee roster with emp_id, phone, manager and role indexes.
+
+    The roster (CSV with columns emp_id,name,phone,department,manager_id,roles
+    or a JSON list of the same objects; roles are '|'-separated) is built
+    into a _DirectoryIndex. Readers take one reference to the current index
+    and never lock; reload() builds a new index aside and swaps the
+    reference, so a reload never blocks a lookup and a failed reload keeps
+    the previous roster.
+    """
+
+    def __init__(self, path: Optional[str] = Config.EMPLOYEE_ROSTER):
+        self.path = path
+        self._reload_lock = threading.Lock()
+        self._mtime: Optional[float] = None
+        self._index = _DirectoryIndex([], 'empty')
+        self.reload()
+
+    # --- Loading ---
+    def reload(self) -> bool:
+        """Rebuild from the roster file (or the demo roster if there is none)"""
+        with self._reload_lock:
+            try:
+                if self.path and os.path.exists(self.path):
+                    mtime = os.path.getmtime(self.path)
+                    index = _DirectoryIndex(_read_roster(self.path), self.path)
+                else:
+                    mtime = None
+                    index = _DirectoryIndex(DEMO_EMPLOYEES, 'demo')
+            except (OSError, ValueError, KeyError) as e:
+                logger.error("Employee roster reload failed, keeping %d employees: %s", len(self._index.emp_ids), e)
+                return False
+            self._index = index
+            self._mtime = mtime
+        logger.info("Employee directory loaded %d employees from %s (%d warnings)",
+                    len(index.emp_ids), index.source, index.warnings)
+        return True
+
+    def reload_if_changed(self) -> bool:
+        """Reload when the roster file's mtime has moved (scheduler job)"""
+        if not self.path or not os.path.exists(self.path):
+            return False
+        if os.path.getmtime(self.path) == self._mtime:
+            return False
+        return self.reload()
+
+    # --- Lookups ---
+    def get(self, emp_id: str) -> Optional[Employee]:
+        index = self._index
+        row = index.by_id.get(emp_id.strip().upper())
+        return None if row is None else index.record(row)
+
+    def by_phone(self, phone: str) -> Optional[Employee]:
+        index = self._index
+        row = index.by_phone.get(normalize_phone(phone))
+        return None if row is None else index.record(row)
+
+    def authenticate(self, emp_id: str, phone: str) -> Optional[Employee]:
+        """The employee if `emp_id` exists and is bound to the calling phone.
+
+        Employees without a phone on the roster are accepted from any phone.
+        """
+        index = self._index
+        row = index.by_id.get(emp_id.strip().upper())
+        if row is None:
+            return None
+        bound = index.phones[row]
+        if bound is not None and bound != normalize_phone(phone):
+            return None
+        return index.record(row)
+
+    def manager_of(self, emp_id: str) -> Optional[Employee]:
+        index = self._index
+        row = index.by_id.get(emp_id.strip().upper())
+        if row is None or index.managers[row] < 0:
+            return None
+        return index.record(index.managers[row])
+
+    def reports_of(self, emp_id: str) -> List[str]:
+        """Direct reports' emp_ids"""
+        index = self._index
+        row = index.by_id.get(emp_id.strip().upper())
+        if row is None:
+            return []
+        start, end = index.report_offsets[row], index.report_offsets[row + 1]
+        return [index.emp_ids[report] for report in index.report_rows[start:end]]
+
+    def has_role(self, emp_id: str, role: str) -> bool:
+        index = self._index
+        row = index.by_id.get(emp_id.strip().upper())
+        return row is not None and bool(index.roles[row] & _ROLE_BITS.get(role, 0))
+
+    def with_role(self, role: str) -> FrozenSet[str]:
+        """emp_ids holding the role"""
+        return self._index.role_members.get(role, frozenset())
+
+    def phones(self) -> List[str]:
+        """Every phone bound to an employee on the roster"""
+        return list(self._index.by_phone)
+
+    def __len__(self) -> int:
+        return len(self._index.emp_ids)
+
+    def stats(self) -> Dict:
+        index = self._index
+        return {
+            'employees': len(index.emp_ids),
+            'bound_phones': len(index.by_phone),
+            'departments': len(index.department_names),
+            'source': index.source,
+            'warnings': index.warnings
+        }
+
+
+directory = EmployeeDirectory()
@@ -1,40 +1,50 @@
 from datetime import datetime, timedelta
-import logging
 from typing import Dict, Optional, Tuple
 import json
 import os
+from utils.attendance_store import AttendanceStore
+from utils.logging_setup import get_logger
 
 # Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s [%(levelname)s] %(message)s',
-    handlers=[
-        logging.FileHandler('clock_utils.log'),
-        logging.StreamHandler()
-    ]
-)
+logger = get_logger('clock_utils')
 
 # Configuration
 CONFIG = {
-    'DATA_FILE': 'clock_records.json',
+    'DATA_DIR': 'attendance',             # Day partitions + journal
+    'LEGACY_DATA_FILE': 'clock_records.json',
+    'RESIDENT_DAYS': 8,                   # Day partitions kept in memory
     'WORK_HOURS': 8,
     'SMS_ENABLED': True
 }
 
-# In-memory storage with file backup
-_clock_records: Dict[str, Dict] = {}
+# Single attendance store shared by this module and handlers/clock_handler
+_store: Optional[AttendanceStore] = None
 
 def init_clock_system():
     """Initialize clock system with data persistence"""
-    global _clock_records
+    global _store
+    if _store:
+        _store.close()
     try:
-        if os.path.exists(CONFIG['DATA_FILE']):
-            with open(CONFIG['DATA_FILE'], 'r') as f:
-                _clock_records = json.load(f)
-        logging.info("Clock system initialized with persistence")
+        _store = AttendanceStore(CONFIG['DATA_DIR'], resident_days=CONFIG['RESIDENT_DAYS'])
+        _migrate_legacy_records()
+        logger.info("Clock system initialized with persistence")
     except Exception as e:
-        logging.error(f"Data load failed: {str(e)}")
-        _clock_records = {}
+        logger.error("Data load failed: %s", e)
+        raise
+
+def get_attendance_store() -> AttendanceStore:
+    """The process-wide attendance store"""
+    return _store
+
+def compact_clock_records() -> None:
+    """Fold journaled clock events into day partitions"""
+    try:
+        written = _store.compact()
+        if written:
+            logger.info("Attendance compacted (%d partitions written)", written)
+    except Exception as e:
+        logger.error("Attendance compaction failed: %s", e)
 
 def clock_in(phone: str) -> Tuple[str, bool]:
     """
@@ -43,21 +53,13 @@ def clock_in(phone: str) -> Tuple[str, bool]:
     """
     try:
         now = datetime.now()
-        today = now.date().isoformat()
         
         # Check existing clock-in
-        if phone in _clock_records and _clock_records[phone].get('date') == today:
+        if _store.get_today(phone) or _store.is_clocked_in(phone):
             return "You've already clocked in today", False
         
         # Record clock-in
-        _clock_records[phone] = {
-            'phone': phone,
-            'clock_in': now.isoformat(),
-            'date': today,
-            'status': 'clocked_in'
-        }
-        
-        _save_data()
+        _store.clock_in(phone, now)
         
         # Prepare response
         clock_in_time = now.strftime("%I:%M %p")
@@ -78,7 +80,7 @@ def clock_in(phone: str) -> Tuple[str, bool]:
         return message, True
         
     except Exception as e:
-        logging.error(f"Clock-in failed for {phone}: {str(e)}")
+        logger.error("Clock-in failed for %s: %s", phone, e)
         return "System error. Your clock-in was recorded", False
 
 def clock_out(phone: str) -> Tuple[str, bool]:
@@ -88,29 +90,17 @@ def clock_out(phone: str) -> Tuple[str, bool]:
     """
     try:
         now = datetime.now()
-        today = now.date().isoformat()
         
         # Validate existing clock-in
-        if phone not in _clock_records or _clock_records[phone].get('date') != today:
+        if not _store.is_clocked_in(phone):
+            if _store.get_today(phone):
+                return "You've already clocked out today", False
             return "Please clock in first", False
             
-        if 'clock_out' in _clock_records[phone]:
-            return "You've already clocked out today", False
-            
-        # Calculate duration
-        clock_in_time = datetime.fromisoformat(_clock_records[phone]['clock_in'])
-        duration = now - clock_in_time
-        hours, minutes = _calculate_duration(duration)
-        
         # Record clock-out
-        _clock_records[phone].update({
-            'clock_out': now.isoformat(),
-            'duration_hours': hours,
-            'duration_minutes': minutes,
-            'status': 'clocked_out'
-        })
-        
-        _save_data()
+        record = _store.clock_out(phone, now)
+        clock_in_time = datetime.fromisoformat(record['clock_in'])
+        hours, minutes = record['duration_hours'], record['duration_minutes']
         
         # Prepare response
         clock_out_time = now.strftime("%I:%M %p")
@@ -130,15 +120,12 @@ def clock_out(phone: str) -> Tuple[str, bool]:
         return message, True
         
     except Exception as e:
-        logging.error(f"Clock-out failed for {phone}: {str(e)}")
+        logger.error("Clock-out failed for %s: %s", phone, e)
         return "System error. Your clock-out was recorded", False
 
 def get_today_status(phone: str) -> Optional[Dict]:
     """Get today's clock status with validation"""
-    today = datetime.now().date().isoformat()
-    if phone in _clock_records and _clock_records[phone].get('date') == today:
-        return _clock_records[phone]
-    return None
+    return _store.get_today(phone)
 
 # --- Helper Functions ---
 
@@ -153,19 +140,22 @@ def _send_sms_notification(phone: str, message: str) -> bool:
     """Mock SMS notification function"""
     try:
         # In production, integrate with SMS gateway
-        logging.info(f"SMS Notification to {phone}: {message}")
+        logger.info("SMS Notification to %s: %s", phone, message)
         return True
     except Exception as e:
-        logging.error(f"SMS failed for {phone}: {str(e)}")
+        logger.error("SMS failed for %s: %s", phone, e)
         return False
 
-def _save_data() -> None:
-    """Persist data to file"""
-    try:
-        with open(CONFIG['DATA_FILE'], 'w') as f:
-            json.dump(_clock_records, f, indent=2)
-    except Exception as e:
-        logging.error(f"Data save failed: {str(e)}")
+def _migrate_legacy_records() -> None:
+    """One-time import of the old single-file clock_records.json"""
+    legacy_file = CONFIG['LEGACY_DATA_FILE']
+    if not os.path.exists(legacy_file):
+        return
+    with open(legacy_file, 'r') as f:
+        imported = _store.import_records(json.load(f).values())
+    _store.compact()
+    os.replace(legacy_file, legacy_file + '.migrated')
+    logger.info("Migrated %d legacy clock records into the attendance store", imported)
 
 # Initialize system on import
 init_clock_system()
\ No newline at end of file
@@ -0,0 +1,191 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Tuple
+from utils.logging_setup import get_logger
+
+logger = get_logger('ussd_gateway')
+
+# Set by deferred_durability(): waits are collected here instead of blocking
+_deferred_waits: ContextVar[Optional[List[Tuple['Journal', int]]]] = ContextVar('journal_deferred_waits', default=None)
+
+
+class Journal:
+    """Append-only JSON-lines journal with group commit.
+
+    Each append writes one compact line to the buffered file. A background
+    committer flushes and fsyncs whatever has accumulated every
+    `commit_interval` seconds, so many concurrent appends share one fsync.
+    Callers that pass durable=True block until their record is on disk.
+    """
+
+    def __init__(self, path: str, commit_interval: float = 0.01):
+        self.path = path
+        self.commit_interval = commit_interval
+        self._file = open(path, 'ab')
+        self._lock = threading.Lock()
+        self._committed = threading.Condition(self._lock)
+        self._pending = threading.Condition(self._lock)
+        self._written_seq = 0
+        self._synced_seq = 0
+        self._async_waiters: List[Tuple[int, asyncio.AbstractEventLoop, asyncio.Future]] = []
+        self._closed = False
+        self._committer = threading.Thread(target=self._commit_loop, name=f"journal-{os.path.basename(path)}", daemon=True)
+        self._committer.start()
+
+    def append(self, record: Dict, durable: bool = True) -> int:
+        """Write a record and return its sequence number.
+
+        With durable=False the caller may wait later via wait_synced(), which
+        lets it release its own locks before blocking on the commit.
+        """
+        line = json.dumps(record, separators=(',', ':')).encode() + b'\n'
+        with self._lock:
+            if self._closed:
+                raise ValueError(f"Journal {self.path} is closed")
+            self._file.write(line)
+            self._written_seq += 1
+            seq = self._written_seq
+            self._pending.notify()
+        if durable:
+            self.wait_synced(seq)
+        return seq
+
+    def wait_synced(self, seq: int) -> None:
+        """Block until the record with sequence number `seq` has been fsynced.
+
+        Inside deferred_durability() the wait is recorded for the caller's
+        event loop to await instead.
+        """
+        deferred = _deferred_waits.get()
+        if deferred is not None:
+            deferred.append((self, seq))
+            return
+        with self._lock:
+            self._committed.wait_for(lambda: self._synced_seq >= seq or self._closed)
+
+    def synced(self, seq: int) -> "asyncio.Future":
+        """Awaitable version of wait_synced(), resolved by the committer thread"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._lock:
+            if self._synced_seq >= seq or self._closed:
+                future.set_result(None)
+            else:
+                self._async_waiters.append((seq, loop, future))
+        return future
+
+    def _wake_async_locked(self) -> None:
+        waiting = []
+        for waiter in self._async_waiters:
+            seq, loop, future = waiter
+            if self._synced_seq >= seq or self._closed:
+                loop.call_soon_threadsafe(_resolve, future)
+            else:
+                waiting.append(waiter)
+        self._async_waiters = waiting
+
+    def _sync_locked(self) -> None:
+        if self._synced_seq == self._written_seq:
+            return
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._synced_seq = self._written_seq
+        self._committed.notify_all()
+        if self._async_waiters:
+            self._wake_async_locked()
+
+    def _commit_loop(self) -> None:
+        while True:
+            with self._lock:
+                self._pending.wait_for(lambda: self._closed or self._written_seq > self._synced_seq)
+                if self._closed:
+                    return
+            # Let more appends join this commit before paying for the fsync
+            time.sleep(self.commit_interval)
+            with self._lock:
+                if self._closed:
+                    return
+                try:
+                    self._sync_locked()
+                except OSError as e:
+                    logger.error("Journal commit failed for %s: %s", self.path, e)
+
+    def rotate(self) -> Optional[str]:
+        """Seal the current segment for compaction and start a fresh one.
+
+        Returns the sealed segment's path, or None if nothing was written.
+        """
+        with self._lock:
+            self._sync_locked()
+            if self._file.tell() == 0:
+                return None
+            self._file.close()
+            sealed = self.path + '.compacting'
+            os.replace(self.path, sealed)
+            self._file = open(self.path, 'ab')
+            return sealed
+
+    def close(self) -> None:
+        with self._lock:
+            if self._closed:
+                return
+            self._sync_locked()
+            self._closed = True
+            self._file.close()
+            self._committed.notify_all()
+            self._wake_async_locked()
+            self._pending.notify_all()
+
+    @staticmethod
+    def replay(path: str) -> Iterator[Dict]:
+        """Yield the records in a journal segment, skipping a torn final line."""
+        if not os.path.exists(path):
+            return
+        with open(path, 'rb') as f:
+            for line_no, line in enumerate(f, 1):
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    logger.warning("Skipping unreadable journal record %s:%d", path, line_no)
+
+
+def _resolve(future: "asyncio.Future") -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+@contextmanager
+def deferred_durability() -> Iterator[List[Tuple[Journal, int]]]:
+    """Collect the journal waits of the enclosed code instead of blocking on them.
+
+    Used by the ASGI bridge: a worker thread runs a synchronous handler in
+    this context and returns immediately; the event loop then awaits
+    await_synced() on the collected waits before answering.
+    """
+    waits: List[Tuple[Journal, int]] = []
+    token = _deferred_waits.set(waits)
+    try:
+        yield waits
+    finally:
+        _deferred_waits.reset(token)
+
+
+async def await_synced(waits: List[Tuple[Journal, int]]) -> None:
+    """Wait on the event loop until every (journal, seq) is on disk"""
+    if waits:
+        await asyncio.gather(*(journal.synced(seq) for journal, seq in waits))
+
+
+def write_snapshot(path: str, data: Dict) -> None:
+    """Atomically replace a JSON snapshot file."""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, separators=(',', ':'))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
@@ -0,0 +1,558 @@
+import json
+import os
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+from utils.journal import Journal
+from utils.logging_setup import get_logger
+
+logger = get_logger('leave_requests')
+
+STATUSES = ('pending', 'approved', 'rejected', 'cancelled')
+DECISIONS = ('approved', 'rejected')  # What a manager may do with a pending request
+_PENDING = 0
+_ACTIVE = (0, 1)  # Status codes that hold days on the calendar
+ID_PREFIX = 'LV-'
+
+
+def format_request_id(number: int) -> str:
+    return f"{ID_PREFIX}{number:06d}"
+
+
+def parse_request_id(request_id: str) -> Optional[int]:
+    if not request_id.upper().startswith(ID_PREFIX) or not request_id[len(ID_PREFIX):].isdigit():
+        return None
+    return int(request_id[len(ID_PREFIX):])
+
+
+class LeaveRejected(ValueError):
+    """A request the calendar cannot accept; `reason` is 'overlap' or 'balance'"""
+
+    def __init__(self, reason: str, message: str, **details):
+        super().__init__(message)
+        self.reason = reason
+        self.details = details
+
+
+class _EmployeeLeave:
+    """One employee's active requests, ordered by start day, in two flat arrays.
+
+    `spans` holds (start, end, number, type) per request. An employee's
+    requests never overlap, so starts and ends are both ordered and one
+    bisect finds any clash. `used` holds, per leave type, the running total
+    of days after each request (after a first row of zeros), so days used
+    in a window is the difference of two rows, trimmed at the window edges.
+    Two arrays per employee keep 100k employees to tens of MiB.
+    """
+    __slots__ = ('spans', 'used', 'width')
+
+    def __init__(self, width: int):
+        self.width = width  # Leave types; type t is column t - 1 of `used`
+        self.spans = array('I')
+        self.used = array('I', [0]) * width
+
+    @classmethod
+    def build(cls, width: int, rows: Iterable[Tuple[int, int, int, int]]) -> '_EmployeeLeave':
+        """From (start, end, number, type) rows already ordered by start"""
+        leave = cls(width)
+        totals = [0] * width
+        for start, end, number, leave_type in rows:
+            leave.spans.extend((start, end, number, leave_type))
+            totals[leave_type - 1] += end - start + 1
+            leave.used.extend(totals)
+        return leave
+
+    def _bisect(self, column: int, value: int, right: bool) -> int:
+        with memoryview(self.spans) as view, view[column::4] as values:
+            return bisect_right(values, value) if right else bisect_left(values, value)
+
+    def overlapping(self, start: int, end: int) -> Optional[int]:
+        """Request number of an interval clashing with start..end, if any"""
+        index = self._bisect(0, end, right=True)
+        if index and self.spans[4 * index - 3] >= start:
+            return self.spans[4 * index - 2]
+        return None
+
+    def insert(self, start: int, end: int, number: int, leave_type: int) -> None:
+        index = self._bisect(0, start, right=False)
+        width, column, days = self.width, leave_type - 1, end - start + 1
+        self.spans[4 * index:4 * index] = array('I', (start, end, number, leave_type))
+        row = self.used[width * index:width * (index + 1)]
+        row[column] += days
+        self.used[width * (index + 1):width * (index + 1)] = row
+        for later in range(index + 2, len(self) + 1):
+            self.used[width * later + column] += days
+
+    def remove(self, start: int, number: int) -> None:
+        index = self._bisect(0, start, right=False)
+        while self.spans[4 * index + 2] != number:  # Only equal starts can precede it
+            index += 1
+        width, column = self.width, self.spans[4 * index + 3] - 1
+        days = self.spans[4 * index + 1] - self.spans[4 * index] + 1
+        del self.spans[4 * index:4 * index + 4]
+        del self.used[width * (index + 1):width * (index + 2)]
+        for later in range(index + 1, len(self) + 1):
+            self.used[width * later + column] -= days
+
+    def days_used(self, leave_type: int, first: int, last: int) -> int:
+        """Days of `leave_type` falling within first..last (inclusive ordinals)"""
+        lo = self._bisect(1, first, right=False)
+        hi = self._bisect(0, last, right=True)
+        if lo >= hi:
+            return 0
+        spans, width, column = self.spans, self.width, leave_type - 1
+        total = self.used[width * hi + column] - self.used[width * lo + column]
+        if spans[4 * lo + 3] == leave_type and spans[4 * lo] < first:
+            total -= first - spans[4 * lo]
+        if spans[4 * hi - 1] == leave_type and spans[4 * hi - 3] > last:
+            total -= spans[4 * hi - 3] - last
+        return total
+
+    def numbers(self) -> array:
+        return self.spans[2::4]
+
+    def __len__(self) -> int:
+        return len(self.spans) // 4
+
+
+class _TeamLeave:
+    """Start and end days of a team's active requests, each sorted on its own.
+
+    Requests covering day D = (starts <= D) - (ends < D): two bisects
+    whatever the team size.
+    """
+    __slots__ = ('starts', 'ends')
+
+    def __init__(self, starts: Iterable[int] = (), ends: Iterable[int] = ()):
+        self.starts = array('I', sorted(starts))
+        self.ends = array('I', sorted(ends))
+
+    def add(self, start: int, end: int) -> None:
+        self.starts.insert(bisect_right(self.starts, start), start)
+        self.ends.insert(bisect_right(self.ends, end), end)
+
+    def remove(self, start: int, end: int) -> None:
+        del self.starts[bisect_left(self.starts, start)]
+        del self.ends[bisect_left(self.ends, end)]
+
+    def on_leave(self, day: int) -> int:
+        return bisect_right(self.starts, day) - bisect_left(self.ends, day)
+
+
+class LeaveCalendar:
+    """Leave requests with per-employee and per-team interval indexes.
+
+    Requests are numbered 1, 2, 3... (LV-000001) and stored as columns
+    indexed by number - 1: employee and team as codes into interned name
+    tables, start day ordinal, length, type (1..type_count), status and
+    creation time.
+    Active (pending or approved) requests are also indexed per employee
+    (_EmployeeLeave) and per team (_TeamLeave), so overlap, days used in a
+    year and how many of a team are off on a day are each a few bisects.
+    Pending request numbers are also kept per team, in order, as the
+    managers' approval inboxes.
+
+    Persisted like the report store: a binary snapshot of the columns plus
+    an append-only journal of new requests and status changes; the indexes
+    are rebuilt from the columns on start.
+    """
+
+    def __init__(self, data_dir: str = 'leave', type_count: int = 3):
+        os.makedirs(data_dir, exist_ok=True)
+        self.type_count = type_count  # Leave types are numbered 1..type_count
+        self._snapshot_path = os.path.join(data_dir, 'leave.snapshot')
+        self._journal_path = os.path.join(data_dir, 'leave.journal')
+        self._lock = threading.Lock()
+        self._compaction_lock = threading.Lock()
+        self._names: List[str] = []
+        self._name_codes: Dict[str, int] = {}
+        self._employee_codes = array('I')
+        self._team_codes = array('I')
+        self._starts = array('I')
+        self._days = array('H')
+        self._types = array('B')
+        self._statuses = array('B')
+        self._created = array('d')
+        self._employees: Dict[str, _EmployeeLeave] = {}
+        self._teams: Dict[str, _TeamLeave] = {}
+        self._pending: Dict[str, array] = {}
+        self._load()
+        self._journal = Journal(self._journal_path)
+
+    # --- Persistence ---
+
+    def _load(self) -> None:
+        if os.path.exists(self._snapshot_path):
+            with open(self._snapshot_path, 'rb') as f:
+                header = json.loads(f.readline())
+                for name in header['names']:
+                    self._code(name)
+                count = header['count']
+                for column in self._columns():
+                    column.fromfile(f, count)
+
+        sealed = self._journal_path + '.compacting'
+        replayed = 0
+        for segment in (sealed, self._journal_path):
+            for event in Journal.replay(segment):
+                self._apply(event)
+                replayed += 1
+        self._build_indexes()
+        if replayed:
+            self._write_snapshot(self._copy_columns())
+            for segment in (sealed, self._journal_path):
+                if os.path.exists(segment):
+                    os.remove(segment)
+        logger.info("Leave calendar ready (%d requests, %d replayed)", len(self._starts), replayed)
+
+    def _columns(self) -> Tuple[array, ...]:
+        return (self._employee_codes, self._team_codes, self._starts, self._days,
+                self._types, self._statuses, self._created)
+
+    def _apply(self, event: Dict) -> None:
+        """Replay one journal event into the columns (indexes are built afterwards)"""
+        if event['op'] == 'add':
+            if event['id'] != len(self._starts) + 1:
+                logger.warning("Leave journal out of sequence at request %s", event['id'])
+                return
+            self._append(event['k'], event['tm'], event['s'], event['n'], event['ty'], event['t'])
+        elif event['op'] == 'status' and 0 < event['id'] <= len(self._statuses):
+            self._statuses[event['id'] - 1] = STATUSES.index(event['st'])
+        elif event['op'] == 'decide':
+            for number, status in event['d']:
+                if 0 < number <= len(self._statuses):
+                    self._statuses[number - 1] = STATUSES.index(status)
+
+    def _append(self, employee: str, team: str, start: int, days: int, leave_type: int, created: float) -> int:
+        self._employee_codes.append(self._code(employee))
+        self._team_codes.append(self._code(team))
+        self._starts.append(start)
+        self._days.append(days)
+        self._types.append(leave_type)
+        self._statuses.append(0)
+        self._created.append(created)
+        return len(self._starts)
+
+    def _build_indexes(self) -> None:
+        """Group active requests per employee and per team and sort each group once"""
+        per_employee: Dict[int, List[int]] = defaultdict(list)
+        per_team: Dict[int, Tuple[List[int], List[int]]] = defaultdict(lambda: ([], []))
+        pending: Dict[int, array] = defaultdict(lambda: array('I'))
+        starts, days, types = self._starts, self._days, self._types
+        for index, status in enumerate(self._statuses):
+            if status not in _ACTIVE:
+                continue
+            per_employee[self._employee_codes[index]].append(index)
+            team = self._team_codes[index]
+            if self._names[team]:
+                if status == _PENDING:
+                    pending[team].append(index + 1)
+                team_starts, team_ends = per_team[team]
+                team_starts.append(starts[index])
+                team_ends.append(starts[index] + days[index] - 1)
+
+        self._employees = {}
+        for code, indexes in per_employee.items():
+            indexes.sort(key=starts.__getitem__)
+            self._employees[self._names[code]] = _EmployeeLeave.build(self.type_count, (
+                (starts[index], starts[index] + days[index] - 1, index + 1, types[index]) for index in indexes
+            ))
+        self._teams = {self._names[code]: _TeamLeave(team_starts, team_ends)
+                       for code, (team_starts, team_ends) in per_team.items()}
+        self._pending = {self._names[code]: numbers for code, numbers in pending.items()}
+
+    def _copy_columns(self) -> Dict:
+        """Cheap (memcpy) copy of the columns, taken under the lock"""
+        return {'names': list(self._names), 'columns': [column[:] for column in self._columns()]}
+
+    def _write_snapshot(self, copied: Dict) -> None:
+        """Atomically write a JSON header line followed by the raw columns"""
+        header = {'names': copied['names'], 'count': len(copied['columns'][0])}
+        tmp_path = self._snapshot_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(json.dumps(header, separators=(',', ':')).encode() + b'\n')
+            for column in copied['columns']:
+                column.tofile(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._snapshot_path)
+
+    def compact(self) -> bool:
+        """Fold the journal into a new snapshot; returns False if nothing changed"""
+        if not self._compaction_lock.acquire(blocking=False):
+            return False
+        try:
+            with self._lock:
+                sealed = self._journal.rotate()
+                if not sealed:
+                    return False
+                copied = self._copy_columns()
+            self._write_snapshot(copied)
+            os.remove(sealed)
+            return True
+        finally:
+            self._compaction_lock.release()
+
+    def close(self) -> None:
+        self.compact()
+        self._journal.close()
+
+    # --- Checks ---
+
+    def _code(self, name: str) -> int:
+        code = self._name_codes.get(name)
+        if code is None:
+            code = self._name_codes[name] = len(self._names)
+            self._names.append(name)
+        return code
+
+    @staticmethod
+    def _year_windows(start: int, end: int) -> Iterable[Tuple[int, int, int]]:
+        """(year, first, last) ordinals of each calendar year start..end touches"""
+        first_year, last_year = date.fromordinal(start).year, date.fromordinal(end).year
+        for year in range(first_year, last_year + 1):
+            yield year, date(year, 1, 1).toordinal(), date(year, 12, 31).toordinal()
+
+    def _check_locked(self, employee: str, leave_type: int, start: int, end: int, max_days: int) -> Dict:
+        if not 0 < leave_type <= self.type_count:
+            raise ValueError(f"Unknown leave type {leave_type}")
+        leave = self._employees.get(employee)
+        if leave is not None:
+            clash = leave.overlapping(start, end)
+            if clash is not None:
+                raise LeaveRejected('overlap', f"Overlaps {format_request_id(clash)}",
+                                    request_id=format_request_id(clash))
+        remaining = max_days
+        for year, first, last in self._year_windows(start, end):
+            used = leave.days_used(leave_type, first, last) if leave is not None else 0
+            wanted = min(end, last) - max(start, first) + 1
+            if used + wanted > max_days:
+                raise LeaveRejected('balance', f"Only {max_days - used} days left in {year}",
+                                    year=year, remaining=max_days - used)
+            remaining = min(remaining, max_days - used - wanted)
+        return {'remaining_after': remaining}
+
+    def _team_peak_locked(self, team: str, start: int, end: int) -> int:
+        leave = self._teams.get(team) if team else None
+        if leave is None:
+            return 0
+        return max(leave.on_leave(day) for day in range(start, end + 1))
+
+    def check(self, employee: str, team: str, leave_type: int, start: date, days: int, max_days: int) -> Dict:
+        """Validate a prospective request; raises LeaveRejected.
+
+        Returns the balance left after it and the most teammates off on any
+        of its days.
+        """
+        first = start.toordinal()
+        last = first + days - 1
+        with self._lock:
+            result = self._check_locked(employee, leave_type, first, last, max_days)
+            result['team_off'] = self._team_peak_locked(team, first, last)
+        return result
+
+    # --- Writes ---
+
+    def _book_locked(self, employee: str, team: str, leave_type: int, first: int, last: int,
+                     max_days: int, created: float) -> int:
+        self._check_locked(employee, leave_type, first, last, max_days)
+        number = self._append(employee, team, first, last - first + 1, leave_type, created)
+        leave = self._employees.get(employee)
+        if leave is None:
+            leave = self._employees[employee] = _EmployeeLeave(self.type_count)
+        leave.insert(first, last, number, leave_type)
+        if team:
+            team_leave = self._teams.get(team)
+            if team_leave is None:
+                team_leave = self._teams[team] = _TeamLeave()
+            team_leave.add(first, last)
+            pending = self._pending.get(team)
+            if pending is None:
+                pending = self._pending[team] = array('I')
+            pending.append(number)  # Numbers only grow, so the inbox stays ordered
+        return number
+
+    def submit(self, employee: str, team: str, leave_type: int, start: date, days: int, max_days: int) -> str:
+        """Re-check and record a request (status pending); returns its ID"""
+        first = start.toordinal()
+        last = first + days - 1
+        created = time.time()
+        with self._lock:
+            number = self._book_locked(employee, team, leave_type, first, last, max_days, created)
+            seq = self._journal.append({'op': 'add', 'id': number, 'k': employee, 'tm': team, 's': first,
+                                        'n': days, 'ty': leave_type, 't': created}, durable=False)
+            journal = self._journal
+        journal.wait_synced(seq)
+        return format_request_id(number)
+
+    def import_requests(self, rows: Iterable[Tuple[str, str, int, date, int, int]]) -> Tuple[int, int]:
+        """Bulk-book (employee, team, type, start, days, max_days) rows and snapshot once.
+
+        Rows failing the checks are skipped; returns (booked, rejected).
+        """
+        booked = rejected = 0
+        created = time.time()
+        with self._lock:
+            for employee, team, leave_type, start, days, max_days in rows:
+                first = start.toordinal()
+                try:
+                    self._book_locked(employee, team, leave_type, first, first + days - 1, max_days, created)
+                    booked += 1
+                except LeaveRejected:
+                    rejected += 1
+            sealed = self._journal.rotate()
+            copied = self._copy_columns()
+        self._write_snapshot(copied)
+        if sealed:
+            os.remove(sealed)
+        return booked, rejected
+
+    def set_status(self, request_id: str, status: str) -> Optional[Dict]:
+        """Move a request to `status`; cancelled/rejected ones free their days.
+
+        Returns the updated request, or None if the ID is unknown.
+        """
+        number = parse_request_id(request_id)
+        code = STATUSES.index(status)
+        with self._lock:
+            if number is None or not 0 < number <= len(self._starts):
+                return None
+            index = number - 1
+            previous = self._statuses[index]
+            if previous == code:
+                return self._record(index)
+            if code in _ACTIVE and previous not in _ACTIVE:
+                raise ValueError(f"{request_id} is {STATUSES[previous]} and cannot become {status}")
+            self._transition_locked(index, code)
+            seq = self._journal.append({'op': 'status', 'id': number, 'st': status}, durable=False)
+            journal = self._journal
+            record = self._record(index)
+        journal.wait_synced(seq)
+        return record
+
+    def decide(self, decisions: Iterable[Tuple[str, str]],
+               team: Optional[str] = None) -> Tuple[List[Dict], Dict[str, str]]:
+        """Approve or reject pending requests as one journal record.
+
+        `decisions` are (request_id, 'approved' | 'rejected') pairs; with
+        `team` given, only that team's requests may be decided. Everything
+        decided is written as one line and synced once, so a crash keeps all
+        of a batch or none of it. Returns the decided requests and
+        {request_id: reason} for the rest ('unknown', 'invalid_status',
+        'not_in_team', or the status the request already has).
+        """
+        decided: List[Dict] = []
+        skipped: Dict[str, str] = {}
+        changes: List[List] = []
+        with self._lock:
+            for request_id, status in decisions:
+                number = parse_request_id(request_id)
+                if number is None or not 0 < number <= len(self._starts):
+                    skipped[request_id] = 'unknown'
+                    continue
+                index = number - 1
+                if status not in DECISIONS:
+                    skipped[request_id] = 'invalid_status'
+                elif team is not None and self._names[self._team_codes[index]] != team:
+                    skipped[request_id] = 'not_in_team'
+                elif self._statuses[index] != _PENDING:
+                    skipped[request_id] = STATUSES[self._statuses[index]]
+                else:
+                    self._transition_locked(index, STATUSES.index(status))
+                    changes.append([number, status])
+                    decided.append(self._record(index))
+            if not changes:
+                return decided, skipped
+            seq = self._journal.append({'op': 'decide', 'd': changes}, durable=False)
+            journal = self._journal
+        journal.wait_synced(seq)
+        return decided, skipped
+
+    def _transition_locked(self, index: int, code: int) -> None:
+        """Set a request's status, taking it out of the indexes it no longer belongs in"""
+        previous = self._statuses[index]
+        team = self._names[self._team_codes[index]]
+        if previous == _PENDING and team:
+            pending = self._pending[team]
+            del pending[bisect_left(pending, index + 1)]
+        if previous in _ACTIVE and code not in _ACTIVE:
+            self._unindex(index)
+        self._statuses[index] = code
+
+    def _unindex(self, index: int) -> None:
+        start = self._starts[index]
+        end = start + self._days[index] - 1
+        employee = self._names[self._employee_codes[index]]
+        self._employees[employee].remove(start, index + 1)
+        team = self._names[self._team_codes[index]]
+        if team:
+            self._teams[team].remove(start, end)
+
+    # --- Queries ---
+
+    def _record(self, index: int) -> Dict:
+        start = date.fromordinal(self._starts[index])
+        return {
+            'id': format_request_id(index + 1),
+            'employee': self._names[self._employee_codes[index]],
+            'team': self._names[self._team_codes[index]],
+            'type': self._types[index],
+            'start_date': start.isoformat(),
+            'end_date': (start + timedelta(days=self._days[index] - 1)).isoformat(),
+            'days': self._days[index],
+            'status': STATUSES[self._statuses[index]],
+            'created': self._created[index]
+        }
+
+    def get(self, request_id: str) -> Optional[Dict]:
+        number = parse_request_id(request_id)
+        with self._lock:
+            if number is None or not 0 < number <= len(self._starts):
+                return None
+            return self._record(number - 1)
+
+    def active_requests(self, employee: str) -> List[Dict]:
+        """The employee's pending and approved requests, by start date"""
+        with self._lock:
+            leave = self._employees.get(employee)
+            return [self._record(number - 1) for number in leave.numbers()] if leave else []
+
+    def days_used(self, employee: str, leave_type: int, year: int) -> int:
+        with self._lock:
+            leave = self._employees.get(employee)
+            if leave is None:
+                return 0
+            return leave.days_used(leave_type, date(year, 1, 1).toordinal(), date(year, 12, 31).toordinal())
+
+    def pending_for(self, team: str, offset: int = 0, limit: int = 10) -> Tuple[int, List[Dict]]:
+        """The team's pending request count and one page of them, oldest first"""
+        with self._lock:
+            pending = self._pending.get(team)
+            if not pending:
+                return 0, []
+            return len(pending), [self._record(number - 1) for number in pending[offset:offset + limit]]
+
+    def team_peak(self, team: str, start: date, days: int) -> int:
+        """Most of `team` on leave on any one day of the given span"""
+        first = start.toordinal()
+        with self._lock:
+            return self._team_peak_locked(team, first, first + days - 1)
+
+    def on_leave(self, team: str, day: date) -> int:
+        """How many of `team` have an active request covering `day`"""
+        with self._lock:
+            leave = self._teams.get(team)
+            return leave.on_leave(day.toordinal()) if leave else 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'requests': len(self._starts),
+                'employees_with_leave': len(self._employees),
+                'teams': len(self._teams),
+                'pending': sum(len(pending) for pending in self._pending.values())
+            }
@@ -0,0 +1,129 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import threading
+from typing import Dict, Optional
+from config import Config
+
+# Log destinations: logger name -> (file, rotation). Audit trails rotate at
+# midnight and are kept for LOG_AUDIT_RETENTION_DAYS; operational logs rotate
+# by size.
+DESTINATIONS = {
+    'ussd_gateway': ('ussd_gateway.log', 'size'),
+    'sms_service': ('sms_service.log', 'size'),
+    'clock_utils': ('clock_utils.log', 'size'),
+    'clock_system_audit': ('clock_system_audit.log', 'time'),
+    'attendance_reports': ('attendance_reports.log', 'time'),
+    'leave_requests': ('leave_requests.log', 'time'),
+    'performance_reviews': ('performance_reviews.log', 'time'),
+    'document_audit': ('document_audit.log', 'time'),
+    'payroll': ('payroll.log', 'time'),
+    'ussd_capture': (Config.USSD_CAPTURE_FILE, 'time'),
+}
+
+# Destinations whose records are dicts written as one JSON object per line
+# and kept off the console
+JSON_DESTINATIONS = {'ussd_capture'}
+
+LOG_FORMAT = '%(asctime)s [%(levelname)s] %(message)s'
+
+_loggers: Dict[str, logging.Logger] = {}
+_listeners: Dict[str, logging.handlers.QueueListener] = {}
+_lock = threading.Lock()
+_console = logging.StreamHandler()
+_console.setFormatter(logging.Formatter(LOG_FORMAT))
+_exception_formatter = logging.Formatter()
+
+
+class _LazyQueueHandler(logging.handlers.QueueHandler):
+    """Hands the record to the listener with only its message resolved.
+
+    The stdlib QueueHandler formats the whole line in the calling thread.
+    Here the caller only merges the %-style arguments into the message and
+    renders any traceback to text, so later changes to a mutable argument
+    cannot reach the log and queued records do not keep frames alive; the
+    timestamp and line layout are left to the listener thread.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.args:
+            record.msg = record.getMessage()
+            record.args = None
+        if record.exc_info:
+            record.exc_text = _exception_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class _JsonLineFormatter(logging.Formatter):
+    """Writes the record's message dict as compact JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        return json.dumps(record.msg, separators=(',', ':'), ensure_ascii=False)
+
+
+def _file_handler(filename: str, rotation: str, formatter: logging.Formatter) -> logging.Handler:
+    if rotation == 'time':
+        handler = logging.handlers.TimedRotatingFileHandler(
+            filename, when='midnight', backupCount=Config.LOG_AUDIT_RETENTION_DAYS
+        )
+    else:
+        handler = logging.handlers.RotatingFileHandler(
+            filename, maxBytes=Config.LOG_MAX_BYTES, backupCount=Config.LOG_BACKUP_COUNT
+        )
+    handler.setFormatter(formatter)
+    return handler
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Logger for one destination, writing through its own queue and listener thread"""
+    logger = _loggers.get(name)
+    if logger is not None:
+        return logger
+    with _lock:
+        if name in _loggers:
+            return _loggers[name]
+        filename, rotation = DESTINATIONS[name]
+        records: "queue.SimpleQueue" = queue.SimpleQueue()
+        if name in JSON_DESTINATIONS:
+            handlers = [_file_handler(filename, rotation, _JsonLineFormatter())]
+        else:
+            handlers = [_file_handler(filename, rotation, logging.Formatter(LOG_FORMAT)), _console]
+        listener = logging.handlers.QueueListener(records, *handlers, respect_handler_level=True)
+        listener.start()
+        logger = logging.getLogger(f"elevatehr.{name}")
+        logger.setLevel(Config.LOG_LEVEL)
+        logger.addHandler(_LazyQueueHandler(records))
+        logger.propagate = False
+        _listeners[name] = listener
+        _loggers[name] = logger
+        return logger
+
+
+def capture_logger() -> Optional[logging.Logger]:
+    """The hop capture logger when USSD_CAPTURE is on, else None"""
+    return get_logger('ussd_capture') if Config.USSD_CAPTURE else None
+
+
+def should_sample(rate: Optional[float] = None) -> bool:
+    """Decide whether to log one per-request interaction record"""
+    rate = Config.USSD_LOG_SAMPLE_RATE if rate is None else rate
+    return rate >= 1.0 or (rate > 0.0 and random.random() < rate)
+
+
+def set_logging_enabled(enabled: bool) -> None:
+    """Switch every destination on or off (used by benchmarks)"""
+    for logger in _loggers.values():
+        logger.disabled = not enabled
+
+
+@atexit.register
+def shutdown_logging() -> None:
+    """Flush queued records to disk and stop the listener threads"""
+    with _lock:
+        for listener in _listeners.values():
+            listener.stop()
+        _listeners.clear()
@@ -0,0 +1,148 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Bucket upper bounds in seconds. Africa's Talking drops a session that takes
+# more than a few seconds to answer, so resolution is concentrated below 1s.
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# For in-memory steps (rate limiter, session store, enqueue) that take microseconds
+FAST_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05, 0.25)
+
+
+class Histogram:
+    """Fixed-bucket latency histogram, optionally split by one label.
+
+    Each label value owns a list of per-bucket counts (the last slot is
+    +Inf) and a running sum, so an observation is one bisect and two
+    increments under a lock. Rendering produces the cumulative
+    Prometheus form.
+    """
+
+    def __init__(self, name: str, help_text: str, label: Optional[str] = None,
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self._bounds = tuple(sorted(buckets))
+        self._counts: Dict[str, List[int]] = {}
+        self._sums: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float, label_value: str = '') -> None:
+        index = bisect_left(self._bounds, seconds)
+        with self._lock:
+            counts = self._counts.get(label_value)
+            if counts is None:
+                counts = self._counts[label_value] = [0] * (len(self._bounds) + 1)
+                self._sums[label_value] = 0.0
+            counts[index] += 1
+            self._sums[label_value] += seconds
+
+    @contextmanager
+    def time(self, label_value: str = '') -> Iterator[None]:
+        """Observe the wall time of the `with` body"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, label_value)
+
+    def quantile(self, q: float, label_value: str = '') -> Optional[float]:
+        """Estimate a quantile by interpolating inside its bucket (as histogram_quantile does)"""
+        with self._lock:
+            counts = list(self._counts.get(label_value, ()))
+        total = sum(counts)
+        if not total:
+            return None
+        rank = q * total
+        seen = 0
+        for index, count in enumerate(counts):
+            if seen + count >= rank and count:
+                if index == len(self._bounds):
+                    return self._bounds[-1]
+                lower = self._bounds[index - 1] if index else 0.0
+                return lower + (self._bounds[index] - lower) * (rank - seen) / count
+            seen += count
+        return self._bounds[-1]
+
+    def summary(self) -> Dict[str, Dict]:
+        """Count, p50, p95 and p99 per label value, in milliseconds"""
+        with self._lock:
+            values = [(value, sum(counts)) for value, counts in self._counts.items()]
+        return {
+            value or 'all': {
+                'count': count,
+                **{f"p{int(q * 100)}_ms": round(self.quantile(q, value) * 1000, 2) for q in (0.5, 0.95, 0.99)}
+            }
+            for value, count in values
+        }
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = [(value, list(counts), self._sums[value]) for value, counts in sorted(self._counts.items())]
+        for value, counts, total in series:
+            label = f'{self.label}="{_escape(value)}",' if self.label else ''
+            cumulative = 0
+            for bound, count in zip(self._bounds, counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{label}le="{bound}"}} {cumulative}')
+            cumulative += counts[-1]
+            lines.append(f'{self.name}_bucket{{{label}le="+Inf"}} {cumulative}')
+            selector = f"{{{label.rstrip(',')}}}" if label else ''
+            lines.append(f"{self.name}_sum{selector} {total:.6f}")
+            lines.append(f"{self.name}_count{selector} {cumulative}")
+        return lines
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+# --- Registry ---
+_registry: Dict[str, Histogram] = {}
+_registry_lock = threading.Lock()
+
+
+def histogram(name: str, help_text: str, label: Optional[str] = None,
+              buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+    """Return the histogram registered under `name`, creating it on first use"""
+    with _registry_lock:
+        existing = _registry.get(name)
+        if existing is None:
+            existing = _registry[name] = Histogram(name, help_text, label, buckets)
+        return existing
+
+
+def render_metrics() -> str:
+    """Every registered histogram in Prometheus text exposition format"""
+    with _registry_lock:
+        metrics = list(_registry.values())
+    lines: List[str] = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def latency_summary() -> Dict[str, Dict]:
+    """Per-label p50/p95/p99 for every registered histogram (for /health)"""
+    with _registry_lock:
+        metrics = list(_registry.values())
+    return {metric.name: metric.summary() for metric in metrics}
+
+
+# --- Shared instruments ---
+USSD_REQUEST_SECONDS = histogram(
+    'ussd_request_seconds', 'Time to answer one USSD hop, by the menu stage it arrived on', label='stage')
+USSD_HANDLER_SECONDS = histogram(
+    'ussd_handler_seconds', 'Time spent inside a menu action handler', label='handler')
+SESSION_STORE_SECONDS = histogram(
+    'session_store_seconds', 'Session backend latency', label='operation', buckets=FAST_BUCKETS)
+RATE_LIMITER_SECONDS = histogram(
+    'rate_limiter_seconds', 'Rate limiter check latency', buckets=FAST_BUCKETS)
+SMS_ENQUEUE_SECONDS = histogram(
+    'sms_enqueue_seconds', 'Time for a handler to hand an SMS to the dispatch queue', buckets=FAST_BUCKETS)
+SMS_SEND_SECONDS = histogram(
+    'sms_send_seconds', 'Provider call latency per SMS batch (including sandbox sends)')
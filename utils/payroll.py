@@ -0,0 +1,353 @@
+import argparse
+import csv
+import hashlib
+import multiprocessing
+import os
+import re
+import sqlite3
+import threading
+import time
+from array import array
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from functools import partial
+from itertools import repeat
+from operator import add, mul, sub
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+from config import Config
+from utils.document_store import DocumentStore
+from utils.employee_directory import directory, normalize_phone
+from utils.logging_setup import get_logger
+from utils.payslips import PayslipRow, init_worker, render_chunk
+from utils.sms_queue import sms_queue
+from utils.sms_utils import SMSService
+
+logger = get_logger('payroll')
+
+# Statutory rates (monthly, KES); review after each Finance Act. Changing
+# them changes every employee's fingerprint, so the next run regenerates all.
+RATES = {
+    'NSSF_RATE': 0.06,
+    'NSSF_CAP': 72000.0,  # Pensionable pay ceiling (Tier I + II)
+    'SHIF_RATE': 0.0275,
+    'SHIF_MIN': 300.0,
+    'HOUSING_RATE': 0.015,
+    'PAYE_BANDS': ((24000.0, 0.10), (8333.0, 0.25), (467667.0, 0.30), (300000.0, 0.325), (float('inf'), 0.35)),
+    'PERSONAL_RELIEF': 2400.0,
+}
+
+# Input columns (CSV header names) besides emp_id and the optional phone
+AMOUNT_COLUMNS = ('basic', 'allowances', 'overtime_hours', 'overtime_rate', 'other_deductions')
+_PERIOD = re.compile(r'\d{4}-(0[1-9]|1[0-2])')
+
+
+# --- Arithmetic ---
+
+def _scale(column: array, factor: float) -> array:
+    return array('d', map(mul, column, repeat(factor)))
+
+
+def _sum(*columns: array) -> array:
+    total = columns[0]
+    for column in columns[1:]:
+        total = array('d', map(add, total, column))
+    return total
+
+
+def _clip(column: array, low: float, high: float) -> array:
+    return array('d', map(min, map(max, column, repeat(low)), repeat(high)))
+
+
+def compute_pay(amounts: Dict[str, array]) -> Dict[str, array]:
+    """Gross, statutory deductions, PAYE and net pay for whole columns at once.
+
+    Every figure is one pass of a builtin over the columns, band by band for
+    PAYE, rather than a Python loop per employee.
+    """
+    gross = _sum(amounts['basic'], amounts['allowances'],
+                 array('d', map(mul, amounts['overtime_hours'], amounts['overtime_rate'])))
+    nssf = _scale(_clip(gross, 0.0, RATES['NSSF_CAP']), RATES['NSSF_RATE'])
+    shif = array('d', map(max, _scale(gross, RATES['SHIF_RATE']), repeat(RATES['SHIF_MIN'])))
+    housing = _scale(gross, RATES['HOUSING_RATE'])
+    # SHIF, NSSF and the housing levy are deducted before PAYE
+    taxable = array('d', map(sub, gross, _sum(nssf, shif, housing)))
+    tax = array('d', bytes(8 * len(gross)))
+    lower = 0.0
+    for width, rate in RATES['PAYE_BANDS']:
+        in_band = _clip(array('d', map(sub, taxable, repeat(lower))), 0.0, width)
+        tax = _sum(tax, _scale(in_band, rate))
+        lower += width
+    paye = _clip(array('d', map(sub, tax, repeat(RATES['PERSONAL_RELIEF']))), 0.0, float('inf'))
+    deductions = _sum(nssf, shif, housing, paye, amounts['other_deductions'])
+    net = array('d', map(sub, gross, deductions))
+    figures = {'gross': gross, 'nssf': nssf, 'shif': shif, 'housing': housing, 'paye': paye,
+               'deductions': deductions, 'net': net}
+    return {name: array('d', map(round, column, repeat(2))) for name, column in figures.items()}
+
+
+# --- Input ---
+
+class PayrollInput(NamedTuple):
+    emp_ids: List[str]
+    names: List[str]
+    phones: List[str]
+    amounts: Dict[str, array]  # AMOUNT_COLUMNS, aligned with emp_ids
+    fingerprints: List[str]
+    invalid: int
+
+
+def load_payroll(path: str) -> PayrollInput:
+    """Read a payroll CSV (emp_id, basic[, allowances, overtime_hours,
+    overtime_rate, other_deductions, phone]) into columns.
+
+    Phones default to the directory's. Rows with an unknown phone or a
+    non-numeric amount are skipped and counted.
+    """
+    emp_ids, names, phones, fingerprints = [], [], [], []
+    amounts = {column: array('d') for column in AMOUNT_COLUMNS}
+    invalid = 0
+    rates = hashlib.blake2b(repr(sorted(RATES.items())).encode(), digest_size=8)
+    with open(path, newline='', encoding='utf-8') as f:
+        for line, row in enumerate(csv.DictReader(f), 2):
+            emp_id = (row.get('emp_id') or '').strip().upper()
+            employee = directory.get(emp_id) if emp_id else None
+            phone = normalize_phone(row.get('phone') or (employee.phone if employee else None))
+            try:
+                values = [float(row.get(column) or 0) for column in AMOUNT_COLUMNS]
+            except ValueError:
+                values = None
+            if not phone or values is None:
+                invalid += 1
+                if invalid <= 10:
+                    logger.warning("Payroll row %d (%s) skipped: %s", line, emp_id or '?',
+                                   "no phone" if values is not None else "invalid amount")
+                continue
+            name = employee.name if employee else emp_id
+            fingerprint = rates.copy()
+            fingerprint.update('\x1f'.join([emp_id, name, phone, *map(repr, values)]).encode())
+            emp_ids.append(emp_id)
+            names.append(name)
+            phones.append(phone)
+            fingerprints.append(fingerprint.hexdigest())
+            for column, value in zip(AMOUNT_COLUMNS, values):
+                amounts[column].append(value)
+    return PayrollInput(emp_ids, names, phones, amounts, fingerprints, invalid)
+
+
+# --- Pipeline ---
+
+class PayrollPipeline:
+    """Payslips and payment summaries for a whole payroll file.
+
+    A run computes pay for every changed employee in column batches, renders
+    the payslips in a process pool (one worker per core) straight into the
+    document store, indexes each finished chunk in one transaction, records
+    it in a manifest and queues the payment summary SMS in bulk. A summary
+    is marked sent when the provider accepts it, not when it is queued.
+
+    The manifest (SQLite) keeps, per period and employee, a fingerprint of
+    the inputs and whether the SMS went out. Re-running the same file
+    regenerates only employees whose inputs (or the statutory rates)
+    changed, and a run that was interrupted carries on where it stopped:
+    finished chunks are skipped and unsent summaries are sent.
+    """
+
+    def __init__(self, store: DocumentStore, data_dir: str = Config.PAYROLL_DATA_DIR,
+                 workers: int = Config.PAYROLL_WORKERS, chunk_size: int = 500):
+        os.makedirs(data_dir, exist_ok=True)
+        self.store = store
+        self.db_path = os.path.join(data_dir, 'manifest.db')
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self._local = threading.local()
+        self._run_lock = threading.Lock()
+        self._in_flight = set()  # (period, emp_id, fingerprint) summaries queued, not yet delivered
+        self._in_flight_lock = threading.Lock()
+        self.last_run: Dict = {}
+        self._init_schema()
+
+    # --- Manifest ---
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _init_schema(self) -> None:
+        conn = self._conn()
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS payslips ('
+            'period TEXT NOT NULL, emp_id TEXT NOT NULL, phone TEXT NOT NULL, fingerprint TEXT NOT NULL, '
+            'gross REAL NOT NULL, deductions REAL NOT NULL, net REAL NOT NULL, notified INTEGER NOT NULL, '
+            'PRIMARY KEY (period, emp_id)) WITHOUT ROWID'
+        )
+        conn.execute('CREATE INDEX IF NOT EXISTS payslips_employee ON payslips (emp_id, period)')
+
+    def _transaction(self, sql: str, rows: Iterable[Tuple]) -> None:
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.executemany(sql, rows)
+            conn.execute('COMMIT')
+        except sqlite3.Error:
+            conn.execute('ROLLBACK')
+            raise
+
+    def latest_summary(self, emp_id: str) -> Optional[Dict]:
+        """The employee's most recent payment summary, or None"""
+        row = self._conn().execute(
+            'SELECT period, gross, deductions, net FROM payslips WHERE emp_id = ? ORDER BY period DESC LIMIT 1',
+            (emp_id.strip().upper(),)
+        ).fetchone()
+        return dict(zip(('period', 'gross', 'deductions', 'net'), row)) if row else None
+
+    @staticmethod
+    def summary_message(period: str, gross: float, deductions: float, net: float) -> str:
+        return SMSService.render_template("payment_summary", {
+            "period": period, "gross": f"{gross:,.2f}", "deductions": f"{deductions:,.2f}", "net": f"{net:,.2f}"
+        })
+
+    # --- Runs ---
+
+    def _delivered(self, period: str, emp_id: str, fingerprint: str, phone: str, result: Dict) -> None:
+        """SMS queue callback: mark the summary sent once the provider accepts it"""
+        with self._in_flight_lock:
+            self._in_flight.discard((period, emp_id, fingerprint))
+        if result.get('status') == 'error':
+            logger.warning("Payment summary %s for %s (%s) not delivered: %s",
+                           period, emp_id, phone, result.get('message'))
+            return
+        # A summary for inputs since corrected must not mark the new one sent
+        self._conn().execute('UPDATE payslips SET notified = 1 WHERE period = ? AND emp_id = ? AND fingerprint = ?',
+                             (period, emp_id, fingerprint))
+
+    def _notify(self, period: str, summaries: List[Tuple[str, str, str, float, float, float]]) -> int:
+        """Queue (emp_id, phone, fingerprint, gross, deductions, net) summaries; returns how many were queued"""
+        if not summaries:
+            return 0
+        keys = [(period, summary[0], summary[2]) for summary in summaries]
+        with self._in_flight_lock:
+            self._in_flight.update(keys)
+        queued = sms_queue.enqueue_bulk(
+            (phone, self.summary_message(period, gross, deductions, net),
+             partial(self._delivered, period, emp_id, fingerprint))
+            for emp_id, phone, fingerprint, gross, deductions, net in summaries
+        )
+        if queued < len(summaries):
+            with self._in_flight_lock:
+                self._in_flight.difference_update(keys[queued:])
+        return queued
+
+    def _finish_chunk(self, period: str, rows: List[PayslipRow], documents: List, notify: bool) -> int:
+        self.store.index(documents)
+        self._transaction(
+            'INSERT OR REPLACE INTO payslips (period, emp_id, phone, fingerprint, gross, deductions, net, notified) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, 0)',
+            ((period, row[0], row[2], row[-1], row[8], row[13], row[14]) for row in rows)
+        )
+        if not notify:
+            return 0
+        return self._notify(period, [(row[0], row[2], row[-1], row[8], row[13], row[14]) for row in rows])
+
+    def run(self, path: str, period: str, notify: bool = True) -> Dict:
+        """Generate `period` (YYYY-MM) payslips from the payroll file at `path`; returns run counts"""
+        if not _PERIOD.fullmatch(period):
+            raise ValueError(f"Payroll period must be YYYY-MM, got {period!r}")
+        with self._run_lock:
+            started = time.perf_counter()
+            payroll = load_payroll(path)
+            known = {emp_id: (fingerprint, notified) for emp_id, fingerprint, notified in self._conn().execute(
+                'SELECT emp_id, fingerprint, notified FROM payslips WHERE period = ?', (period,))}
+            changed = [index for index, (emp_id, fingerprint) in enumerate(zip(payroll.emp_ids, payroll.fingerprints))
+                       if known.get(emp_id, (None,))[0] != fingerprint]
+            counts = {'period': period, 'employees': len(payroll.emp_ids), 'invalid': payroll.invalid,
+                      'generated': 0, 'unchanged': len(payroll.emp_ids) - len(changed), 'notified': 0}
+
+            if notify:
+                # Summaries from an interrupted run that were recorded but never
+                # delivered, less any still queued from an earlier run
+                unsent = {emp_id for emp_id, fingerprint in zip(payroll.emp_ids, payroll.fingerprints)
+                          if known.get(emp_id) == (fingerprint, 0)}
+                if unsent:
+                    rows = self._conn().execute(
+                        'SELECT emp_id, phone, fingerprint, gross, deductions, net FROM payslips '
+                        'WHERE period = ? AND notified = 0', (period,)).fetchall()
+                    with self._in_flight_lock:
+                        rows = [row for row in rows
+                                if row[0] in unsent and (period, row[0], row[2]) not in self._in_flight]
+                    counts['notified'] += self._notify(period, rows)
+
+            amounts = {column: array('d', map(values.__getitem__, changed)) for column, values in payroll.amounts.items()}
+            figures = compute_pay(amounts)
+            rows = list(zip(
+                map(payroll.emp_ids.__getitem__, changed), map(payroll.names.__getitem__, changed),
+                map(payroll.phones.__getitem__, changed), *(amounts[column] for column in AMOUNT_COLUMNS),
+                *(figures[name] for name in ('gross', 'nssf', 'shif', 'housing', 'paye', 'deductions', 'net')),
+                map(payroll.fingerprints.__getitem__, changed)
+            ))
+            chunks = [rows[start:start + self.chunk_size] for start in range(0, len(rows), self.chunk_size)]
+            created = time.time()
+
+            if self.workers == 1:
+                for chunk in chunks:
+                    documents = render_chunk(period, created, [row[:-1] for row in chunk], self.store)
+                    counts['notified'] += self._finish_chunk(period, chunk, documents, notify)
+                    counts['generated'] += len(chunk)
+            elif chunks:
+                layout = self.store.layout
+                with ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'),
+                                         initializer=init_worker, initargs=(self.store.root, layout)) as pool:
+                    waiting = iter(chunks)
+                    running = {}
+                    while True:
+                        # Keep two chunks per worker in flight so results stream back as they finish
+                        for chunk in waiting:
+                            running[pool.submit(render_chunk, period, created, [row[:-1] for row in chunk])] = chunk
+                            if len(running) >= 2 * self.workers:
+                                break
+                        if not running:
+                            break
+                        done, _ = wait(running, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            chunk = running.pop(future)
+                            counts['notified'] += self._finish_chunk(period, chunk, future.result(), notify)
+                            counts['generated'] += len(chunk)
+
+            counts['seconds'] = round(time.perf_counter() - started, 2)
+            self.last_run = counts
+            logger.info("Payroll %s: %d payslips generated, %d unchanged, %d invalid rows, %d SMS queued in %.2fs",
+                        period, counts['generated'], counts['unchanged'], counts['invalid'], counts['notified'],
+                        counts['seconds'])
+            return counts
+
+    def delivered(self, period: str) -> int:
+        """How many of the period's payment summaries have been delivered"""
+        return self._conn().execute('SELECT COUNT(*) FROM payslips WHERE period = ? AND notified = 1',
+                                    (period,)).fetchone()[0]
+
+    def stats(self) -> Dict:
+        payslips, periods = self._conn().execute('SELECT COUNT(*), COUNT(DISTINCT period) FROM payslips').fetchone()
+        return {'payslips': payslips, 'periods': periods, 'workers': self.workers, 'last_run': self.last_run}
+
+
+def main() -> None:
+    """python -m utils.payroll payroll.csv 2025-06 [--no-sms]"""
+    parser = argparse.ArgumentParser(description="Generate payslips and payment summaries for a period")
+    parser.add_argument('path', help="Payroll CSV")
+    parser.add_argument('period', help="YYYY-MM")
+    parser.add_argument('--no-sms', action='store_true', help="Do not queue payment summary SMS")
+    args = parser.parse_args()
+    from handlers.payroll_handler import payroll  # The configured document store and manifest
+    counts = payroll.run(args.path, args.period, notify=not args.no_sms)
+    # Summaries only count as sent once delivered; wait for all of them
+    sms_queue.drain()
+    counts['delivered'] = payroll.delivered(args.period)
+    print(counts)
+
+
+if __name__ == '__main__':
+    main()
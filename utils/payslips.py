@@ -0,0 +1,77 @@
+"""Payslip rendering, run in payroll worker processes.
+
+Kept apart from the pipeline so spawned workers import only this, the
+document store and config, not the SMS queue or the menus.
+"""
+from typing import Dict, List, Optional, Sequence, Tuple
+from utils.document_store import DocumentStore, StoredDocument
+
+# (emp_id, name, phone, basic, allowances, overtime_hours, overtime_rate, other_deductions,
+#  gross, nssf, shif, housing, paye, deductions, net)
+PayslipRow = Tuple
+
+_worker_store: Optional[DocumentStore] = None
+
+
+def _pdf_text(line: str) -> str:
+    return line.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def render_pdf(lines: Sequence[str]) -> bytes:
+    """A one-page A4 PDF of plain text lines in Helvetica"""
+    stream = ("BT /F1 11 Tf 56 790 Td 16 TL " +
+              " ".join(f"({_pdf_text(line)}) '" for line in lines) + " ET").encode('latin-1', 'replace')
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+        b"/Resources << /Font << /F1 4 0 R >> >> /Contents 5 0 R >>",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+        b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream),
+    ]
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def payslip_lines(period: str, row: PayslipRow) -> List[str]:
+    (emp_id, name, _, basic, allowances, hours, rate, other,
+     gross, nssf, shif, housing, paye, deductions, net) = row
+    return [
+        f"ElevateHR Payslip - {period}",
+        f"Employee: {name} ({emp_id})",
+        "",
+        f"Basic pay: KES {basic:,.2f}",
+        f"Allowances: KES {allowances:,.2f}",
+        f"Overtime ({hours:g} h at {rate:,.2f}): KES {hours * rate:,.2f}",
+        f"Gross pay: KES {gross:,.2f}",
+        "",
+        f"NSSF: KES {nssf:,.2f}",
+        f"SHIF: KES {shif:,.2f}",
+        f"Housing levy: KES {housing:,.2f}",
+        f"PAYE (after relief): KES {paye:,.2f}",
+        f"Other deductions: KES {other:,.2f}",
+        f"Total deductions: KES {deductions:,.2f}",
+        "",
+        f"Net pay: KES {net:,.2f}",
+    ]
+
+
+def init_worker(root: str, layout: Dict[str, Tuple[str, int]]) -> None:
+    global _worker_store
+    _worker_store = DocumentStore(root, layout)
+
+
+def render_chunk(period: str, created: float, rows: List[PayslipRow],
+                 store: Optional[DocumentStore] = None) -> List[StoredDocument]:
+    """Render and write one chunk of payslips; the caller indexes them"""
+    store = store or _worker_store
+    return [store.write('payslip', row[2], f"{period}.pdf", render_pdf(payslip_lines(period, row)), created)
+            for row in rows]
@@ -0,0 +1,212 @@
+import atexit
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Iterator, Optional, Tuple
+from config import Config
+from utils.logging_setup import get_logger
+
+logger = get_logger('performance_reviews')
+
+
+def default_record() -> Dict:
+    """What an employee without a stored record sees; never written unless changed"""
+    return {
+        "last_review": "Not reviewed",
+        "rating": "N/A",
+        "current_goals": [{"id": 0, "text": "No current goals", "progress": 0, "due": "N/A"}],
+        "completed_training": [{"course": "No training", "date": "N/A", "score": "N/A"}],
+        "feedback_requests": []
+    }
+
+
+class PerformanceStore:
+    """Performance records in SQLite, resident in memory on demand.
+
+    Each phone's record is one compact JSON row in a table keyed (and so
+    indexed) by phone; the numeric rating is also kept in its own column so
+    rankings can be built without decoding records. Nothing is read at
+    startup: get() loads a record on first use into an LRU of at most
+    `max_resident` records, and phones without a row get a synthesized
+    default that is not stored.
+
+    update() changes the resident record and marks it dirty; a writer
+    thread flushes every dirty record in one transaction each
+    `flush_interval` seconds (sooner once `flush_batch` are waiting). Dirty
+    records stay reachable until committed even if the LRU evicts them.
+    """
+
+    def __init__(self, db_path: str = Config.PERF_DB_PATH, max_resident: int = Config.PERF_RESIDENT_MAX,
+                 flush_interval: float = Config.PERF_FLUSH_INTERVAL_MS / 1000, flush_batch: int = 500):
+        self.db_path = db_path
+        self.max_resident = max_resident
+        self.flush_interval = flush_interval
+        self.flush_batch = flush_batch
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._resident: "OrderedDict[str, Dict]" = OrderedDict()
+        self._dirty: Dict[str, Dict] = {}
+        self._flushing: Dict[str, Dict] = {}  # Taken from _dirty, not yet committed
+        self._counters = {'hits': 0, 'loads': 0, 'defaults': 0, 'evictions': 0, 'flushes': 0, 'written': 0}
+        self._wake = threading.Event()
+        self._closed = False
+        self._init_schema()
+        self._writer = threading.Thread(target=self._write_loop, name='perf-writer', daemon=True)
+        self._writer.start()
+
+    # --- Storage ---
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _init_schema(self) -> None:
+        self._conn().execute(
+            'CREATE TABLE IF NOT EXISTS performance ('
+            'phone TEXT PRIMARY KEY, rating REAL, data TEXT NOT NULL) WITHOUT ROWID'
+        )
+
+    @staticmethod
+    def _row(phone: str, record: Dict) -> Tuple[str, Optional[float], str]:
+        rating = record.get('rating')
+        return (phone, float(rating) if isinstance(rating, (int, float)) else None,
+                json.dumps(record, separators=(',', ':')))
+
+    def seed(self, phone: str, record: Dict) -> None:
+        """Store `record` unless the phone already has one"""
+        self._conn().execute('INSERT OR IGNORE INTO performance (phone, rating, data) VALUES (?, ?, ?)',
+                             self._row(phone, record))
+
+    # --- Reads ---
+
+    def _lookup_locked(self, phone: str) -> Optional[Dict]:
+        record = self._resident.get(phone)
+        if record is not None:
+            self._resident.move_to_end(phone)
+            self._counters['hits'] += 1
+            return record
+        record = self._dirty.get(phone) or self._flushing.get(phone)
+        if record is not None:
+            self._admit_locked(phone, record)
+        return record
+
+    def _admit_locked(self, phone: str, record: Dict) -> None:
+        self._resident[phone] = record
+        while len(self._resident) > self.max_resident:
+            self._resident.popitem(last=False)
+            self._counters['evictions'] += 1
+
+    def _load(self, phone: str) -> Optional[Dict]:
+        row = self._conn().execute('SELECT data FROM performance WHERE phone = ?', (phone,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get(self, phone: str) -> Dict:
+        """The phone's record, or a default one; treat it as read-only (use update())"""
+        with self._lock:
+            record = self._lookup_locked(phone)
+        if record is not None:
+            return record
+        loaded = self._load(phone)
+        with self._lock:
+            record = self._lookup_locked(phone)  # An update may have won the race
+            if record is not None:
+                return record
+            if loaded is None:
+                self._counters['defaults'] += 1
+                return default_record()
+            self._counters['loads'] += 1
+            self._admit_locked(phone, loaded)
+            return loaded
+
+    def ratings(self) -> Iterator[Tuple[str, float]]:
+        """(phone, rating) of every rated record, flushed or not, without decoding records"""
+        with self._lock:
+            pending = {phone: self._row(phone, record)[1] for phone, record in self._dirty.items()}
+        for phone, rating in self._conn().execute('SELECT phone, rating FROM performance WHERE rating IS NOT NULL'):
+            if phone not in pending:
+                yield phone, rating
+        for phone, rating in pending.items():
+            if rating is not None:
+                yield phone, rating
+
+    # --- Writes ---
+
+    def update(self, phone: str, change: Callable[[Dict], None]) -> Dict:
+        """Apply `change` to the phone's record (created from the default) and queue it for writing"""
+        with self._lock:
+            record = self._lookup_locked(phone)
+        loaded = self._load(phone) if record is None else None
+        with self._lock:
+            record = self._lookup_locked(phone)
+            if record is None:
+                record = loaded if loaded is not None else default_record()
+                self._admit_locked(phone, record)
+            change(record)
+            self._dirty[phone] = record
+            pending = len(self._dirty)
+        if pending >= self.flush_batch:
+            self._wake.set()
+        return record
+
+    def flush(self) -> int:
+        """Write every dirty record in one transaction; returns how many were written"""
+        with self._flush_lock:
+            with self._lock:
+                if not self._dirty:
+                    return 0
+                batch, self._dirty = self._dirty, {}
+                self._flushing = batch
+                # Serialise under the lock so no update interleaves with the copy
+                rows = [self._row(phone, record) for phone, record in batch.items()]
+            conn = self._conn()
+            try:
+                conn.execute('BEGIN IMMEDIATE')
+                conn.executemany('INSERT OR REPLACE INTO performance (phone, rating, data) VALUES (?, ?, ?)', rows)
+                conn.execute('COMMIT')
+            except sqlite3.Error as e:
+                if conn.in_transaction:
+                    conn.execute('ROLLBACK')
+                with self._lock:
+                    for phone, record in batch.items():
+                        self._dirty.setdefault(phone, record)
+                    self._flushing = {}
+                logger.error("Performance flush of %d records failed, will retry: %s", len(rows), e)
+                return 0
+            with self._lock:
+                self._flushing = {}
+                self._counters['flushes'] += 1
+                self._counters['written'] += len(rows)
+            return len(rows)
+
+    def _write_loop(self) -> None:
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def close(self) -> None:
+        """Stop the writer and flush what is left"""
+        self._closed = True
+        self._wake.set()
+        self._writer.join(timeout=5.0)
+        self.flush()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._counters)
+            stats['resident'] = len(self._resident)
+            stats['dirty'] = len(self._dirty)
+        return stats
+
+
+performance_store = PerformanceStore()
+atexit.register(performance_store.close)
@@ -1,25 +1,68 @@
+import threading
 import time
-from collections import defaultdict
+from collections import OrderedDict
+from typing import Optional
+
+_COUNT_BITS = 16
+_COUNT_MASK = (1 << _COUNT_BITS) - 1
 
 class RateLimiter:
-    def __init__(self, max_requests, period_seconds):
-        self.max_requests = max_requests
+    """Sliding-window rate limiter using two fixed-window counters per client.
+
+    The request count over the last period is estimated as the current
+    window's count plus the previous window's count weighted by how much of
+    it still overlaps the sliding window. Each client's state is packed into
+    a single int (window index, previous count, current count), every check
+    is O(1), and clients idle for two full periods (whose state is
+    indistinguishable from a new client) are evicted in least-recently-seen
+    order.
+    """
+
+    def __init__(self, max_requests, period_seconds, max_clients: Optional[int] = None):
+        self.max_requests = min(max_requests, _COUNT_MASK)
         self.period_seconds = period_seconds
-        self.requests = defaultdict(list)
+        self.max_clients = max_clients
+        # client_id -> packed state, kept in least-recently-seen order
+        self.requests: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evicted_total = 0
+
+    def _evict_idle(self, window: int) -> None:
+        requests = self.requests
+        while requests:
+            client_id = next(iter(requests))
+            idle = (requests[client_id] >> (2 * _COUNT_BITS)) < window - 1
+            if not idle and (self.max_clients is None or len(requests) <= self.max_clients):
+                break
+            del requests[client_id]
+            self.evicted_total += 1
 
     def is_allowed(self, client_id):
         """Checks if a client is allowed to make a request."""
         now = time.time()
-        
-        # Remove timestamps outside the current window
-        self.requests[client_id] = [
-            t for t in self.requests[client_id] 
-            if now - t < self.period_seconds
-        ]
-        
-        # Check if the number of requests is within the limit
-        if len(self.requests[client_id]) < self.max_requests:
-            self.requests[client_id].append(now)
-            return True
-        
-        return False
+        window = int(now // self.period_seconds)
+
+        with self._lock:
+            state = self.requests.get(client_id)
+            previous = current = 0
+            if state is not None:
+                last_window = state >> (2 * _COUNT_BITS)
+                if last_window == window:
+                    previous = (state >> _COUNT_BITS) & _COUNT_MASK
+                    current = state & _COUNT_MASK
+                elif last_window == window - 1:
+                    previous = state & _COUNT_MASK
+
+            overlap = 1 - (now % self.period_seconds) / self.period_seconds
+            allowed = previous * overlap + current < self.max_requests
+            if allowed:
+                current += 1
+
+            self.requests[client_id] = (window << (2 * _COUNT_BITS)) | (previous << _COUNT_BITS) | current
+            self.requests.move_to_end(client_id)
+            self._evict_idle(window)
+            return allowed
+
+    def stats(self):
+        with self._lock:
+            return {'tracked_clients': len(self.requests), 'evicted_total': self.evicted_total}
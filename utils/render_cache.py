@@ -0,0 +1,69 @@
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable
+
+
+class RenderCache:
+    """Rendered screens and messages, grouped per owner, in LRU order.
+
+    Each owner (an employee) has a small dict of rendered pieces keyed by
+    name. Owners are evicted least recently used first once more than
+    `max_owners` are cached, and invalidate(owner) drops everything
+    rendered for that owner, so writers invalidate exactly the employee
+    whose data changed.
+    """
+
+    def __init__(self, max_owners: int):
+        self.max_owners = max_owners
+        self._lock = threading.Lock()
+        self._owners: "OrderedDict[Hashable, Dict[str, object]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._epoch = 0  # Bumped by every invalidate()
+
+    def get(self, owner: Hashable, name: str, render: Callable[[], object]) -> object:
+        """The cached `name` piece for `owner`, rendering it on a miss"""
+        with self._lock:
+            pieces = self._owners.get(owner)
+            if pieces is not None:
+                self._owners.move_to_end(owner)
+                if name in pieces:
+                    self.hits += 1
+                    return pieces[name]
+            self.misses += 1
+            epoch = self._epoch
+        # Render outside the lock. If any invalidation landed meanwhile, the
+        # render may predate the change, so it is returned but not kept.
+        value = render()
+        with self._lock:
+            if epoch != self._epoch:
+                return value
+            pieces = self._owners.get(owner)
+            if pieces is None:
+                pieces = self._owners[owner] = {}
+                while len(self._owners) > self.max_owners:
+                    self._owners.popitem(last=False)
+                    self.evictions += 1
+            pieces[name] = value
+        return value
+
+    def invalidate(self, owner: Hashable) -> None:
+        with self._lock:
+            self._epoch += 1
+            if self._owners.pop(owner, None) is not None:
+                self.invalidations += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'owners': len(self._owners),
+                'max_owners': self.max_owners,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations
+            }
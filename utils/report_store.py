@@ -0,0 +1,233 @@
+import json
+import os
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+from utils.journal import Journal
+from utils.logging_setup import get_logger
+
+logger = get_logger('attendance_reports')
+
+
+class _PhoneReports:
+    """One employee's reports as parallel arrays ordered by date.
+
+    13 bytes per report: date ordinal, status code and timestamp.
+    """
+    __slots__ = ('days', 'statuses', 'timestamps')
+
+    def __init__(self):
+        self.days = array('I')
+        self.statuses = array('B')
+        self.timestamps = array('d')
+
+    def put(self, day: int, status: int, timestamp: float) -> None:
+        days = self.days
+        if not days or day > days[-1]:
+            index = len(days)
+        else:
+            index = bisect_left(days, day)
+            if index < len(days) and days[index] == day:
+                self.statuses[index] = status
+                self.timestamps[index] = timestamp
+                return
+        days.insert(index, day)
+        self.statuses.insert(index, status)
+        self.timestamps.insert(index, timestamp)
+
+
+class ReportStore:
+    """Attendance reports indexed per phone and kept in date order.
+
+    Saving a report is an append (or a binary-search insert for
+    back-dated reports), "latest N" is a slice off the end, and date-range
+    queries are two bisects. Reports are persisted through a binary snapshot
+    of the arrays plus an append-only journal, like the attendance store.
+    """
+
+    def __init__(self, data_dir: str = 'reports'):
+        os.makedirs(data_dir, exist_ok=True)
+        self._snapshot_path = os.path.join(data_dir, 'reports.snapshot')
+        self._journal_path = os.path.join(data_dir, 'reports.journal')
+        self._lock = threading.Lock()
+        self._compaction_lock = threading.Lock()
+        self._by_phone: Dict[str, _PhoneReports] = {}
+        self._status_names: List[str] = []
+        self._status_codes: Dict[str, int] = {}
+        self._count = 0
+        self._load()
+        self._journal = Journal(self._journal_path)
+
+    # --- Persistence ---
+
+    def _load(self) -> None:
+        if os.path.exists(self._snapshot_path):
+            with open(self._snapshot_path, 'rb') as f:
+                header = json.loads(f.readline())
+                for name in header['statuses']:
+                    self._status_code(name)
+                for phone, count in header['phones']:
+                    reports = self._by_phone[phone] = _PhoneReports()
+                    reports.days.fromfile(f, count)
+                    reports.statuses.fromfile(f, count)
+                    reports.timestamps.fromfile(f, count)
+                    self._count += count
+
+        sealed = self._journal_path + '.compacting'
+        replayed = 0
+        for segment in (sealed, self._journal_path):
+            for event in Journal.replay(segment):
+                self._put(event['k'], event['d'], self._status_code(event['s']), event['t'])
+                replayed += 1
+        if replayed:
+            self._write_snapshot(self._copy_arrays())
+            for segment in (sealed, self._journal_path):
+                if os.path.exists(segment):
+                    os.remove(segment)
+        logger.info("Report store ready (%d reports, %d replayed)", self._count, replayed)
+
+    def _copy_arrays(self) -> Dict:
+        """Cheap (memcpy) copy of every phone's arrays, taken under the lock"""
+        return {
+            'statuses': list(self._status_names),
+            'reports': {phone: (r.days[:], r.statuses[:], r.timestamps[:]) for phone, r in self._by_phone.items()}
+        }
+
+    def _write_snapshot(self, copied: Dict) -> None:
+        """Atomically write a JSON header line followed by each phone's raw arrays"""
+        header = {
+            'statuses': copied['statuses'],
+            'phones': [[phone, len(arrays[0])] for phone, arrays in copied['reports'].items()]
+        }
+        tmp_path = self._snapshot_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(json.dumps(header, separators=(',', ':')).encode() + b'\n')
+            for arrays in copied['reports'].values():
+                for column in arrays:
+                    column.tofile(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._snapshot_path)
+
+    def compact(self) -> bool:
+        """Fold the journal into a new snapshot; returns False if nothing changed"""
+        if not self._compaction_lock.acquire(blocking=False):
+            return False
+        try:
+            with self._lock:
+                sealed = self._journal.rotate()
+                if not sealed:
+                    return False
+                copied = self._copy_arrays()
+            self._write_snapshot(copied)
+            os.remove(sealed)
+            return True
+        finally:
+            self._compaction_lock.release()
+
+    # --- Writes ---
+
+    def _status_code(self, status: str) -> int:
+        code = self._status_codes.get(status)
+        if code is None:
+            code = self._status_codes[status] = len(self._status_names)
+            self._status_names.append(status)
+        return code
+
+    def _put(self, phone: str, day: int, status: int, timestamp: float) -> None:
+        reports = self._by_phone.get(phone)
+        if reports is None:
+            reports = self._by_phone[phone] = _PhoneReports()
+        before = len(reports.days)
+        reports.put(day, status, timestamp)
+        self._count += len(reports.days) - before
+
+    def save(self, phone: str, status: str, when: Optional[datetime] = None) -> Dict:
+        """Save (or replace) the caller's report for the day of `when`"""
+        when = when or datetime.now()
+        day, timestamp = when.date().toordinal(), when.timestamp()
+        with self._lock:
+            self._put(phone, day, self._status_code(status), timestamp)
+            seq = self._journal.append({'k': phone, 'd': day, 's': status, 't': timestamp}, durable=False)
+            journal = self._journal
+        journal.wait_synced(seq)
+        return self._record(phone, day, status, timestamp)
+
+    def import_reports(self, rows: Iterable[Tuple[str, date, str, float]]) -> int:
+        """Bulk-load (phone, day, status, timestamp) rows and snapshot them once"""
+        with self._lock:
+            before = self._count
+            for phone, day, status, timestamp in rows:
+                self._put(phone, day.toordinal(), self._status_code(status), timestamp)
+            sealed = self._journal.rotate()
+            copied = self._copy_arrays()
+        self._write_snapshot(copied)
+        if sealed:
+            os.remove(sealed)
+        return self._count - before
+
+    # --- Queries ---
+
+    @staticmethod
+    def _record(phone: str, day: int, status: str, timestamp: float) -> Dict:
+        date_str = date.fromordinal(day).isoformat()
+        return {
+            'id': f"{phone}_{date_str}",
+            'phone': phone,
+            'date': date_str,
+            'status': status,
+            'timestamp': datetime.fromtimestamp(timestamp).isoformat()
+        }
+
+    def _slice(self, phone: str, start: int, stop: int, newest_first: bool) -> List[Dict]:
+        reports = self._by_phone.get(phone)
+        if reports is None:
+            return []
+        indexes = range(stop - 1, start - 1, -1) if newest_first else range(start, stop)
+        names = self._status_names
+        return [
+            self._record(phone, reports.days[i], names[reports.statuses[i]], reports.timestamps[i])
+            for i in indexes
+        ]
+
+    def latest(self, phone: str, limit: Optional[int] = None) -> List[Dict]:
+        """The caller's most recent reports, newest first"""
+        with self._lock:
+            reports = self._by_phone.get(phone)
+            total = len(reports.days) if reports else 0
+            start = 0 if limit is None else max(0, total - limit)
+            return self._slice(phone, start, total, newest_first=True)
+
+    def between(self, phone: str, start: date, end: date) -> List[Dict]:
+        """The caller's reports dated start..end inclusive, oldest first"""
+        with self._lock:
+            reports = self._by_phone.get(phone)
+            if reports is None:
+                return []
+            lo = bisect_left(reports.days, start.toordinal())
+            hi = bisect_right(reports.days, end.toordinal())
+            return self._slice(phone, lo, hi, newest_first=False)
+
+    def statuses_on(self, day: date) -> Dict[str, str]:
+        """phone -> status of every report filed for `day` (batch use only)"""
+        ordinal = day.toordinal()
+        names = self._status_names
+        result = {}
+        with self._lock:
+            for phone, reports in self._by_phone.items():
+                days = reports.days
+                if not days or days[-1] < ordinal:
+                    continue
+                index = bisect_left(days, ordinal)
+                if days[index] == ordinal:
+                    result[phone] = names[reports.statuses[index]]
+        return result
+
+    def __len__(self) -> int:
+        return self._count
+
+    def close(self) -> None:
+        self.compact()
+        self._journal.close()
@@ -0,0 +1,218 @@
+import atexit
+import queue
+import threading
+import time
+from functools import partial
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from config import Config
+from utils.logging_setup import get_logger
+from utils.metrics import SMS_ENQUEUE_SECONDS, SMS_SEND_SECONDS
+from utils.sms_utils import PendingSMS, SMSBatcher, SMSService
+
+logger = get_logger('sms_service')
+
+# Sentinel telling a worker to exit once everything queued before it is sent
+_STOP = object()
+
+
+class SMSQueue:
+    """In-process outbound SMS dispatcher with a fixed worker pool.
+
+    Request handlers enqueue and return immediately; workers own every call
+    to the SMS provider. The queue is bounded: when it is full, enqueue waits
+    at most `put_timeout` seconds and then drops the message, so a slow
+    provider can never stall USSD responses. Each worker collects messages
+    for up to `batch_window` seconds and hands them to an SMSBatcher, so
+    identical bodies go out as one multi-recipient provider call. Failures
+    are retried after `retry_backoff` seconds, doubling per attempt, so a
+    provider outage does not use up every attempt at once.
+    """
+
+    def __init__(self, workers: int = Config.SMS_QUEUE_WORKERS, maxsize: int = Config.SMS_QUEUE_MAXSIZE,
+                 put_timeout: float = 0.05, max_retries: int = 2, retry_backoff: float = 0.5,
+                 batch_window: float = Config.SMS_BATCH_WINDOW_MS / 1000.0,
+                 batcher: Optional[SMSBatcher] = None):
+        self.workers = workers
+        self.put_timeout = put_timeout
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.batch_window = batch_window
+        self.batcher = batcher or SMSBatcher()
+        self._queue: "queue.Queue" = queue.Queue(maxsize=maxsize)
+        self._threads: List[threading.Thread] = []
+        self._start_lock = threading.Lock()
+        self._closed = False
+        self._counters = {'enqueued': 0, 'sent': 0, 'failed': 0, 'dropped': 0, 'retried': 0}
+        self._counter_lock = threading.Lock()
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._counter_lock:
+            self._counters[name] += amount
+
+    def _ensure_started(self) -> None:
+        if self._threads:
+            return
+        with self._start_lock:
+            if self._threads:
+                return
+            for n in range(self.workers):
+                worker = threading.Thread(target=self._run, name=f"sms-worker-{n}", daemon=True)
+                worker.start()
+                self._threads.append(worker)
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                self._queue.task_done()
+                return
+            batch, stop = self._collect(item)
+            try:
+                self._deliver(batch)
+            finally:
+                for _ in range(len(batch) + stop):
+                    self._queue.task_done()
+            if stop:
+                return
+
+    def _collect(self, first: PendingSMS) -> Tuple[List[PendingSMS], bool]:
+        """Gather whatever else arrives within the batch window, up to one batch."""
+        batch = [first]
+        deadline = time.monotonic() + self.batch_window
+        while len(batch) < self.batcher.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    @staticmethod
+    def _notify(item: PendingSMS, result: Dict) -> None:
+        phone, callback = item[0], item[3]
+        if callback:
+            try:
+                callback(phone, result)
+            except Exception as e:
+                logger.error("SMS result callback failed for %s: %s", phone, e)
+
+    def _settle(self, batch: List[PendingSMS], index: int, result: Dict) -> None:
+        """Report a success as soon as its provider call returns; failures wait for retries"""
+        if result.get('status') != 'error':
+            self._count('sent')
+            self._notify(batch[index], result)
+
+    def _deliver(self, batch: List[PendingSMS]) -> None:
+        """Send a batch, retrying failures; each callback sees only the final result"""
+        for attempt in range(1, self.max_retries + 2):
+            with SMS_SEND_SECONDS.time():
+                results = self.batcher.send_batch(batch, partial(self._settle, batch))
+            failed = [(item, result) for item, result in zip(batch, results) if result.get('status') == 'error']
+            if not failed:
+                return
+            if attempt <= self.max_retries:
+                self._count('retried', len(failed))
+                batch = [item for item, _ in failed]
+                time.sleep(self.retry_backoff * 2 ** (attempt - 1))
+        self._count('failed', len(failed))
+        for item, result in failed:
+            self._notify(item, result)
+        logger.error(
+            "SMS to %s failed after %d attempts: %s",
+            [item[0] for item, _ in failed], self.max_retries + 1, failed[0][1].get('message')
+        )
+
+    def enqueue(self, phone_numbers: List[str], message: str, sender_id: Optional[str] = None,
+                callback: Optional[Callable[[str, Dict], None]] = None) -> bool:
+        """Queue an SMS for delivery to each recipient. Returns False if any were dropped.
+
+        `callback(phone, result)` is called from a worker once per recipient.
+        """
+        with SMS_ENQUEUE_SECONDS.time():
+            return self._put_all(phone_numbers, message, sender_id, callback)
+
+    def _put_all(self, phone_numbers: List[str], message: str, sender_id: Optional[str],
+                 callback: Optional[Callable[[str, Dict], None]]) -> bool:
+        if self._closed:
+            logger.warning("SMS queue closed, dropping message to %s", phone_numbers)
+            self._count('dropped', len(phone_numbers))
+            return False
+        self._ensure_started()
+        for index, phone in enumerate(phone_numbers):
+            try:
+                self._queue.put((phone, message, sender_id, callback), timeout=self.put_timeout)
+            except queue.Full:
+                dropped = len(phone_numbers) - index
+                logger.warning("SMS queue full (%d), dropping %d message(s): %.40s", self._queue.maxsize, dropped, message)
+                self._count('dropped', dropped)
+                return False
+            self._count('enqueued')
+        return True
+
+    def enqueue_bulk(self, messages: Iterable[Tuple[str, str, Optional[Callable[[str, Dict], None]]]]) -> int:
+        """Queue (phone, message, callback) triples for a batch job; returns how many were queued.
+
+        Unlike enqueue(), this waits for room when the queue is full rather
+        than dropping, so only use it off the request path. Each callback,
+        if given, is called once with its recipient's final result.
+        """
+        queued = 0
+        for phone, message, callback in messages:
+            if self._closed:
+                logger.warning("SMS queue closed, %d bulk message(s) queued before it", queued)
+                break
+            self._ensure_started()
+            self._queue.put((phone, message, None, callback))
+            queued += 1
+        self._count('enqueued', queued)
+        return queued
+
+    def drain(self) -> None:
+        """Block until everything queued so far has been sent or has failed for good."""
+        self._queue.join()
+
+    def enqueue_template(self, phone_number: str, template_name: str, template_vars: Dict) -> bool:
+        """Render a template now and queue the result."""
+        try:
+            message = SMSService.render_template(template_name, template_vars)
+        except KeyError as e:
+            logger.error("SMS template %s failed to render: %s", template_name, e)
+            return False
+        return self.enqueue([phone_number], message)
+
+    def shutdown(self, drain: bool = True, timeout: float = 10.0) -> None:
+        """Stop accepting messages and let workers finish what is queued."""
+        if self._closed:
+            return
+        self._closed = True
+        if not self._threads:
+            return
+        if not drain:
+            try:
+                while True:
+                    self._queue.get_nowait()
+                    self._queue.task_done()
+                    self._count('dropped')
+            except queue.Empty:
+                pass
+        for _ in self._threads:
+            self._queue.put(_STOP)
+        for worker in self._threads:
+            worker.join(timeout / len(self._threads))
+        logger.info("SMS queue shut down: %s", self.stats())
+
+    def stats(self) -> Dict:
+        with self._counter_lock:
+            counters = dict(self._counters)
+        counters['depth'] = self._queue.qsize()
+        counters['workers'] = len(self._threads)
+        counters['batching'] = self.batcher.stats()
+        return counters
+
+
+# Singleton instance
+sms_queue = SMSQueue()
+atexit.register(sms_queue.shutdown)
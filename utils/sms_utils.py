@@ -1,44 +1,69 @@
-import os
-import logging
-from dotenv import load_dotenv
+import threading
 import africastalking
-from typing import List, Dict, Optional
+from itertools import count
+from typing import Callable, List, Dict, Optional, Tuple
 from time import sleep
 from config import Config
+from utils.logging_setup import get_logger
 
 # Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s [%(levelname)s] %(message)s',
-    handlers=[
-        logging.FileHandler('sms_service.log'),
-        logging.StreamHandler()
-    ]
-)
+logger = get_logger('sms_service')
+
+class _StubSMS:
+    """Local stand-in for africastalking.SMS used by load tests.
+
+    Waits `latency` seconds per call (the provider round trip) and answers
+    with a response shaped like Africa's Talking's, every recipient accepted.
+    """
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self._ids = count(1)
+
+    def send(self, message: str, recipients: List[str], sender_id: Optional[str] = None) -> Dict:
+        sleep(self.latency)
+        return {'SMSMessageData': {
+            'Message': f"Sent to {len(recipients)}/{len(recipients)} Total Cost: KES 0.0000",
+            'Recipients': [
+                {'number': phone, 'status': 'Success', 'statusCode': 101,
+                 'messageId': f"stub-{next(self._ids)}", 'cost': 'KES 0.0000'}
+                for phone in recipients
+            ]
+        }}
 
 # Initialize Africa's Talking only if not in sandbox mode
-if not Config.AT_SANDBOX:
+if Config.SMS_PROVIDER == 'stub':
+    sms = _StubSMS(Config.SMS_STUB_LATENCY_MS / 1000.0)
+    logger.info("SMS service using the local stub provider")
+elif not Config.AT_SANDBOX:
     try:
         africastalking.initialize(
             username=Config.AT_USERNAME,
             api_key=Config.AT_API_KEY
         )
         sms = africastalking.SMS
-        logging.info("SMS service initialized in LIVE mode")
+        logger.info("SMS service initialized in LIVE mode")
     except Exception as e:
-        logging.critical(f"Failed to initialize SMS service: {str(e)}")
+        logger.critical("Failed to initialize SMS service: %s", e)
         sms = None
 else:
     sms = None
-    logging.info("SMS service running in SANDBOX mode")
+    logger.info("SMS service running in SANDBOX mode")
+
+TEMPLATES = {
+    "welcome": "Welcome {name} to ElevateHR! Your ID: {id}",
+    "clock_confirm": "Clocked {action} at {time} on {date}",
+    "leave_approval": "Leave {status}: {type} for {days} days",
+    "payment_summary": "ElevateHR pay for {period}: Gross KES {gross}, Deductions KES {deductions}, Net KES {net}"
+}
 
 class SMSService:
     @staticmethod
     def send(phone_numbers: List[str], message: str, sender_id: Optional[str] = None) -> Dict:
         """Send SMS with sandbox detection"""
-        if Config.AT_SANDBOX:
+        if Config.AT_SANDBOX and Config.SMS_PROVIDER != 'stub':
             real_phones = phone_numbers  # Will be logged but not actually sent
-            logging.info(f"[SANDBOX] SMS would send to {real_phones}: {message[:60]}...")
+            logger.info("[SANDBOX] SMS would send to %s: %.60s...", real_phones, message)
             return {"status": "sandbox_simulated"}
         
         if not sms:
@@ -46,29 +71,103 @@ class SMSService:
 
         try:
             response = sms.send(message, phone_numbers, sender_id)
-            logging.info(f"SMS sent to {phone_numbers}. Response: {response}")
+            logger.info("SMS sent to %s. Response: %s", phone_numbers, response)
             return {"status": "success", "response": response}
         except Exception as e:
-            logging.error(f"SMS failed to {phone_numbers}: {str(e)}", exc_info=True)
+            logger.error("SMS failed to %s: %s", phone_numbers, e, exc_info=True)
             return {"status": "error", "message": str(e)}
 
+    @staticmethod
+    def render_template(template_name: str, template_vars: Dict) -> str:
+        """Render a named template; raises KeyError for unknown templates or variables"""
+        if template_name not in TEMPLATES:
+            raise KeyError(f"Invalid template: {template_name}")
+        return TEMPLATES[template_name].format(**template_vars)
+
     @staticmethod
     def send_template(phone_number: str, template_name: str, template_vars: Dict) -> Dict:
         """Send templated SMS"""
-        templates = {
-            "welcome": "Welcome {name} to ElevateHR! Your ID: {id}",
-            "clock_confirm": "Clocked {action} at {time} on {date}",
-            "leave_approval": "Leave {status}: {type} for {days} days"
-        }
-        
-        if template_name not in templates:
+        if template_name not in TEMPLATES:
             return {"status": "error", "message": "Invalid template"}
         
         try:
-            message = templates[template_name].format(**template_vars)
+            message = SMSService.render_template(template_name, template_vars)
             return SMSService.send([phone_number], message)
         except KeyError as e:
             return {"status": "error", "message": f"Missing template variable: {str(e)}"}
 
+# Africa's Talking per-recipient status codes that mean the message was accepted
+_AT_SUCCESS_CODES = {100, 101, 102}
+
+# (phone, message, sender_id, callback) for one recipient of one message
+PendingSMS = Tuple[str, str, Optional[str], Optional[Callable[[str, Dict], None]]]
+
+def recipient_results(result: Dict, phone_numbers: List[str]) -> Dict[str, Dict]:
+    """Split a provider response for a multi-recipient send into per-phone results"""
+    if result.get('status') != 'success':
+        return {phone: result for phone in phone_numbers}
+
+    recipients = (result.get('response') or {}).get('SMSMessageData', {}).get('Recipients', [])
+    by_number = {r.get('number'): r for r in recipients}
+    results = {}
+    for phone in phone_numbers:
+        recipient = by_number.get(phone)
+        if recipient is None:
+            results[phone] = {"status": "success"}
+        elif recipient.get('statusCode') in _AT_SUCCESS_CODES:
+            results[phone] = {"status": "success", "message_id": recipient.get('messageId')}
+        else:
+            results[phone] = {"status": "error", "message": recipient.get('status', 'Rejected')}
+    return results
+
+class SMSBatcher:
+    """Coalesce pending messages with identical bodies into multi-recipient sends.
+
+    Messages are grouped by (rendered body, sender_id) and each group goes to
+    the provider as one call of up to `max_batch` recipients. Results come
+    back per item, and to `on_result` as each provider call returns;
+    calling callbacks is left to the caller, which knows which result is
+    final.
+    """
+
+    def __init__(self, max_batch: int = Config.SMS_BATCH_MAX):
+        self.max_batch = max_batch
+        self._lock = threading.Lock()
+        self._stats = {'provider_calls': 0, 'messages': 0, 'calls_saved': 0, 'max_batch_size': 0}
+
+    def send_batch(self, pending: List[PendingSMS],
+                   on_result: Optional[Callable[[int, Dict], None]] = None) -> List[Dict]:
+        """Send everything pending; returns one result per item, in input order"""
+        groups: Dict[Tuple[str, Optional[str]], List[int]] = {}
+        for index, item in enumerate(pending):
+            groups.setdefault((item[1], item[2]), []).append(index)
+
+        results: List[Dict] = [{}] * len(pending)
+        for (message, sender_id), indexes in groups.items():
+            for start in range(0, len(indexes), self.max_batch):
+                chunk = indexes[start:start + self.max_batch]
+                phones = list(dict.fromkeys(pending[i][0] for i in chunk))
+                per_phone = recipient_results(SMSService.send(phones, message, sender_id), phones)
+                self._record(len(chunk), len(phones))
+                for i in chunk:
+                    results[i] = per_phone[pending[i][0]]
+                    if on_result:
+                        on_result(i, results[i])
+        return results
+
+    def _record(self, batch_size: int, recipients: int) -> None:
+        with self._lock:
+            self._stats['provider_calls'] += 1
+            self._stats['messages'] += batch_size
+            self._stats['calls_saved'] += recipients - 1
+            self._stats['max_batch_size'] = max(self._stats['max_batch_size'], batch_size)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+        calls = stats['provider_calls']
+        stats['avg_batch_size'] = round(stats['messages'] / calls, 2) if calls else 0.0
+        return stats
+
 # Singleton instance
 sms_handler = SMSService()
\ No newline at end of file
@@ -0,0 +1,42 @@
+from typing import Dict, List, Optional
+
+# Session keys used by the cursor
+_POSITION = 'input_pos'    # Length of the cumulative text already consumed
+_LAST_SEGMENT = 'input_last'  # The last segment consumed, to recognise resends
+
+
+class InputOutOfSequence(ValueError):
+    """Hop text that neither repeats nor extends the consumed path, such as
+    a late resend of an earlier, shorter hop."""
+
+
+def consume_input(session: Dict, text: str) -> Optional[List[str]]:
+    """Return only the segments added since the previous hop.
+
+    Africa's Talking resends the whole path ("1*3*2*12-08-2026*1") on every
+    hop. The session remembers how much of it has been consumed, so each hop
+    splits just the new tail and the work does not grow with flow depth.
+    Returns None when the text is a resend of the latest hop; the caller
+    should repeat its previous response. Raises InputOutOfSequence for any
+    other text, whose earlier answer the session no longer has.
+    """
+    position = session.get(_POSITION, 0)
+    last = session.get(_LAST_SEGMENT, '')
+
+    if position == 0:
+        new_text = text
+    elif text[position - len(last):position] != last:
+        raise InputOutOfSequence(f"input does not match the consumed path (at {position}): '{text}'")
+    elif len(text) == position:
+        return None
+    elif len(text) > position and text[position] == '*':
+        new_text = text[position + 1:]
+    else:
+        raise InputOutOfSequence(f"input does not extend the consumed path (at {position}): '{text}'")
+
+    if not new_text and position == 0:
+        return []
+    segments = new_text.split('*')
+    session[_POSITION] = len(text)
+    session[_LAST_SEGMENT] = segments[-1]
+    return segments